@@ -0,0 +1,242 @@
+# Built In Modules
+from datetime import datetime, timedelta, timezone
+import logging
+import sys
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+import Jetrics.cache as c
+import Jetrics.columnar as columnar
+import Jetrics.downstream as d
+import Jetrics.fetch as f
+from Jetrics.config import config
+
+# Global Variables
+log = logging.getLogger(__name__)
+
+
+def snapshot_dates(start, end, step):
+    """
+    Helper function to list the snapshot dates of a backfill.
+
+
+    :param datetime.date start: First snapshot
+    :param datetime.date end: Last possible snapshot
+    :param Int step: Days between snapshots
+    :return: Snapshot dates
+    :rtype: List
+    """
+    dates = []
+    while start <= end:
+        dates.append(start)
+        start += timedelta(days=step)
+    return dates
+
+
+def end_of_day(day):
+    """
+    Helper function to get the epoch milliseconds at the end of a (UTC) day.
+
+
+    :param datetime.date day: Day
+    :return: Epoch milliseconds
+    :rtype: Int
+    """
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000) + 24 * 60 * 60 * 1000
+
+
+def state_at(size, index, from_codes, to_codes, timestamps, current, timestamp):
+    """
+    Function to replay a field's transitions to get every issue's value at a point in time.
+
+    Before its first change an issue held that change's 'from' value, afterwards the 'to' value
+    of its last change up to the point in time. Issues that never changed keep their current value.
+
+
+    :param Int size: Number of issues
+    :param numpy.ndarray index: Issue of every transition
+    :param numpy.ndarray from_codes: Value before every transition
+    :param numpy.ndarray to_codes: Value after every transition
+    :param numpy.ndarray timestamps: Epoch milliseconds of every transition
+    :param numpy.ndarray current: Current value of every issue
+    :param Int timestamp: Epoch milliseconds to replay up to
+    :return: Value of every issue at that time
+    :rtype: numpy.ndarray
+    """
+    state = current.copy()
+    if not len(index):
+        return state
+    rows = np.arange(len(index))
+    first_row = np.full(size, len(index))
+    np.minimum.at(first_row, index, rows)
+    changed = first_row < len(index)
+    state[changed] = from_codes[first_row[changed]]
+    done = timestamps <= timestamp
+    last_row = np.full(size, -1)
+    np.maximum.at(last_row, index[done], rows[done])
+    replayed = last_row >= 0
+    state[replayed] = to_codes[last_row[replayed]]
+    return state
+
+
+def first_transition(changelog, from_status, to_status):
+    """
+    Helper function to find when every issue first moved from one status to another.
+
+
+    :param columnar.Changelog changelog: Changelog
+    :param String from_status: Status moved out of
+    :param String to_status: Status moved into
+    :return: Epoch milliseconds for every issue (int64 max if it never did)
+    :rtype: numpy.ndarray
+    """
+    first = np.full(len(changelog.keys), np.iinfo(np.int64).max)
+    if from_status in changelog.status_codes and to_status in changelog.status_codes:
+        rows = (changelog.from_codes == changelog.status_codes[from_status]) & \
+            (changelog.to_codes == changelog.status_codes[to_status])
+        np.minimum.at(first, changelog.issue_index[rows], changelog.timestamps[rows])
+    return first
+
+
+def code_of(codes, name):
+    """
+    Helper function to look up an interned code, -1 (matching nothing) if the name never occurs.
+
+
+    :param Dict codes: Name -> code
+    :param String name: Name
+    :return: Code
+    :rtype: Int
+    """
+    return codes.get(name, -1)
+
+
+def add_snapshots(totals, sketches, changelog, timestamps):
+    """
+    Function to add a page of the base population to the snapshot of every day.
+
+    Issues never span two pages, so the statuses and resolutions of a page are replayed on
+    their own and only the counts and duration sketches of every day are kept.
+
+
+    :param List totals: Count name -> issues counted, for every day
+    :param List sketches: Metric name -> sketch of the durations in seconds, for every day
+    :param columnar.Changelog changelog: Changelog of a page
+    :param List timestamps: Epoch milliseconds of the end of every day
+    """
+    size = len(changelog.keys)
+    is_bug = changelog.issue_types == code_of(changelog.type_codes, 'Bug')
+    in_pipeline = changelog.categories == code_of(changelog.category_codes, 'Product Pipeline')
+    qe_gap_at = first_transition(changelog, 'Verified', 'Testing')
+    caught_at = first_transition(changelog, 'Testing', 'In Progress')
+    # Which rows start/stop a duration metric does not depend on the date, only the pairing does
+    matches = columnar.match_rows(changelog, config['duration_metrics'], config['workflows'])
+    for day_totals, day_sketches, timestamp in zip(totals, sketches, timestamps):
+        exists = changelog.created <= timestamp
+        status = state_at(size, changelog.issue_index, changelog.from_codes, changelog.to_codes,
+                          changelog.timestamps, changelog.statuses, timestamp)
+        resolution = state_at(size, changelog.resolution_index, changelog.resolution_from,
+                              changelog.resolution_to, changelog.resolution_timestamps, changelog.resolutions,
+                              timestamp)
+        resolved = exists & (resolution != code_of(changelog.resolution_codes, None))
+        counts = {
+            'work_in_progress': exists & (status == code_of(changelog.status_codes, 'In Progress')),
+            'qe_gaps': in_pipeline & (qe_gap_at <= timestamp),
+            'bugs_caught': caught_at <= timestamp,
+            'resolved_bugs': resolved & is_bug,
+            'resolved_other': resolved & ~is_bug,
+            'deferred': exists & (resolution == code_of(changelog.resolution_codes, 'Deferred')),
+            'declined': exists & (resolution == code_of(changelog.resolution_codes, "Won't Fix")),
+        }
+        for name, mask in counts.items():
+            day_totals[name] = day_totals.get(name, 0) + int(np.count_nonzero(mask))
+        for name, durations in columnar.pair_rows(changelog, matches, changelog.timestamps <= timestamp,
+                                                  d.working_calendar).items():
+            day_sketches[name].add_many(durations)
+
+
+def snapshots(changelogs, days):
+    """
+    Function to rebuild the metrics as they were at the end of every given day.
+
+    Changelogs are added one at a time (see add_snapshots), so memory does not grow with the
+    population, only with the number of days.
+
+
+    :param Iterable changelogs: Changelogs of the whole base population, a page at a time
+    :param List days: Snapshot dates
+    :return: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+    :rtype: List
+    """
+    totals = [{} for _ in days]
+    sketches = [d.new_sketches() for _ in days]
+    timestamps = [end_of_day(day) for day in days]
+    for changelog in changelogs:
+        add_snapshots(totals, sketches, changelog, timestamps)
+    rows = []
+    for day, day_totals, day_sketches in zip(days, totals, sketches):
+        resolved_other = day_totals.get('resolved_other', 0)
+        values = {
+            'Current Work In Progress': day_totals.get('work_in_progress', 0),
+            'QE Gaps': day_totals.get('qe_gaps', 0),
+            'Bugs Caught': day_totals.get('bugs_caught', 0),
+            'Bug Ratio': day_totals.get('resolved_bugs', 0) / resolved_other if resolved_other else -1,
+            # Needs the epic links of the time, which the changelog does not have
+            'Work Outside of Quarterly Planning': None,
+            'Deferred Issues': day_totals.get('deferred', 0),
+            'Declined Issues': day_totals.get('declined', 0),
+        }
+        values.update(d.summarize_durations(day_sketches))
+        rows.append((day.strftime('%Y-%m-%d'), values))
+    return rows
+
+
+def get_population(client):
+    """
+    Function to stream the whole base population with its changelogs, from the cache if enabled.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :return: Generator of raw issue JSON with the changelog expanded
+    :rtype: Generator
+    """
+    if config['cache_dir']:
+        store = c.open_cache(d.standard_jql)
+        c.sync(client, store, d.standard_jql, d.issue_fields)
+        return c.iter_issues(store)
+    return f.iter_raw_issues(client, d.standard_jql, fields=d.issue_fields, expand='changelog')
+
+
+def backfill(client, start, end, step):
+    """
+    Function to rebuild historical metric rows from a single fetch of the changelogs.
+
+    Issue types, projects and categories are the current ones: the changelog only holds status
+    and resolution changes here, so an issue whose type changed counts as its current type on
+    every date.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param datetime.date start: First snapshot
+    :param datetime.date end: Last possible snapshot
+    :param Int step: Days between snapshots
+    :return: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+    :rtype: List
+    """
+    return snapshots(d.iter_changelogs(get_population(client)), snapshot_dates(start, end, step))
+
+
+def main():
+    """
+    Main function to backfill the sheet with historical rows, same as `jetrics backfill`
+
+    """
+    from Jetrics import cli
+
+    cli.main(['backfill'] + sys.argv[1:])
+
+
+if __name__ == '__main__':
+    main()
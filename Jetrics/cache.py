@@ -0,0 +1,305 @@
+# Built In Modules
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+
+# Local Modules
+from Jetrics.config import config
+from Jetrics import fetch
+from Jetrics.columnar import user_name
+
+# Global Variables
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    project TEXT,
+    category TEXT,
+    issue_type TEXT,
+    status TEXT COLLATE NOCASE,
+    resolution TEXT COLLATE NOCASE,
+    created TEXT,
+    updated TEXT,
+    epic TEXT,
+    assignee TEXT,
+    priority TEXT,
+    components TEXT
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    issue_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    created TEXT NOT NULL,
+    field TEXT NOT NULL,
+    from_string TEXT COLLATE NOCASE,
+    to_string TEXT COLLATE NOCASE,
+    history_id INTEGER,
+    PRIMARY KEY (issue_id, position)
+);
+CREATE INDEX IF NOT EXISTS transitions_change ON transitions (field, from_string, to_string);
+CREATE TABLE IF NOT EXISTS epics (
+    key TEXT PRIMARY KEY,
+    labels TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS synced_fields (
+    name TEXT PRIMARY KEY
+);
+"""
+# Changelog fields we keep, everything else in a history is dropped
+TRACKED_FIELDS = ('status', 'resolution')
+# Issue columns added after the first caches were created, filled in by a full sync
+ADDED_COLUMNS = ('epic', 'assignee', 'priority', 'components')
+log = logging.getLogger(__name__)
+
+
+def open_cache(jql):
+    """
+    Function to open (and create if needed) the on-disk cache for a base JQL.
+
+    Every base JQL gets its own database, so changing config['projects'] or
+    config['start_date'] starts from a cold cache instead of mixing populations.
+
+
+    :param String jql: JQL describing the cached issue population
+    :return: Cache connection
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(config['cache_dir'], exist_ok=True)
+    name = hashlib.sha1(jql.encode('utf-8')).hexdigest()[:12]
+    conn = sqlite3.connect(os.path.join(config['cache_dir'], f'jetrics-{name}.sqlite'), check_same_thread=False)
+    conn.executescript(SCHEMA)
+    if 'history_id' not in {row[1] for row in conn.execute('PRAGMA table_info(transitions)')}:
+        # Caches created before history ids were kept, filled in by the next full sync
+        conn.execute('ALTER TABLE transitions ADD COLUMN history_id INTEGER')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(issues)')}
+    missing = [column for column in ADDED_COLUMNS if column not in columns]
+    if missing:
+        # Caches created before these fields were kept, the next sync is a full one to fill them in
+        with conn:
+            for column in missing:
+                conn.execute(f'ALTER TABLE issues ADD COLUMN {column} TEXT')
+            conn.execute("DELETE FROM sync_state WHERE name = 'last_full_sync'")
+    return conn
+
+
+def get_state(conn, name):
+    """
+    Helper function to read a value from the sync_state table.
+
+
+    :param sqlite3.Connection conn: Cache connection
+    :param String name: Name of the value
+    :return: Value (None if it was never set)
+    :rtype: Float
+    """
+    row = conn.execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def set_state(conn, name, value):
+    """
+    Helper function to write a value to the sync_state table.
+
+
+    :param sqlite3.Connection conn: Cache connection
+    :param String name: Name of the value
+    :param Float value: Value to store
+    """
+    conn.execute('INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)', (name, value))
+
+
+def upsert_issues(conn, issues):
+    """
+    Function to insert or replace issues and their status/resolution histories.
+
+
+    :param sqlite3.Connection conn: Cache connection
+    :param List issues: Raw issue JSON (with changelog expanded)
+    """
+    for issue in issues:
+        fields = issue['fields']
+        issue_id = int(issue['id'])
+        category = (fields['project'].get('projectCategory') or {}).get('name')
+        epic = fields.get(config['epic_link_field'])
+        components = [component['name'] for component in fields.get('components') or []]
+        conn.execute('INSERT OR REPLACE INTO issues (id, key, project, category, issue_type, status, resolution, '
+                     'created, updated, epic, assignee, priority, components) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                         issue_id, issue['key'], fields['project']['key'], category, fields['issuetype']['name'],
+                         fields['status']['name'], (fields.get('resolution') or {}).get('name'),
+                         fields.get('created'), fields.get('updated'),
+                         epic.get('key') if isinstance(epic, dict) else epic, user_name(fields.get('assignee')),
+                         (fields.get('priority') or {}).get('name'), json.dumps(components)))
+        conn.execute('DELETE FROM transitions WHERE issue_id = ?', (issue_id,))
+        transitions = []
+        for history in issue.get('changelog', {}).get('histories', []):
+            for item in history['items']:
+                if item['field'] in TRACKED_FIELDS:
+                    transitions.append((issue_id, len(transitions), history['created'], item['field'],
+                                        item.get('fromString'), item.get('toString'), history.get('id')))
+        conn.executemany('INSERT INTO transitions (issue_id, position, created, field, from_string, to_string, '
+                         'history_id) VALUES (?, ?, ?, ?, ?, ?, ?)', transitions)
+
+
+def sync(client, conn, jql, fields):
+    """
+    Function to bring the cache up to date with JIRA.
+
+    The first run (and every config['cache_full_sync_days']) downloads the whole population,
+    which also drops issues that were deleted or moved. Every other run only asks for the
+    issues updated since the last sync.
+
+    The cache remembers the fields it was synced with and keeps downloading them: asking for
+    a field it does not hold yet (e.g. the first breakdown) is a full sync.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param sqlite3.Connection conn: Cache connection
+    :param String jql: JQL describing the cached issue population
+    :param List fields: Issue fields to store
+    :return: Number of issues downloaded
+    :rtype: Int
+    """
+    started = time.time()
+    last_sync = get_state(conn, 'last_sync')
+    last_full_sync = get_state(conn, 'last_full_sync')
+    held = [row[0] for row in conn.execute('SELECT name FROM synced_fields')]
+    full_sync = last_sync is None or last_full_sync is None or any(field not in held for field in fields) or \
+        started - last_full_sync > config['cache_full_sync_days'] * 24 * 60 * 60
+    fields = list(fields) + [field for field in held if field not in fields]
+    if full_sync:
+        log.info('Running a full sync of the issue cache...')
+        pages = fetch.iter_issue_pages(client, jql, fields=fields, expand='changelog')
+    else:
+        # A relative date sidesteps the JIRA user's timezone, the margin covers clock skew
+        minutes = math.ceil((started - last_sync) / 60) + config['cache_sync_margin']
+        log.info(f'Syncing issues updated in the last {minutes} minutes...')
+        pages = fetch.iter_issue_pages(client, f"{jql} AND updated >= -{minutes}m",
+                                       fields=fields, expand='changelog')
+    downloaded = 0
+    with conn:
+        if full_sync:
+            conn.execute('DELETE FROM transitions')
+            conn.execute('DELETE FROM issues')
+            conn.executemany('INSERT OR IGNORE INTO synced_fields (name) VALUES (?)', [(field,) for field in fields])
+            set_state(conn, 'last_full_sync', started)
+        # Pages are written as they arrive, only the pages in flight are held in memory
+        for page in pages:
+            upsert_issues(conn, page)
+            downloaded += len(page)
+        set_state(conn, 'last_sync', started)
+    return downloaded
+
+
+def sync_epics(client, conn, jql):
+    """
+    Function to bring the cached epics and their labels up to date with JIRA.
+
+    Like sync, a full sync (the first run, every config['cache_full_sync_days'] or when the
+    JQL changes) replaces every epic with the ones matching the JQL. Other runs ask for every
+    epic updated since, whatever its labels, so an epic losing a label is updated too.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param sqlite3.Connection conn: Cache connection
+    :param String jql: JQL of the epics to keep, e.g. the ones labelled with a quarter
+    :return: Number of epics downloaded
+    :rtype: Int
+    """
+    started = time.time()
+    last_sync = get_state(conn, 'last_epic_sync')
+    last_full_sync = get_state(conn, 'last_full_epic_sync')
+    # sync_state holds numbers, the JQL is kept as a checksum
+    checksum = int(hashlib.sha1(jql.encode('utf-8')).hexdigest()[:12], 16)
+    full_sync = last_sync is None or last_full_sync is None or get_state(conn, 'epic_jql') != checksum or \
+        started - last_full_sync > config['cache_full_sync_days'] * 24 * 60 * 60
+    if full_sync:
+        log.info('Running a full sync of the cached epics...')
+        pages = fetch.iter_issue_pages(client, jql, fields=['labels'])
+    else:
+        minutes = math.ceil((started - last_sync) / 60) + config['cache_sync_margin']
+        pages = fetch.iter_issue_pages(client, f"type = Epic AND updated >= -{minutes}m", fields=['labels'])
+    downloaded = 0
+    with conn:
+        if full_sync:
+            conn.execute('DELETE FROM epics')
+            set_state(conn, 'last_full_epic_sync', started)
+            set_state(conn, 'epic_jql', checksum)
+        for page in pages:
+            conn.executemany('INSERT OR REPLACE INTO epics (key, labels) VALUES (?, ?)',
+                             [(epic['key'], json.dumps(epic['fields'].get('labels') or [])) for epic in page])
+            downloaded += len(page)
+        set_state(conn, 'last_epic_sync', started)
+    return downloaded
+
+
+def load_epics(conn):
+    """
+    Function to read the cached epics.
+
+
+    :param sqlite3.Connection conn: Cache connection
+    :return: Epic key -> labels
+    :rtype: Dict
+    """
+    return {key: set(json.loads(labels)) for key, labels in conn.execute('SELECT key, labels FROM epics')}
+
+
+def iter_issues(conn, projects=None):
+    """
+    Function to stream cached issues back in the raw JIRA JSON shape, one issue at a time.
+
+    Only the fields the metrics read are rebuilt, and histories only hold status and
+    resolution changes. Issues and transitions are read with two cursors in the same order,
+    so neither table is ever loaded whole.
+
+
+    :param sqlite3.Connection conn: Cache connection
+    :param List projects: Only load these projects (Default = all projects)
+    :return: Generator of raw issue JSON (with changelog)
+    :rtype: Generator
+    """
+    params = tuple(projects or ())
+    where = f" WHERE project IN ({', '.join('?' * len(params))})" if params else ''
+    issue_rows = conn.execute(
+        'SELECT id, key, project, category, issue_type, status, resolution, created, updated, epic, assignee, '
+        f'priority, components FROM issues{where} ORDER BY id DESC', params)
+    transition_rows = conn.execute(
+        'SELECT issue_id, created, field, from_string, to_string, history_id FROM transitions '
+        f'WHERE issue_id IN (SELECT id FROM issues{where}) ORDER BY issue_id DESC, position', params)
+    transition = next(transition_rows, None)
+    for issue_id, key, project, category, issue_type, status, resolution, created, updated, epic, assignee, \
+            priority, components in issue_rows:
+        histories = []
+        while transition is not None and transition[0] == issue_id:
+            item = {'field': transition[2], 'fromString': transition[3], 'toString': transition[4]}
+            if histories and transition[5] is not None and histories[-1]['id'] == transition[5]:
+                # Status and resolution changed together
+                histories[-1]['items'].append(item)
+            else:
+                histories.append({'id': transition[5], 'created': transition[1], 'items': [item]})
+            transition = next(transition_rows, None)
+        yield {
+            'id': str(issue_id),
+            'key': key,
+            'fields': {
+                'project': {'key': project, 'projectCategory': {'name': category} if category else None},
+                'issuetype': {'name': issue_type},
+                'status': {'name': status},
+                'resolution': {'name': resolution} if resolution else None,
+                'created': created,
+                'updated': updated,
+                config['epic_link_field']: epic,
+                'assignee': {'displayName': assignee} if assignee else None,
+                'priority': {'name': priority} if priority else None,
+                'components': [{'name': component} for component in json.loads(components or '[]')],
+            },
+            'changelog': {'histories': histories},
+        }
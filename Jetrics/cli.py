@@ -0,0 +1,295 @@
+# Built In Modules
+import argparse
+from datetime import date, datetime
+import json
+import logging
+import math
+import os
+import sys
+import time
+
+# Local Modules
+from Jetrics.config import config
+
+# Global Variables
+log = logging.getLogger(__name__)
+
+
+def parse_date(value):
+    """
+    Helper function to parse a YEAR-MONTH-DAY command line date.
+
+
+    :param String value: Date
+    :return: Date
+    :rtype: datetime.date
+    """
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def print_json(data):
+    """
+    Helper function to print data as JSON on stdout.
+
+
+    :param Object data: JSON serializable data
+    """
+    json.dump(data, sys.stdout, indent=2, default=str)
+    sys.stdout.write('\n')
+
+
+def with_reports(command):
+    """
+    Helper function to run a command and write the run reports, also when it fails half way.
+
+
+    :param Function command: Command to run
+    :return: What the command returned
+    :rtype: Object
+    """
+    import Jetrics.instrument as i
+
+    try:
+        return command()
+    finally:
+        i.write_reports(config['run_report'], config['prometheus_textfile'])
+
+
+def compute(args):
+    """
+    Compute the metrics and print them, without touching the sheet.
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import Jetrics.downstream as d
+    import Jetrics.main as m
+
+    def command():
+        log.info('Getting JIRA client...')
+        return m.compute(d.get_jira_client(), profile_dir=args.profile)
+    print_json(with_reports(command))
+
+
+def breakdown(args):
+    """
+    Compute the metrics over rolling windows, optionally broken down, and print them.
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import Jetrics.downstream as d
+    import Jetrics.main as m
+
+    def command():
+        log.info('Getting JIRA client...')
+        return m.breakdown(d.get_jira_client(), args.window or [7, 30, 90, 0], args.by, today=args.end)
+    print_json(with_reports(command))
+
+
+def dry_run(args):
+    """
+    Compute the metrics and print what sync would write to every sink, writing nothing.
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import Jetrics.main as m
+
+    print_json(with_reports(lambda: m.run(args.profile, dry_run=True)))
+
+
+def sync(args):
+    """
+    Compute the metrics and write them to every sink (the sheet by default).
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import Jetrics.main as m
+
+    with_reports(lambda: m.run(args.profile))
+
+
+def backfill(args):
+    """
+    Rebuild historical rows from the changelogs and write them to every sink.
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import Jetrics.backfill as b
+    import Jetrics.downstream as d
+    import Jetrics.sinks as s
+
+    def command():
+        log.info('Getting JIRA client...')
+        client = d.get_jira_client()
+        log.info(f'Backfilling from {args.start} to {args.end} every {args.step} days...')
+        rows = b.backfill(client, args.start, args.end, args.step)
+        log.info(f'Writing {len(rows)} rows upstream...')
+        return s.write_rows(rows, sheet=args.sheet, dry_run=args.dry_run)
+    written = with_reports(command)
+    if args.dry_run:
+        print_json(written)
+
+
+def bench(args):
+    """
+    Compute the metrics several times with the same client and print how long every metric took.
+
+    The first run warms the issue cache and the keep-alive connections, the fastest run of
+    every metric is reported. Nothing is written to the sheet.
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import Jetrics.downstream as d
+    import Jetrics.instrument as i
+    import Jetrics.main as m
+
+    client = d.get_jira_client()
+    fastest, totals = {}, []
+    for _ in range(args.repeat):
+        i.recorder.reset()
+        started = time.perf_counter()
+        m.compute(client)
+        totals.append(time.perf_counter() - started)
+        report = i.recorder.report()
+        for metric, entry in {**report['shared'], **report['metrics']}.items():
+            fastest[metric] = min(fastest.get(metric, entry['seconds']), entry['seconds'])
+    width = max(map(len, fastest), default=6)
+    print(f"{'metric':<{width}} {'seconds':>9}")
+    for metric, seconds in sorted(fastest.items(), key=lambda item: -item[1]):
+        print(f'{metric:<{width}} {seconds:>9.3f}')
+    print(f"{'total':<{width}} {min(totals):>9.3f} (runs: {', '.join(f'{total:.3f}' for total in totals)})")
+
+
+def history(args):
+    """
+    Print the local history of a sheet as CSV, one row per day.
+
+
+    :param argparse.Namespace args: Command line arguments
+    """
+    import csv
+
+    from Jetrics.history import HistorySink
+
+    days, values = HistorySink().store(args.sheet).read(args.column or None, args.start, args.end)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['Date'] + list(values))
+    columns = list(values.values())
+    for position, day in enumerate(days):
+        row = [float(column[position]) for column in columns]
+        writer.writerow([str(day)] + ['' if math.isnan(value) else value for value in row])
+
+
+def get_parser():
+    """
+    Function to build the command line parser.
+
+
+    :return: Parser
+    :rtype: argparse.ArgumentParser
+    """
+    # Accepted before and after the command, unset options are left out so a command does not
+    # overwrite what was given before it
+    global_options = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    global_options.add_argument('-v', '--verbose', action='store_true', help='Log what every step is doing')
+    global_options.add_argument('--record', metavar='FILE',
+                                help='Record every JIRA response to a snapshot, e.g. run.ndjson.gz (see --replay)')
+    global_options.add_argument('--replay', metavar='FILE', help='Answer every JIRA request from a recorded snapshot')
+
+    parser = argparse.ArgumentParser(prog='jetrics', description='Compute the Jetrics and sync them to the sheet',
+                                     parents=[global_options])
+    parser.set_defaults(handler=sync, profile=None)
+    commands = parser.add_subparsers(title='commands', metavar='COMMAND',
+                                     description='sync when no command is given')
+
+    profiled = argparse.ArgumentParser(add_help=False, parents=[global_options])
+    profiled.add_argument('--profile', nargs='?', const='profiles', metavar='DIR',
+                          help='Dump a cProfile of every metric to DIR/<metric>.prof (default DIR: profiles)')
+
+    commands.add_parser('compute', parents=[profiled], help='Compute the metrics and print them as JSON',
+                        description=compute.__doc__.strip().splitlines()[0]).set_defaults(handler=compute)
+    commands.add_parser('dry-run', parents=[profiled], help='Show what sync would write',
+                        description=dry_run.__doc__.strip().splitlines()[0]).set_defaults(handler=dry_run)
+    commands.add_parser('sync', parents=[profiled], help='Compute the metrics and write them to the sheet',
+                        description=sync.__doc__.strip().splitlines()[0]).set_defaults(handler=sync)
+
+    breakdown_parser = commands.add_parser('breakdown', parents=[global_options],
+                                           help='Compute the metrics over rolling windows as JSON',
+                                           description=breakdown.__doc__.strip().splitlines()[0])
+    breakdown_parser.add_argument('--window', type=int, action='append', metavar='DAYS',
+                                  help='Days the issues were created in, 0 for all of them, repeat for several '
+                                       '(default: 7, 30, 90 and 0)')
+    # The same as cube.DIMENSIONS, which would load numpy
+    breakdown_parser.add_argument('--by', choices=['assignee', 'component', 'priority'],
+                                  help='Break the metrics down by this field (default: the whole population)')
+    breakdown_parser.add_argument('--end', type=parse_date,
+                                  help='Last day of every window, YEAR-MONTH-DAY (default: today)')
+    breakdown_parser.set_defaults(handler=breakdown)
+
+    backfill_parser = commands.add_parser('backfill', parents=[global_options],
+                                          help='Rebuild historical rows from the changelogs',
+                                          description=backfill.__doc__.strip().splitlines()[0],
+                                          epilog='Only status and resolution changes are replayed: issues count '
+                                                 'as their current type, project and category on every date.')
+    backfill_parser.add_argument('--start', type=parse_date,
+                                 default=parse_date(config['start_date'].replace('\\u002f', '-')),
+                                 help="First snapshot date, YEAR-MONTH-DAY (default: config['start_date'])")
+    backfill_parser.add_argument('--end', type=parse_date, default=date.today(),
+                                 help='Last snapshot date, YEAR-MONTH-DAY (default: today)')
+    backfill_parser.add_argument('--step', type=int, default=7, help='Days between snapshots (default: 7)')
+    backfill_parser.add_argument('--sheet', default='Sheet1', help='Sheet to write to (default: Sheet1)')
+    backfill_parser.add_argument('--dry-run', action='store_true', help='Print the rows instead of writing them')
+    backfill_parser.set_defaults(handler=backfill)
+
+    history_parser = commands.add_parser('history', parents=[global_options],
+                                         help='Print the local history of a sheet as CSV',
+                                         description=history.__doc__.strip().splitlines()[0])
+    history_parser.add_argument('--sheet', default='Sheet1', help='Sheet to read (default: Sheet1)')
+    history_parser.add_argument('--column', action='append', metavar='TITLE',
+                                help='Column to print, repeat for several (default: every column)')
+    history_parser.add_argument('--start', help='First day, YEAR-MONTH-DAY (default: the first row)')
+    history_parser.add_argument('--end', help='Last day, YEAR-MONTH-DAY (default: the last row)')
+    history_parser.set_defaults(handler=history)
+
+    bench_parser = commands.add_parser('bench', parents=[global_options], help='Time every metric over several runs',
+                                       description=bench.__doc__.strip().splitlines()[0])
+    bench_parser.add_argument('--repeat', type=int, default=3, help='Number of runs (default: 3)')
+    bench_parser.set_defaults(handler=bench)
+    return parser
+
+
+def main(argv=None):
+    """
+    Main function to start the program
+
+    Every command imports what it needs when it runs: `jetrics --help` never loads the JIRA
+    client, numpy or the Google client libraries, and only the commands reading or writing
+    the sheet load the latter.
+
+    :param List argv: Command line arguments (Default = sys.argv[1:])
+    """
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if getattr(args, 'verbose', False) else logging.WARNING,
+                        format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    # Set in the environment too, for the worker processes of teams
+    if getattr(args, 'record', None):
+        config['record_snapshot'] = os.environ['JETRICS_RECORD'] = args.record
+    if getattr(args, 'replay', None):
+        config['replay_snapshot'] = os.environ['JETRICS_REPLAY'] = args.replay
+    if config['record_snapshot'] or config['replay_snapshot']:
+        # A snapshot holds the whole population, not only what changed since the cache was synced
+        config['cache_dir'] = None
+    if config['record_snapshot'] and not config['replay_snapshot']:
+        from Jetrics import snapshot
+
+        snapshot.start(config['record_snapshot'])
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+# Built In Modules
+from array import array
+import logging
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics.transitions import compile_condition, get_workflow, resolve_definition
+
+# Global Variables
+log = logging.getLogger(__name__)
+
+
+def intern(table, value):
+    """
+    Helper function to get the integer code of a string, adding it to the table if new.
+
+
+    :param Dict table: String -> code
+    :param String value: String to intern
+    :return: Code
+    :rtype: Int
+    """
+    code = table.get(value)
+    if code is None:
+        code = table[value] = len(table)
+    return code
+
+
+def user_name(user):
+    """
+    Helper function to get the name an issue's user field (e.g. assignee) is reported by.
+
+
+    :param Dict user: Raw user JSON, None when unassigned
+    :return: Display name (login name when there is none), None when unassigned
+    :rtype: String
+    """
+    return (user.get('displayName') or user.get('name')) if user else None
+
+
+def parse_offset(offset):
+    """
+    Helper function to turn a JIRA timezone offset (e.g. +0530) into seconds.
+
+
+    :param String offset: Offset as the last 5 characters of a JIRA timestamp
+    :return: Offset in seconds
+    :rtype: Int
+    """
+    seconds = int(offset[1:3]) * 60 * 60 + int(offset[3:5]) * 60
+    return -seconds if offset[0] == '-' else seconds
+
+
+def parse_timestamps(created):
+    """
+    Function to parse JIRA timestamps into epoch milliseconds in bulk.
+
+    NumPy parses the local part in C, the offsets are interned so each distinct one is only
+    parsed once.
+
+
+    :param List created: Timestamps as returned by JIRA (e.g. 2019-06-03T10:00:00.000+0000)
+    :return: Epoch milliseconds
+    :rtype: numpy.ndarray
+    """
+    if not created:
+        return np.zeros(0, dtype=np.int64)
+    offsets = {}
+    offset_codes = np.fromiter((intern(offsets, value[-5:]) for value in created), dtype=np.int32,
+                               count=len(created))
+    offset_ms = np.array([parse_offset(offset) * 1000 for offset in offsets], dtype=np.int64)
+    local = np.array([value[:-5] for value in created], dtype='datetime64[ms]').astype(np.int64)
+    return local - offset_ms[offset_codes]
+
+
+class Changelog(object):
+    """
+    Status (and resolution) transitions of a set of issues flattened into columnar arrays.
+
+    Issue level arrays (keys, projects, issue_types, categories, created, statuses, resolutions,
+    epics, assignees, priorities) are indexed by issue position. Transition level arrays hold one row per change,
+    grouped by issue and in changelog order: issue_index/from_codes/to_codes/timestamps for status changes
+    and resolution_index/resolution_from/resolution_to/resolution_timestamps for resolution
+    changes. Components have one row per component of an issue (a None row when it has none):
+    component_issues/components. Names are interned into integer codes (project_codes, type_codes,
+    category_codes, status_codes, resolution_codes, epic_codes, assignee_codes, priority_codes,
+    component_codes) and times are epoch milliseconds.
+    """
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+    def __len__(self):
+        return len(self.issue_index)
+
+    @classmethod
+    def from_issues(cls, issues, epic_field=None):
+        """
+        Flatten raw issue JSON into a Changelog.
+
+
+        :param Iterable issues: Raw issue JSON with the changelog expanded
+        :param String epic_field: Field holding the key of the issue's epic (Default = None, not read)
+        :return: Changelog
+        :rtype: Changelog
+        """
+        keys, created = [], []
+        projects, issue_types, categories = array('i'), array('i'), array('i')
+        statuses, resolutions, epics = array('i'), array('i'), array('i')
+        assignees, priorities, component_issues, components = array('i'), array('i'), array('i'), array('i')
+        issue_index, from_codes, to_codes, timestamps = array('i'), array('i'), array('i'), []
+        resolution_index, resolution_from, resolution_to, resolution_timestamps = array('i'), array('i'), \
+            array('i'), []
+        project_codes, type_codes, category_codes = {}, {}, {None: 0}
+        status_codes, resolution_codes, epic_codes = {None: 0}, {None: 0}, {None: 0}
+        assignee_codes, priority_codes, component_codes = {None: 0}, {None: 0}, {None: 0}
+        for issue in issues:
+            fields = issue['fields']
+            position = len(keys)
+            keys.append(issue['key'])
+            created.append(fields['created'])
+            projects.append(intern(project_codes, fields['project']['key']))
+            issue_types.append(intern(type_codes, fields['issuetype']['name']))
+            categories.append(intern(category_codes, (fields['project'].get('projectCategory') or {}).get('name')))
+            statuses.append(intern(status_codes, fields['status']['name']))
+            resolutions.append(intern(resolution_codes, (fields.get('resolution') or {}).get('name')))
+            epic = fields.get(epic_field) if epic_field else None
+            # The Epic Link field holds the key, the parent field the issue
+            epics.append(intern(epic_codes, epic.get('key') if isinstance(epic, dict) else epic))
+            assignees.append(intern(assignee_codes, user_name(fields.get('assignee'))))
+            priorities.append(intern(priority_codes, (fields.get('priority') or {}).get('name')))
+            names = [component['name'] for component in fields.get('components') or ()] or [None]
+            component_issues.extend([position] * len(names))
+            components.extend([intern(component_codes, name) for name in names])
+            for history in issue['changelog']['histories']:
+                for item in history['items']:
+                    if item['field'] == 'status':
+                        issue_index.append(position)
+                        from_codes.append(intern(status_codes, item['fromString']))
+                        to_codes.append(intern(status_codes, item['toString']))
+                        timestamps.append(history['created'])
+                    elif item['field'] == 'resolution':
+                        resolution_index.append(position)
+                        resolution_from.append(intern(resolution_codes, item['fromString']))
+                        resolution_to.append(intern(resolution_codes, item['toString']))
+                        resolution_timestamps.append(history['created'])
+
+        def to_numpy(values):
+            return np.frombuffer(values, dtype=np.int32) if len(values) else np.zeros(0, dtype=np.int32)
+
+        return cls(
+            keys=keys, projects=to_numpy(projects), issue_types=to_numpy(issue_types),
+            categories=to_numpy(categories), created=parse_timestamps(created),
+            statuses=to_numpy(statuses), resolutions=to_numpy(resolutions), epics=to_numpy(epics),
+            assignees=to_numpy(assignees), priorities=to_numpy(priorities),
+            component_issues=to_numpy(component_issues), components=to_numpy(components),
+            issue_index=to_numpy(issue_index), from_codes=to_numpy(from_codes), to_codes=to_numpy(to_codes),
+            timestamps=parse_timestamps(timestamps),
+            resolution_index=to_numpy(resolution_index), resolution_from=to_numpy(resolution_from),
+            resolution_to=to_numpy(resolution_to), resolution_timestamps=parse_timestamps(resolution_timestamps),
+            project_codes=project_codes, type_codes=type_codes, category_codes=category_codes,
+            status_codes=status_codes, resolution_codes=resolution_codes, epic_codes=epic_codes,
+            assignee_codes=assignee_codes, priority_codes=priority_codes, component_codes=component_codes)
+
+
+def condition_table(condition, status_codes):
+    """
+    Helper function to turn one side of a transition condition into per-status lookup tables.
+
+
+    :param Dict condition: Transition condition ({'from': [...], 'to': [...]})
+    :param Dict status_codes: Status -> code
+    :return: From status code -> matches, To status code -> matches
+    :rtype: Tuple
+    """
+    from_statuses, to_statuses = compile_condition(condition)
+    tables = []
+    for statuses in (from_statuses, to_statuses):
+        table = np.ones(len(status_codes), dtype=bool)
+        if statuses is not None:
+            table[:] = False
+            table[[code for status, code in status_codes.items() if status in statuses]] = True
+        tables.append(table)
+    return tuple(tables)
+
+
+def segments(issue_index):
+    """
+    Helper function to find where each issue's transitions start in the transition arrays.
+
+
+    :param numpy.ndarray issue_index: Issue of every row (grouped by issue)
+    :return: First row of every issue that has transitions, Number of rows of each of them
+    :rtype: Tuple
+    """
+    boundaries = np.flatnonzero(np.diff(issue_index)) + 1
+    starts = np.concatenate(([0], boundaries)) if len(issue_index) else np.zeros(0, dtype=np.intp)
+    lengths = np.diff(np.concatenate((starts, [len(issue_index)])))
+    return starts, lengths
+
+
+def once_per_issue(is_start, is_end, starts, lengths):
+    """
+    Function to pair transitions when a metric records at most one interval per issue.
+
+    The clock starts on the last start before the first end that follows a start, and stops on
+    the last end (a row matching both acts as a start until the clock has stopped once).
+
+
+    :param numpy.ndarray is_start: Rows that match the start condition
+    :param numpy.ndarray is_end: Rows that match the end condition
+    :param numpy.ndarray starts: First row of every issue
+    :param numpy.ndarray lengths: Number of rows of every issue
+    :return: Start rows, End rows
+    :rtype: Tuple
+    """
+    size = len(is_start)
+    if not size:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    position = np.arange(size)
+    first_start = np.repeat(np.minimum.reduceat(np.where(is_start, position, size), starts), lengths)
+    first_end = np.repeat(np.minimum.reduceat(
+        np.where(is_end & ~is_start & (position > first_start), position, size), starts), lengths)
+    last_start = np.maximum.reduceat(np.where(is_start & (position < first_end), position, -1), starts)
+    last_end = np.maximum.reduceat(np.where(is_end & (position >= first_end), position, -1), starts)
+    complete = (last_start >= 0) & (last_end >= 0)
+    return last_start[complete], last_end[complete]
+
+
+def every_pair(is_start, is_end, issue_index):
+    """
+    Function to pair transitions when a metric records every start/end pair in an issue.
+
+    An end closes a pair exactly when the previous start/end row of the same issue is a start.
+
+
+    :param numpy.ndarray is_start: Rows that match the start condition
+    :param numpy.ndarray is_end: Rows that match the end condition
+    :param numpy.ndarray issue_index: Issue of every row
+    :return: Start rows, End rows
+    :rtype: Tuple
+    """
+    events = np.flatnonzero(is_start | is_end)
+    event_is_start = is_start[events]
+    closes = ~event_is_start[1:] & event_is_start[:-1] & (issue_index[events[1:]] == issue_index[events[:-1]])
+    return events[:-1][closes], events[1:][closes]
+
+
+def match_rows(changelog, definitions, workflows):
+    """
+    Function to find the rows matching the start and end conditions of every metric.
+
+    Rows are split by whether the issue's workflow records every pair ('repeat') or one per issue.
+
+
+    :param Changelog changelog: Changelog
+    :param Dict definitions: Metric name -> definition (see transitions.StateMachine)
+    :param Dict workflows: Workflow name -> List of project keys
+    :return: Metric name -> (Starts, Ends) once per issue, (Starts, Ends) every pair
+    :rtype: Dict
+    """
+    project_names = list(changelog.project_codes)
+    workflow_names = list(dict.fromkeys([get_workflow(project, workflows) for project in project_names]))
+    project_workflow = np.array([workflow_names.index(get_workflow(project, workflows))
+                                 for project in project_names], dtype=np.int32)
+    row_project = changelog.projects[changelog.issue_index]
+    row_type = changelog.issue_types[changelog.issue_index]
+    row_workflow = project_workflow[row_project] if len(project_workflow) else row_project
+    matches = {}
+    for name, definition in definitions.items():
+        is_start = {False: np.zeros(len(changelog), dtype=bool), True: np.zeros(len(changelog), dtype=bool)}
+        is_end = {False: np.zeros(len(changelog), dtype=bool), True: np.zeros(len(changelog), dtype=bool)}
+        for code, workflow in enumerate(workflow_names):
+            resolved = resolve_definition(definition, workflow)
+            rows = row_workflow == code
+            if resolved.get('issue_types'):
+                rows &= np.isin(row_type, [changelog.type_codes[t] for t in resolved['issue_types']
+                                           if t in changelog.type_codes])
+            if resolved.get('projects'):
+                rows &= np.isin(row_project, [changelog.project_codes[p] for p in resolved['projects']
+                                              if p in changelog.project_codes])
+            start_from, start_to = condition_table(resolved['start'], changelog.status_codes)
+            end_from, end_to = condition_table(resolved['end'], changelog.status_codes)
+            repeat = bool(resolved.get('repeat'))
+            is_start[repeat] |= rows & start_from[changelog.from_codes] & start_to[changelog.to_codes]
+            is_end[repeat] |= rows & end_from[changelog.from_codes] & end_to[changelog.to_codes]
+        matches[name] = (is_start[False], is_end[False]), (is_start[True], is_end[True])
+    return matches
+
+
+def pair_rows(changelog, matches, keep=None, calendar=None):
+    """
+    Function to turn matched rows into durations.
+
+
+    :param Changelog changelog: Changelog
+    :param Dict matches: Result of match_rows
+    :param numpy.ndarray keep: Only use these rows, e.g. the ones before a date (Default = every row)
+    :param workdays.WorkingCalendar calendar: Measure working time instead of wall-clock time (Default = None)
+    :return: Metric name -> durations in seconds
+    :rtype: Dict
+    """
+    return {name: durations for name, (_, durations) in pair_issues(changelog, matches, keep, calendar).items()}
+
+
+def pair_issues(changelog, matches, keep=None, calendar=None):
+    """
+    Function to turn matched rows into durations, with the issue every duration belongs to.
+
+
+    :param Changelog changelog: Changelog
+    :param Dict matches: Result of match_rows
+    :param numpy.ndarray keep: Only use these rows, e.g. the ones before a date (Default = every row)
+    :param workdays.WorkingCalendar calendar: Measure working time instead of wall-clock time (Default = None)
+    :return: Metric name -> (Issue positions, durations in seconds)
+    :rtype: Dict
+    """
+    issue_index, timestamps = changelog.issue_index, changelog.timestamps
+    if keep is not None:
+        issue_index, timestamps = issue_index[keep], timestamps[keep]
+    starts, lengths = segments(issue_index)
+    results = {}
+    for name, ((once_start, once_end), (every_start, every_end)) in matches.items():
+        if keep is not None:
+            once_start, once_end = once_start[keep], once_end[keep]
+            every_start, every_end = every_start[keep], every_end[keep]
+        once_starts, once_ends = once_per_issue(once_start, once_end, starts, lengths)
+        every_starts, every_ends = every_pair(every_start, every_end, issue_index)
+        start_rows = np.concatenate((once_starts, every_starts))
+        end_rows = np.concatenate((once_ends, every_ends))
+        started, ended = timestamps[start_rows], timestamps[end_rows]
+        # Pairs are kept on wall-clock time, so the same issues count whatever the calendar
+        kept = ended > started
+        started, ended = started[kept], ended[kept]
+        results[name] = issue_index[start_rows[kept]], \
+            calendar.seconds(started, ended) if calendar is not None else (ended - started) / 1000
+    return results
@@ -1,6 +1,129 @@
+import os
+
 config = {
     # Start date to bound query in the form YEAR\\u002MONTH\\u002fDAY
     'start_date': '2019\\u002f06\\u002f1',
     # Projects to query
-    'projects': ('DEMO_PROJECT')
-}
\ No newline at end of file
+    'projects': ('DEMO_PROJECT'),
+    # Teams to report on separately: Team name -> project keys. Each team gets its own sheet tab
+    # named after it, leave empty to report on 'projects' as a whole
+    'teams': {},
+    # Worker processes computing team reports in parallel
+    'team_workers': os.cpu_count(),
+    # Workflows other than the default one: Workflow name -> projects following it
+    'workflows': {
+        # Resolved based workflow without a separate QE team
+        'alternate': ['FACTORY', 'BST', 'COMPOSE', 'NOS'],
+    },
+    # Duration metrics: average days between a start and an end status transition.
+    # 'start'/'end' match on the 'from' and/or 'to' status, 'issue_types' and 'projects'
+    # limit which issues count, 'repeat' records every pair in an issue instead of one, and
+    # 'workflows' overrides any of these keys for the projects of a workflow.
+    'duration_metrics': {
+        'Average Code Review Time': {
+            'issue_types': ['Bug', 'Story'],
+            'start': {'to': ['Code Review']},
+            'end': {'from': ['Code Review']},
+        },
+        'Average Code Review to QE': {
+            'issue_types': ['Bug', 'Story'],
+            'start': {'from': ['In Progress'], 'to': ['Code Review']},
+            'end': {'from': ['Code Review'], 'to': ['Testing', 'Merged']},
+        },
+        'Time to Deploy': {
+            'issue_types': ['Bug', 'Story'],
+            'start': {'to': ['Release Pending', 'Release_Pending']},
+            'end': {'to': ['Closed']},
+        },
+        'Bug Cycle Time': {
+            'issue_types': ['Bug'],
+            'start': {'to': ['In Progress']},
+            'end': {'to': ['Closed']},
+            'workflows': {'alternate': {'end': {'to': ['Resolved']}}},
+        },
+        'Story Cycle Time': {
+            'issue_types': ['Story'],
+            'start': {'to': ['In Progress']},
+            'end': {'to': ['Closed']},
+            'workflows': {'alternate': {'end': {'to': ['Resolved']}}},
+        },
+        'Passing QE': {
+            'issue_types': ['Bug', 'Story'],
+            'start': {'to': ['Merged']},
+            'end': {'to': ['Verified', 'In Progress']},
+            'repeat': True,
+            'workflows': {'alternate': {
+                'start': {'to': ['Testing']},
+                'end': {'to': ['In Progress', 'Release Pending']},
+            }},
+        },
+    },
+    # Distribution columns reported next to every duration metric's average:
+    # column suffix -> quantile (1 is the exact maximum)
+    'duration_quantiles': {'p50': 0.5, 'p85': 0.85, 'p95': 0.95, 'max': 1},
+    # Relative accuracy of the duration quantiles
+    'sketch_accuracy': 0.01,
+    # Working calendar duration metrics are measured in, instead of wall-clock days (set to None for
+    # wall-clock days): 'weekmask' (e.g. 'Mon Tue Wed Thu Fri'), 'holidays' (list of YEAR-MONTH-DAY),
+    # 'hours' (working hours as (start, end), e.g. (9, 17.5), durations are then in working days
+    # of that length) and 'utc_offset' of the working hours (e.g. '-0500')
+    'calendar': None,
+    # Team name -> calendar keys overriding 'calendar' for that team, e.g. {'Team A': {'holidays': [...]}}
+    'team_calendars': {},
+    # Maximum number of JIRA requests to run at the same time
+    'max_workers': 8,
+    # Seconds a single metric may take before it is reported as missing
+    'metric_timeout': 15 * 60,
+    # Number of issues to request per search page
+    'page_size': 100,
+    # How many times to retry a request JIRA throttled (429/503) or that could not reach JIRA, and
+    # the base backoff in seconds
+    'max_retries': 5,
+    'backoff_base': 1,
+    # Seconds to wait for a connection to JIRA and for each read of its answer
+    'request_timeout': (10, 120),
+    # Directory of the local issue cache (set to None to always query JIRA directly)
+    'cache_dir': os.environ.get('JETRICS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'jetrics')),
+    # Days between full re-downloads of the cache, which also drop deleted/moved issues
+    'cache_full_sync_days': 7,
+    # Extra minutes added to every incremental sync window to cover clock skew
+    'cache_sync_margin': 5,
+    # JSON report of every run, e.g. jetrics-run.json: time, JIRA requests, pages, bytes and retries
+    # per metric and per query, and Sheets calls (set to None to skip it)
+    'run_report': os.environ.get('JETRICS_RUN_REPORT'),
+    # The same report for the node exporter's textfile collector, e.g.
+    # /var/lib/node_exporter/textfile_collector/jetrics.prom (set to None to skip it)
+    'prometheus_textfile': os.environ.get('JETRICS_PROMETHEUS_TEXTFILE'),
+    # Snapshot to record every raw JIRA response of a run to, e.g. run.ndjson.gz, and snapshot to
+    # replay instead of querying JIRA (set to None to not record/replay). The commands turn off the
+    # issue cache while recording or replaying, so a snapshot holds the whole population
+    'record_snapshot': os.environ.get('JETRICS_RECORD'),
+    'replay_snapshot': os.environ.get('JETRICS_REPLAY'),
+    # Where computed rows are written: 'sheets' (the Google Sheet), 'history' (the local columnar
+    # history store, see history_dir) and/or the dotted path of another sinks.Sink class
+    'sinks': ['sheets'],
+    # Directory of the local history store, one sub directory per sheet
+    'history_dir': os.environ.get('JETRICS_HISTORY_DIR',
+                                  os.path.join(os.path.expanduser('~'), '.local', 'share', 'jetrics', 'history')),
+    # Epic label of the current quarter: Work Outside of Quarterly Planning counts the issues filed
+    # under its epics
+    'quarter_label': 'Y19-Q4',
+    # Epic labels of the quarters to report planned work for: each adds a 'Planned Work <label>'
+    # column, and 'Unplanned Work' counts the issues under none of these epics (leave empty to skip)
+    'quarter_labels': [],
+    # Issue field linking an issue to its epic: the Epic Link custom field of JIRA Server, or 'parent'
+    'epic_link_field': 'customfield_10008',
+    # Google Sheets spreadsheet to sync with (set to None to read SPREADSHEET_ID from the environment
+    # when the sheet is first written, runs that do not sync never need it)
+    'spreadsheet_id': None,
+    # Service mode (jetrics-service): address and port serving the latest values, seconds
+    # between refreshes and whether every refresh is also written to the sheet
+    'service_host': '127.0.0.1',
+    'service_port': 8787,
+    'service_interval': 60 * 60,
+    'service_sync_upstream': True,
+    # Service mode webhooks (POST /webhook): shared secret JIRA must pass as ?secret=... (webhooks
+    # are refused while it is None) and events between two snapshots of the incremental aggregates
+    'webhook_secret': os.environ.get('JETRICS_WEBHOOK_SECRET'),
+    'webhook_checkpoint_events': 1000,
+}
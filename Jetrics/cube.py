@@ -0,0 +1,173 @@
+# Built In Modules
+from datetime import date
+import logging
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics.query import MULTI_VALUED, TABLES
+
+# Global Variables
+DAY_MS = 24 * 60 * 60 * 1000
+EPOCH = date(1970, 1, 1)
+# Fields the metrics can be broken down by
+DIMENSIONS = ('assignee', 'component', 'priority')
+log = logging.getLogger(__name__)
+
+
+class MetricCube(object):
+    """
+    Metrics of a base population for any window of creation days, as a whole or broken down by a dimension.
+
+    Every measure (the issues a count metric matches, the durations of a duration metric and
+    how many there are) is summed per issue once, then per creation day and dimension value,
+    and the sums are accumulated over the days. The sums of any window are the difference of
+    two rows of these prefix sums, so windows cost the same whatever their length and no
+    query is sent to JIRA. The prefix sums of a dimension are built the first time it is asked for.
+
+    A window holds the issues created in it: its values are what the metrics give with
+    config['start_date'] moved to its first day.
+    """
+    def __init__(self, index):
+        """
+        :param query.IssueIndex index: Index of the base population
+        """
+        self.index = index
+        arrays = index.get_arrays()
+        # Days issues were created on (UTC), and the position of every issue's day among them
+        self.days, self.issue_days = np.unique(arrays['created'] // DAY_MS, return_inverse=True)
+        # Measure name -> sum per issue, 'issues' tells which dimension values a window has
+        self.measures = {'issues': np.ones(len(self.issue_days))}
+        # Column -> (kind, measure names, seconds of a day for averages)
+        self.columns = {}
+        # Dimension -> value names, prefix sums of every measure (day + 1 x value x measure)
+        self.tables = {}
+
+    def add_measure(self, name, weights):
+        """
+        Helper to add a measure, dropping the prefix sums built without it.
+
+
+        :param String name: Measure name
+        :param numpy.ndarray weights: Sum of the measure per issue
+        """
+        self.measures[name] = np.asarray(weights, dtype=np.float64)
+        self.tables = {}
+
+    def add_count(self, column, mask):
+        """
+        Add a count metric.
+
+
+        :param String column: Column title
+        :param numpy.ndarray mask: Issues it counts
+        """
+        self.add_measure(column, mask)
+        self.columns[column] = ('count', (column,), None)
+
+    def add_ratio(self, column, numerator, denominator):
+        """
+        Add a metric dividing two counts (-1 when the denominator is 0).
+
+
+        :param String column: Column title
+        :param numpy.ndarray numerator: Issues counted above
+        :param numpy.ndarray denominator: Issues counted below
+        """
+        self.add_measure(f'{column} numerator', numerator)
+        self.add_measure(f'{column} denominator', denominator)
+        self.columns[column] = ('ratio', (f'{column} numerator', f'{column} denominator'), None)
+
+    def add_durations(self, column, issues, seconds, day_seconds):
+        """
+        Add a duration metric, reported as its average in days (-1 when there is no duration).
+
+
+        :param String column: Column title
+        :param numpy.ndarray issues: Issue position of every duration
+        :param numpy.ndarray seconds: Durations in seconds
+        :param Float day_seconds: Seconds of a day
+        """
+        size = len(self.issue_days)
+        self.add_measure(f'{column} seconds', np.bincount(issues, seconds, minlength=size))
+        self.add_measure(f'{column} durations', np.bincount(issues, minlength=size))
+        self.columns[column] = ('average', (f'{column} seconds', f'{column} durations'), day_seconds)
+
+    def get_table(self, dimension=None):
+        """
+        Get the value names and prefix sums of a dimension, building them if needed.
+
+
+        :param String dimension: Field in DIMENSIONS (Default = None, the whole population)
+        :return: Value names, Prefix sums (day + 1 x value x measure)
+        :rtype: Tuple
+        """
+        table = self.tables.get(dimension)
+        if table is not None:
+            return table
+        size = len(self.issue_days)
+        if dimension is None:
+            names, issues, codes = [None], np.arange(size), np.zeros(size, dtype=np.intp)
+        elif dimension in DIMENSIONS:
+            arrays = self.index.get_arrays()
+            array, code_table = TABLES[dimension]
+            # Code tables are dicts filled in code order
+            names, codes = list(getattr(self.index, code_table)), arrays[array]
+            issues = arrays[MULTI_VALUED[dimension]] if dimension in MULTI_VALUED else np.arange(size)
+        else:
+            raise ValueError(f"Unknown dimension {dimension}, expected one of {', '.join(DIMENSIONS)}")
+        cells = self.issue_days[issues] * len(names) + codes
+        sums = np.empty((len(self.days) + 1, len(names), len(self.measures)))
+        sums[0] = 0
+        for position, weights in enumerate(self.measures.values()):
+            sums[1:, :, position] = np.bincount(cells, weights[issues], minlength=len(self.days) * len(names)) \
+                .reshape(len(self.days), len(names))
+        np.cumsum(sums, axis=0, out=sums)
+        table = self.tables[dimension] = names, sums
+        return table
+
+    def sums(self, start=None, end=None, dimension=None):
+        """
+        Function to sum every measure over the issues created in a window.
+
+
+        :param datetime.date start: First creation day (Default = None, the first issue)
+        :param datetime.date end: Last creation day, included (Default = None, the last issue)
+        :param String dimension: Field in DIMENSIONS (Default = None, the whole population)
+        :return: Value names, Sums (value x measure)
+        :rtype: Tuple
+        """
+        names, table = self.get_table(dimension)
+        first = np.searchsorted(self.days, (start - EPOCH).days) if start else 0
+        last = np.searchsorted(self.days, (end - EPOCH).days, side='right') if end else len(self.days)
+        return names, table[max(last, first)] - table[first]
+
+    def values(self, start=None, end=None, dimension=None):
+        """
+        Function to get the metrics of the issues created in a window.
+
+
+        :param datetime.date start: First creation day (Default = None, the first issue)
+        :param datetime.date end: Last creation day, included (Default = None, the last issue)
+        :param String dimension: Field in DIMENSIONS (Default = None, the whole population)
+        :return: Column -> value, or with a dimension: Value name -> (Column -> value)
+        :rtype: Dict
+        """
+        names, sums = self.sums(start, end, dimension)
+        positions = {name: position for position, name in enumerate(self.measures)}
+        rows = [{} for _ in names]
+        for column, (kind, measures, day_seconds) in self.columns.items():
+            for row, above, below in zip(rows, sums[:, positions[measures[0]]], sums[:, positions[measures[-1]]]):
+                if kind == 'count':
+                    row[column] = int(round(above))
+                elif not below:
+                    row[column] = -1
+                elif kind == 'ratio':
+                    row[column] = float(above / below)
+                else:
+                    row[column] = float(above / below / day_seconds)
+        if dimension is None:
+            return rows[0]
+        # Values with no issue created in the window are left out
+        return {name: row for name, row, issues in zip(names, rows, sums[:, positions['issues']]) if issues}
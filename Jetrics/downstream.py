@@ -1,20 +1,89 @@
 # Built In Modules
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+from functools import partial
+from itertools import islice
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 import logging
 
 # 3rd Party Modules
 import jira
+import numpy as np
 
 # Local Modules
 from Jetrics.config import config
+from Jetrics import cache, columnar, epics, fetch, query, snapshot, transitions, workdays
+from Jetrics.cube import MetricCube
+from Jetrics.sketch import QuantileSketch
 # Global Variables
 create_date = f"createdDate > {config['start_date']}"
-projects_in = f"Project in {config['projects']}"
-standard_jql = f"{create_date} AND {projects_in}"
+# Every duration metric from config['duration_metrics']
+duration_machine = transitions.StateMachine(config['duration_metrics'], config['workflows'])
+duration_issue_types = duration_machine.issue_types
+# Issue fields the metrics read, everything else is left on the server
+issue_fields = ['project', 'issuetype', 'status', 'resolution', 'created', 'updated', config['epic_link_field']]
+# Issue fields only breakdowns read (see metric_cube)
+breakdown_fields = ['assignee', 'priority', 'components']
+# Globals set by configure
+CONFIGURED = ('projects_in', 'standard_jql', 'changelog_jql', 'work_in_progress_jql', 'qe_gaps_jql',
+              'bugs_caught_jql', 'resolved_bugs_jql', 'resolved_other_jql', 'deferred_jql', 'declined_jql',
+              'group_projects', 'working_calendar')
 log = logging.getLogger(__name__)
 
 
+def configure(projects, team=None):
+    """
+    Function to point every query of this module at a set of projects.
+
+    Called on import with config['projects']. Anything else pointing the module at other
+    projects for a while uses configured, which puts the previous ones back.
+
+
+    :param String|List projects: JQL project list, or list of project keys of a team
+    :param String team: Team whose working calendar durations are measured in (Default = None)
+    """
+    global projects_in, standard_jql, changelog_jql, work_in_progress_jql, qe_gaps_jql, bugs_caught_jql, \
+        resolved_bugs_jql, resolved_other_jql, deferred_jql, declined_jql, group_projects, working_calendar
+    working_calendar = workdays.WorkingCalendar.from_config(team)
+    # A list of keys means we are a subset of a cache holding more projects
+    group_projects = list(projects) if isinstance(projects, (list, tuple)) else None
+    if group_projects is not None:
+        projects = f"({', '.join(group_projects)})"
+    projects_in = f"Project in {projects}"
+    standard_jql = f"{create_date} AND {projects_in}"
+    changelog_jql = f"{standard_jql} AND type in ({', '.join(duration_issue_types)})" \
+        if duration_issue_types else standard_jql
+    work_in_progress_jql = f"{standard_jql} AND status = 'In Progress'"
+    qe_gaps_jql = f"{standard_jql} AND category = 'Product Pipeline' and status changed from Verified to Testing"
+    bugs_caught_jql = f"{standard_jql} AND status changed from Testing to 'In Progress'"
+    resolved_bugs_jql = f"{standard_jql} AND type = Bug and resolution is not EMPTY"
+    resolved_other_jql = f"{standard_jql} AND type != Bug and resolution is not EMPTY"
+    deferred_jql = f"{standard_jql} AND resolution = Deferred"
+    declined_jql = f"{standard_jql} AND resolution = \"Won't Fix\""
+
+
+configure(config['projects'])
+
+
+@contextmanager
+def configured(projects, team=None):
+    """
+    Context manager to point every query of this module at a set of projects, restoring the previous ones on exit.
+
+
+    :param String|List projects: JQL project list, or list of project keys of a team
+    :param String team: Team whose working calendar durations are measured in (Default = None)
+    """
+    previous = {name: globals()[name] for name in CONFIGURED}
+    configure(projects, team)
+    try:
+        yield
+    finally:
+        globals().update(previous)
+
+
 def get_jira_client(verify=True):
     """
     Function to create JIRA client.
@@ -23,6 +92,13 @@ def get_jira_client(verify=True):
     :returns: JIRA client
     :rtype: jira.client.JIRA
     """
+    replayer = snapshot.get_replayer()
+    if replayer is not None:
+        # Every response comes from the snapshot, JIRA is never asked anything
+        server = replayer.header.get('server') or 'http://jira.invalid'
+        client = jira.client.JIRA(options={'server': server, 'verify': verify}, get_server_info=False)
+        fetch.register_client(client, server, verify=verify)
+        return client
     jira_info = {
         'options': {
             'server': os.environ['JIRA_URL'],
@@ -32,6 +108,8 @@ def get_jira_client(verify=True):
     }
 
     client = jira.client.JIRA(**jira_info)
+    # The fetcher's own sessions use the same settings
+    fetch.register_client(client, jira_info['options']['server'], jira_info['basic_auth'], verify)
     return client
 
 
@@ -39,348 +117,549 @@ def get_average(differences):
     """
     Helper function to calculate average days from list of time.
 
+    Kept for callers of the original API, the duration metrics average their sketches instead
+    (see summarize_durations).
+
 
     :param List differences: List of time differences
     :return: Average days
+    :rtype: Float
+    """
+    return sum(differences, timedelta(0)).total_seconds() / timedelta(days=1).total_seconds() / len(differences)
+
+
+def count_issues(client, jql, index=None):
+    """
+    Function to count the issues matching a JQL query without downloading them.
+
+    With an index of the base population the count is answered locally, only queries using
+    clauses the index does not support (e.g. issueFunction) are sent to JIRA.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String jql: JQL to count
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
+    :return: Number of matching issues
     :rtype: Int
     """
-    sum = timedelta(days=0)
-    for difference in differences:
-        sum += difference
-    avg = (sum.total_seconds()/60/60/24)/len(differences)
-    return avg
+    if index is not None:
+        try:
+            return index.count(jql)
+        except query.UnsupportedQuery as error:
+            log.info(f'Counting on JIRA, {error}')
+    # maxResults=0 makes JIRA answer with the total only, no issue bodies
+    resp = fetch.get_json(client, 'search', {'jql': jql, 'maxResults': 0, 'fields': 'key'})
+    return resp['total']
 
 
-def current_work_in_progress(client):
+def count_issues_concurrently(client, queries, index=None):
+    """
+    Function to run several independent count queries at the same time.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param Dict queries: Name -> JQL to count
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
+    :return: Name -> Number of matching issues
+    :rtype: Dict
+    """
+    if not queries:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(queries), config['max_workers'])) as executor:
+        futures = {name: executor.submit(contextvars.copy_context().run, count_issues, client, jql, index)
+                   for name, jql in queries.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def current_work_in_progress(client, index=None):
     """
     Function to get Current Work in Progress.
 
 
     :param jira.client.JIRA client: JIRA Client
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
     :return: Number of issues in progress
     :rtype: Int
     """
-    jql = f"{standard_jql} AND status = 'In Progress'"
-    return len(client.search_issues(jql))
+    return count_issues(client, work_in_progress_jql, index)
 
 
-def average_code_review_time(client):
+def iter_changelog_issues(client):
     """
-    Function to get the average time tickets spend under code review
+    Function to stream the changelog set shared by all duration metrics from JIRA, a page at a time.
 
 
     :param jira.client.JIRA client: JIRA Client
-    :return: Average number of days spent in code review
-    :rtype: Int
+    :return: Generator of raw issue JSON with the changelog expanded
+    :rtype: Generator
     """
-    jql = f"{standard_jql} AND type in (Bug, Story)"
-    issues = client.search_issues(jql, expand='changelog')
-    if len(issues) < 1:
-        log.warning(f'No issues could be found for JQL: {jql}')
-        return
-    start_time = None
-    end_time = None
-    differences = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == 'status':
-                    if item.toString == 'Code Review' and not end_time:
-                        start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    elif item.fromString == 'Code Review' and start_time:
-                        end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-        if start_time and end_time:
-            if start_time < end_time and end_time > start_time:
-                differences.append(end_time - start_time)
-                start_time = None
-                end_time = None
-    if len(differences) < 1:
-        log.warning(f'No issues have transitioned in/out of Code Review')
-        return -1
+    return fetch.iter_raw_issues(client, changelog_jql, fields=issue_fields, expand='changelog')
 
-    return get_average(differences)
+
+def iter_population(client, store=None, fields=None):
+    """
+    Function to stream the base population (standard_jql, every issue type), a page at a time.
 
 
-def average_code_review_to_qe(client):
+    :param jira.client.JIRA client: JIRA Client
+    :param sqlite3.Connection store: Issue cache to read from instead of JIRA (Default = None)
+    :param List fields: Issue fields to download (Default = issue_fields)
+    :return: Generator of raw issue JSON with the changelog expanded
+    :rtype: Generator
     """
-    Function to get the average time tickets spend from code review -> Merged (or Testing)
+    if store is not None:
+        return cache.iter_issues(store, projects=group_projects)
+    return fetch.iter_raw_issues(client, standard_jql, fields=fields or issue_fields, expand='changelog')
+
+
+def duration_columns():
+    """
+    Helper function to list the sheet columns of the duration metrics, in the order summarize_durations returns them.
+
+
+    :return: Column titles
+    :rtype: List
+    """
+    columns = []
+    for name in config['duration_metrics']:
+        columns.append(name)
+        columns.extend(f'{name} {suffix}' for suffix in config['duration_quantiles'])
+    return columns
+
+
+def new_sketches():
+    """
+    Helper function to start an empty sketch for every duration metric.
+
+
+    :return: Metric name -> sketch
+    :rtype: Dict
+    """
+    return {name: QuantileSketch(config['sketch_accuracy']) for name in config['duration_metrics']}
+
+
+def iter_changelogs(issues):
+    """
+    Function to flatten issues into columnar changelogs, config['page_size'] issues at a time.
+
+
+    :param Iterable issues: Raw issue JSON with the changelog expanded
+    :return: Generator of columnar.Changelog
+    :rtype: Generator
+    """
+    issues = iter(issues)
+    while True:
+        batch = list(islice(issues, config['page_size']))
+        if not batch:
+            return
+        yield columnar.Changelog.from_issues(batch, config['epic_link_field'])
+
+
+def add_durations(sketches, changelog, pairs=None, offset=0):
+    """
+    Function to add the durations of every duration metric in a changelog to their sketches.
+
+    Start/end pairs never span two issues, so changelogs can be added a page at a time.
+    Durations are working time when a working calendar is configured.
+
+
+    :param Dict sketches: Metric name -> sketch of the durations in seconds
+    :param columnar.Changelog changelog: Changelog
+    :param Dict pairs: Metric name -> List to also append (issue positions, durations) to (Default = None)
+    :param Int offset: Position of the changelog's first issue in the population (Default = 0)
+    """
+    matches = columnar.match_rows(changelog, config['duration_metrics'], config['workflows'])
+    for name, (issues, durations) in columnar.pair_issues(changelog, matches, calendar=working_calendar).items():
+        sketches[name].add_many(durations)
+        if pairs is not None:
+            pairs[name].append((issues + offset, durations))
+
+
+def duration_sketches(issues):
+    """
+    Function to sketch the durations of every duration metric from columnar views of the changelogs.
+
+    Start/end pairs never span two issues, so the issues are evaluated config['page_size'] at
+    a time and only the sketches are kept. Passing a generator keeps memory flat however
+    many issues there are.
+
+
+    :param Iterable issues: Issues from iter_changelog_issues
+    :return: Metric name -> sketch of the durations in seconds
+    :rtype: Dict
+    """
+    sketches = new_sketches()
+    seen = 0
+    for changelog in iter_changelogs(issues):
+        seen += len(changelog.keys)
+        add_durations(sketches, changelog)
+    if seen < 1:
+        log.warning(f'No issues could be found for JQL: {changelog_jql}')
+    return sketches
+
+
+def load_population(client, store=None, issues=None, pairs=None):
+    """
+    Function to go over the base population once, for every count and duration metric.
+
+    The issues are indexed for the count metrics (see query.IssueIndex) and their durations
+    sketched, config['page_size'] issues at a time, so only the index and the sketches are
+    kept. The count metrics then make no JIRA request unless their JQL is not supported by
+    the index.
+
+    Without the issue cache, issues or pairs, only the issues the duration metrics need are
+    downloaded (changelog_jql) and no index is built: the count metrics are counted by JIRA
+    with one maxResults=0 query each rather than downloading every other issue and its changelog.
 
 
     :param jira.client.JIRA client: JIRA Client
-    :return: Average number of days spent in code review
-    :rtype: Int
+    :param sqlite3.Connection store: Issue cache to read from instead of JIRA (Default = None)
+    :param Iterable issues: Already fetched issues of the base population (Default = None, streamed)
+    :param Dict pairs: Metric name -> List to also keep every duration and its issue in, for
+        metric_cube, which also downloads the breakdown_fields (Default = None)
+    :return: Index of the population (None when JIRA counts), Metric name -> sketch of the durations in seconds
+    :rtype: Tuple
     """
-    jql = f"{standard_jql} AND type in (Bug, Story)"
-    issues = client.search_issues(jql, expand='changelog')
-    if len(issues) < 1:
-        log.warning(f'No issues could be found for JQL: {jql}')
-        return
-    start_time = None
-    end_time = None
-    differences = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == 'status':
-                    if item.toString == 'Code Review' and item.fromString == 'In Progress' and not end_time:
-                        start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    elif (item.toString == 'Testing' or item.toString == 'Merged') and item.fromString == 'Code Review' \
-                            and start_time:
-                        end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-        if start_time and end_time:
-            if start_time < end_time and end_time > start_time:
-                differences.append(end_time - start_time)
-                start_time = None
-                end_time = None
-
-    if len(differences) < 1:
-        log.warning(f'No issues have transitioned from Code Review -> Merged/Testing')
-        return -1
+    if store is None and issues is None and pairs is None:
+        return None, duration_sketches(iter_changelog_issues(client))
+    if issues is None:
+        issues = iter_population(client, store, issue_fields + breakdown_fields if pairs is not None else None)
+    index = query.IssueIndex(standard_jql)
+    sketches = new_sketches()
+    for changelog in iter_changelogs(issues):
+        add_durations(sketches, changelog, pairs, len(index))
+        index.add(changelog)
+    if len(index) < 1:
+        log.warning(f'No issues could be found for JQL: {standard_jql}')
+    return index, sketches
+
+
+def summarize_durations(sketches, calendar=None):
+    """
+    Function to turn duration sketches into sheet values in days.
+
 
-    return get_average(differences)
+    :param Dict sketches: Metric name -> sketch of the durations in seconds
+    :param workdays.WorkingCalendar calendar: Calendar the durations were measured in, to report working
+        days (Default = the configured working_calendar)
+    :return: Column title -> number of days (-1 when no issue completed the transitions)
+    :rtype: Dict
+    """
+    calendar = calendar or working_calendar
+    day = calendar.day_seconds if calendar is not None else timedelta(days=1).total_seconds()
+    values = {}
+    for name, sketch in sketches.items():
+        if len(sketch) < 1:
+            log.warning(f'No issues have completed the transitions for {name}')
+            values[name] = -1
+        else:
+            values[name] = sketch.mean() / day
+        for suffix, quantile in config['duration_quantiles'].items():
+            values[f'{name} {suffix}'] = sketch.quantile(quantile) / day if len(sketch) else -1
+    return values
+
+
+def duration_averages(client, names, issues=None):
+    """
+    Helper function to get the average of some duration metrics, for the per-metric functions.
 
 
-def time_to_deploy(client):
+    :param jira.client.JIRA client: JIRA Client
+    :param List names: Duration metric names, from config['duration_metrics']
+    :param Iterable issues: Already fetched changelog issues (Default = None, streamed from JIRA)
+    :return: Average number of days of every metric (-1 when no issue completed the transitions)
+    :rtype: Tuple
     """
-    Function to get the average number of days between release-pending and closed
+    values = summarize_durations(duration_sketches(issues if issues is not None else iter_changelog_issues(client)))
+    return tuple(values[name] for name in names)
+
+
+def average_code_review_time(client, issues=None):
+    """
+    Function to get the average time tickets spend under code review
+
+    The per-metric functions are thin wrappers over the shared pipeline (duration_sketches and
+    summarize_durations), kept for callers of the original API. A report computes every
+    duration metric at once instead (see load_population).
+
 
     :param jira.client.JIRA client: JIRA Client
+    :param Iterable issues: Already fetched changelog issues (Default = None, streamed from JIRA)
     :return: Average number of days spent in code review
-    :rtype: Int
+    :rtype: Float
     """
-    jql = f"{standard_jql} AND type in (Bug, Story)"
-    issues = client.search_issues(jql, expand='changelog')
-    if len(issues) < 1:
-        log.warning(f'No issues could be found for JQL: {jql}')
-        return
-    start_time = None
-    end_time = None
-    differences = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == 'status':
-                    if (item.toString == 'Release Pending' or item.toString == 'Release_Pending') and not end_time:
-                        start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    elif item.toString == 'Closed' and start_time:
-                        end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-        if start_time and end_time:
-            if start_time < end_time and end_time > start_time:
-                differences.append(end_time - start_time)
-                start_time = None
-                end_time = None
-
-    if len(differences) < 1:
-        log.warning(f'No issues have transitioned from Release Pending -> Closed')
-        return -1
+    return duration_averages(client, ['Average Code Review Time'], issues)[0]
+
+
+def average_code_review_to_qe(client, issues=None):
+    """
+    Function to get the average time tickets spend from code review -> Merged (or Testing)
+
 
-    return get_average(differences)
+    :param jira.client.JIRA client: JIRA Client
+    :param Iterable issues: Already fetched changelog issues (Default = None, streamed from JIRA)
+    :return: Average number of days from code review to QE
+    :rtype: Float
+    """
+    return duration_averages(client, ['Average Code Review to QE'], issues)[0]
+
+
+def time_to_deploy(client, issues=None):
+    """
+    Function to get the average number of days between release-pending and closed
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param Iterable issues: Already fetched changelog issues (Default = None, streamed from JIRA)
+    :return: Average number of days to deploy
+    :rtype: Float
+    """
+    return duration_averages(client, ['Time to Deploy'], issues)[0]
 
 
-def cycle_time(client):
+def cycle_time(client, issues=None):
     """
     Function to get the average time from In Progress -> Closed/Resolved
 
 
     :param jira.client.JIRA client: JIRA Client
-    :return: Average number of days spent in code review for (Bugs, Stories)
+    :param Iterable issues: Already fetched changelog issues (Default = None, streamed from JIRA)
+    :return: Average number of days for (Bugs, Stories)
     :rtype: Tuple
     """
-    # Lets start with Bugs
-    jql = f"{standard_jql} AND type in (Bug)"
-    issues = client.search_issues(jql, expand='changelog')
-    if len(issues) < 1:
-        log.warning(f'No Bugs could be found for JQL: {jql}')
-    start_time = None
-    end_time = None
-    differences = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == 'status':
-                    if item.toString == 'In Progress' and not end_time:
-                        start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    elif issue.fields.project.key in ['FACTORY', 'BST', 'COMPOSE', 'NOS']:
-                        if item.toString == 'Resolved' and start_time:
-                            end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    else:
-                        if item.toString == 'Closed' and start_time:
-                            end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-        if start_time and end_time:
-            if start_time < end_time and end_time > start_time:
-                differences.append(end_time - start_time)
-                start_time = None
-                end_time = None
-
-    if len(differences) < 1:
-        log.warning(f'No Bugs have transitioned from In-Progress -> Closed/Resolved')
-        bug_average_days = -1
-    else:
-        bug_average_days = get_average(differences)
-
-    # No lets do the same thing for Stories
-    jql = f"{standard_jql} AND type in (Story)"
-    issues = client.search_issues(jql, expand='changelog')
-    if len(issues) < 1:
-        log.warning(f'No issues could be found for JQL: {jql}')
-    start_time = None
-    end_time = None
-    differences = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == 'status':
-                    if item.toString == 'In Progress' and not end_time:
-                        start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    elif issue.fields.project.key in ['FACTORY', 'BST', 'COMPOSE', 'NOS']:
-                        if item.toString == 'Resolved' and start_time:
-                            end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    else:
-                        if item.toString == 'Closed' and start_time:
-                            end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-        if start_time and end_time:
-            if start_time < end_time and end_time > start_time:
-                differences.append(end_time - start_time)
-                start_time = None
-                end_time = None
-
-    if len(differences) < 1:
-        log.warning(f'No Stories have transitioned from In-Progress -> Closed/Resolved')
-        story_average_days = -1
-    else:
-        story_average_days = get_average(differences)
+    return duration_averages(client, ['Bug Cycle Time', 'Story Cycle Time'], issues)
 
-    return bug_average_days, story_average_days
 
+def passing_qe(client, issues=None):
+    """
+    Function to get average time between
+    * Merged -> Verified/In Progress (QE)
+    * Testing -> In Progress/Release Pending (None QE)
 
-def qe_gaps(client):
+
+    :param jira.client.JIRA client: JIRA Client
+    :param Iterable issues: Already fetched changelog issues (Default = None, streamed from JIRA)
+    :return: Average number of days a issue stays in said criteria
+    :rtype: Float
+    """
+    return duration_averages(client, ['Passing QE'], issues)[0]
+
+
+def qe_gaps(client, index=None):
     """
     Function to calculate QE Gaps.
 
 
     :param jira.client.JIRA client: JIRA Client
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
     :return: Number of issues that fall under 'QE Gaps'
     :rtype: Int
     """
-    jql = f"{standard_jql} AND category = 'Product Pipeline' and status changed from Verified to Testing"
-    return len(client.search_issues(jql))
+    return count_issues(client, qe_gaps_jql, index)
 
 
-def bugs_caught(client):
+def bugs_caught(client, index=None):
     """
     Function to count the number of issues that have transitions from Testing -> In Progress
 
 
     :param jira.client.JIRA client: JIRA Client
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
     :return: Number of issues
     :rtype: Int
     """
-    jql = f"{standard_jql} AND status changed from Testing to 'In Progress'"
-    return len(client.search_issues(jql))
+    return count_issues(client, bugs_caught_jql, index)
 
 
-def bug_ratio(client):
+def bug_ratio(client, index=None):
     """
     Function to capture the ratio of Bugs:Everything Else
 
 
     :param jira.client.JIRA client: JIRA Client
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
     :return: Ratio of Bugs:Everything Else
     :rtype: Int
     """
-    jql = f"{standard_jql} AND type = Bug and resolution is not EMPTY"
-    number_of_bugs = len(client.search_issues(jql))
-    jql = f"{standard_jql} AND type != Bug and resolution is not EMPTY"
-    number_of_issues = len(client.search_issues(jql))
-    if number_of_issues == 0:
-        log.warning(f'No issues could be found for jql: {jql}')
+    counts = count_issues_concurrently(client, {'bugs': resolved_bugs_jql, 'issues': resolved_other_jql}, index)
+    if counts['issues'] == 0:
+        log.warning(f'No issues could be found for jql: {resolved_other_jql}')
         return -1
-    return number_of_bugs/number_of_issues
+    return counts['bugs']/counts['issues']
+
+
+def quarterly_planning_jql(quarter_label):
+    """
+    Helper function to build the JQL for issues planned under a quarter label.
+
+
+    :param String quarter_label: Quarter Label we should search for
+    :return: JQL
+    :rtype: String
+    """
+    return f"{standard_jql} AND type not in (Bug, Ticket) and " \
+        f"(issueFunction in linkedIssuesOf('type = epic and " \
+        f"labels = {quarter_label}', 'is epic of'))"
 
 
-def work_outside_of_quarterly_planning(client, quarter_label):
+def unplanned_jql(quarter_labels):
+    """
+    Helper function to build the JQL for issues planned under none of the quarter labels.
+
+
+    :param List quarter_labels: Quarter Labels
+    :return: JQL
+    :rtype: String
+    """
+    return f"{standard_jql} AND type not in (Bug, Ticket) and " \
+        f"(issueFunction not in linkedIssuesOf('type = epic and " \
+        f"labels in ({', '.join(quarter_labels)})', 'is epic of'))"
+
+
+def work_outside_of_quarterly_planning(client, quarter_label, index=None, store=None):
     """
     Function to track how many unplanned issues came up during the year
 
+    Kept for callers of the original API: the report counts every quarter at once with
+    quarterly_planning, and this is the first of its values.
+
+
     :param jira.client.JIRA client: JIRA Client
     :param String quarter_label: Quarter Label we should search for
+    :param query.IssueIndex index: Index to count from with the local epic graph (Default = None, JIRA counts)
+    :param sqlite3.Connection store: Issue cache holding the epics (Default = None)
     :return: Number of issues that fit this criteria
     :rtype: Int
     """
-    jql = f"{standard_jql} AND type not in (Bug, Ticket) and " \
-        f"(issueFunction in linkedIssuesOf('type = epic and " \
-        f"labels = {quarter_label}', 'is epic of'))"
-    return len(client.search_issues(jql))
+    values = quarterly_planning(client, quarter_label, index, store)
+    return values[0] if config['quarter_labels'] else values
 
 
-def passing_qe(client):
+def quarterly_planning(client, quarter_label, index=None, store=None):
     """
-    Function to get average time between
-    * Merged -> Verified/In Progress (QE)
-    * Testing -> In Progress/Release Pending (None QE)
+    Function to count the work planned under the current quarter and every quarter in config['quarter_labels'].
+
+    With an index the epics of every quarter are fetched once (or read from the issue cache)
+    and matched against the epic of every issue locally, otherwise JIRA counts every quarter.
+
 
     :param jira.client.JIRA client: JIRA Client
-    :return: Average number of days a issue stays in said criteria
-    :rtype: Int
+    :param String quarter_label: Quarter Label used by work_outside_of_quarterly_planning
+    :param query.IssueIndex index: Index of the base population (Default = None, JIRA counts)
+    :param sqlite3.Connection store: Issue cache holding the epics (Default = None)
+    :return: Values in epics.planning_columns() order (one value without config['quarter_labels'])
+    :rtype: Tuple
     """
-    jql = f"{standard_jql} AND type in (Bug, Story)"
-    issues = client.search_issues(jql, expand='changelog')
-    if len(issues) < 1:
-        log.warning(f'No issues could be found for JQL: {jql}')
-        return
-    start_time = None
-    end_time = None
-    differences = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == 'status':
-                    if issue.fields.project.key not in ['FACTORY', 'BST', 'COMPOSE', 'NOS']:
-                        # If this is QE
-                        if item.toString == 'Merged' and not end_time:
-                            start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                        elif (item.toString == 'Verified' or item.toString == 'In Progress') and start_time:
-                            end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                    else:
-                        # If this is not QE
-                        if item.toString == 'Testing' and not end_time:
-                            start_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                        elif (item.toString == 'In Progress' or item.toString == 'Release Pending') and start_time:
-                            end_time = datetime.strptime(history.created[:-5], '%Y-%m-%dT%H:%M:%S.%f')
-                if start_time and end_time:
-                    # Always check this as this can happen multiple times in an issue
-                    if start_time < end_time and end_time > start_time:
-                        differences.append(end_time - start_time)
-                        start_time = None
-                        end_time = None
-
-    if len(differences) < 1:
-        log.warning(f'No issues could be found for function passing_qe')
-        return -1
+    labels = epics.planning_labels(quarter_label)
+    if index is not None:
+        planned, unplanned = epics.EpicGraph.load(client, store, labels).count_planned(index, labels)
     else:
-        return get_average(differences)
+        planned = count_issues_concurrently(client, {label: quarterly_planning_jql(label) for label in labels})
+        unplanned = count_issues(client, unplanned_jql(labels)) if config['quarter_labels'] else None
+    if not config['quarter_labels']:
+        return planned[quarter_label]
+    return (planned[quarter_label],) + tuple(planned[label] for label in config['quarter_labels']) + (unplanned,)
 
 
-def deferred_or_declined(client):
+def deferred_or_declined(client, index=None):
     """
     Function to get the number of deferred/declined issues
 
     :param jira.client.JIRA client: JIRA Client
+    :param query.IssueIndex index: Index to answer from when possible (Default = None)
     :return: Number of deferred issues, Number of declined issues
     :rtype: Tuple
     """
-    jql = f"{standard_jql} AND resolution = Deferred"
-    deferred_issues = len(client.search_issues(jql))
-    if deferred_issues == 0:
-        log.warning(f'No deferred issues could be found for JQL: {jql}')
-    jql = f"{standard_jql} AND resolution = \"Won't Fix\""
-    declined_issues = len(client.search_issues(jql))
-    if declined_issues == 0:
-        log.warning(f'No declined issues could be found for JQL: {jql}')
-    return deferred_issues, declined_issues
+    counts = count_issues_concurrently(client, {'deferred': deferred_jql, 'declined': declined_jql}, index)
+    if counts['deferred'] == 0:
+        log.warning(f'No deferred issues could be found for JQL: {deferred_jql}')
+    if counts['declined'] == 0:
+        log.warning(f'No declined issues could be found for JQL: {declined_jql}')
+    return counts['deferred'], counts['declined']
+
+
+def all_duration_metrics(sketches):
+    """
+    Function to get every duration column from the sketches of one pass over the changelogs.
+
+
+    :param Dict sketches: Durations sketched by load_population
+    :return: Values in duration_columns() order
+    :rtype: Tuple
+    """
+    return tuple(summarize_durations(sketches).values())
+
+
+def metric_tasks(client, quarter_label, index, sketches, store=None):
+    """
+    Function to list the independent metric tasks of a report.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String quarter_label: Quarter Label used by work_outside_of_quarterly_planning
+    :param query.IssueIndex index: Index of the base population to count from (None for JIRA counts)
+    :param Dict sketches: Durations sketched by load_population
+    :param sqlite3.Connection store: Issue cache holding the epics (Default = None, fetched)
+    :return: Tuple of sheet columns -> function returning one value per column
+    :rtype: Dict
+    """
+    return {
+        ('Current Work In Progress',): partial(current_work_in_progress, client, index),
+        ('QE Gaps',): partial(qe_gaps, client, index),
+        ('Bugs Caught',): partial(bugs_caught, client, index),
+        ('Bug Ratio',): partial(bug_ratio, client, index),
+        tuple(epics.planning_columns()): partial(quarterly_planning, client, quarter_label, index, store),
+        ('Deferred Issues', 'Declined Issues'): partial(deferred_or_declined, client, index),
+        # Every duration metric shares the population load_population went over
+        tuple(duration_columns()): partial(all_duration_metrics, sketches),
+    }
+
+
+def metric_cube(index, pairs, graph, quarter_label):
+    """
+    Function to build the rolling window and breakdown cube of the metrics from a loaded population.
+
+    Count metrics are matched on the index and duration metrics summed from the pairs
+    load_population kept, so any window or breakdown of them makes no JIRA request. Only
+    duration averages are in the cube, quantiles do not add up across days. Queries the
+    index does not support are left out of it.
+
+
+    :param query.IssueIndex index: Index of the base population
+    :param Dict pairs: Metric name -> List of (issue positions, durations) kept by load_population
+    :param epics.EpicGraph graph: Epics labelled with the quarters of epics.planning_labels(quarter_label)
+    :param String quarter_label: Quarter Label used by work_outside_of_quarterly_planning
+    :return: Cube
+    :rtype: cube.MetricCube
+    """
+    cube = MetricCube(index)
+    # Column -> JQL of its count, or of the counts it divides
+    queries = {
+        'Current Work In Progress': (work_in_progress_jql,),
+        'QE Gaps': (qe_gaps_jql,),
+        'Bugs Caught': (bugs_caught_jql,),
+        'Bug Ratio': (resolved_bugs_jql, resolved_other_jql),
+        'Deferred Issues': (deferred_jql,),
+        'Declined Issues': (declined_jql,),
+    }
+    for column, jqls in queries.items():
+        try:
+            masks = [index.mask(jql) for jql in jqls]
+        except query.UnsupportedQuery as error:
+            log.warning(f'Leaving {column} out of the cube, {error}')
+            continue
+        if len(masks) > 1:
+            cube.add_ratio(column, *masks)
+        else:
+            cube.add_count(column, masks[0])
+    labels = epics.planning_labels(quarter_label)
+    planned, unplanned = graph.planned_masks(index, labels)
+    planning = [planned[label] for label in labels[:1] + config['quarter_labels']]
+    for column, mask in zip(epics.planning_columns(), planning + [unplanned]):
+        cube.add_count(column, mask)
+    day = working_calendar.day_seconds if working_calendar is not None else timedelta(days=1).total_seconds()
+    for name, parts in pairs.items():
+        issues = np.concatenate([part[0] for part in parts]) if parts else np.zeros(0, dtype=np.intp)
+        durations = np.concatenate([part[1] for part in parts]) if parts else np.zeros(0)
+        cube.add_durations(name, issues, durations, day)
+    return cube
@@ -0,0 +1,134 @@
+# Built In Modules
+import logging
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics import cache, fetch
+from Jetrics.config import config
+
+# Global Variables
+# Issue types that are never planned under an epic
+UNPLANNED_TYPES = ('Bug', 'Ticket')
+log = logging.getLogger(__name__)
+
+
+def planning_labels(quarter_label=None):
+    """
+    Helper function to list every quarter label the report needs, without duplicates.
+
+
+    :param String quarter_label: Label of the current quarter (Default = config['quarter_label'])
+    :return: Labels, the current quarter first
+    :rtype: List
+    """
+    labels = [quarter_label or config['quarter_label']]
+    labels.extend(label for label in config['quarter_labels'] if label not in labels)
+    return labels
+
+
+def planning_columns():
+    """
+    Helper function to list the sheet columns of the quarterly planning metrics, in the order they are returned.
+
+
+    :return: Column titles
+    :rtype: List
+    """
+    columns = ['Work Outside of Quarterly Planning']
+    if config['quarter_labels']:
+        columns.extend(f'Planned Work {label}' for label in config['quarter_labels'])
+        columns.append('Unplanned Work')
+    return columns
+
+
+def epics_jql(labels):
+    """
+    Helper function to build the JQL of the epics labelled with any of the quarters.
+
+
+    :param List labels: Quarter labels
+    :return: JQL
+    :rtype: String
+    """
+    return f"type = Epic AND labels in ({', '.join(repr(label) for label in labels)})"
+
+
+class EpicGraph(object):
+    """
+    Local graph of epics, their labels and the issues linked to them.
+
+    Epics and their labels come from one search for every quarter label (or the issue cache),
+    the links from the epic field of the base population (see query.IssueIndex), so planned
+    work for any number of quarters is counted in one pass without an issueFunction query
+    per quarter.
+    """
+    def __init__(self, labels=None):
+        # Epic key -> labels
+        self.labels = labels or {}
+
+    @classmethod
+    def from_epics(cls, epics):
+        """
+        Build the graph from raw epic JSON.
+
+
+        :param Iterable epics: Raw issue JSON of the epics, with their labels
+        :return: Graph
+        :rtype: EpicGraph
+        """
+        return cls({epic['key']: set(epic['fields'].get('labels') or []) for epic in epics})
+
+    @classmethod
+    def load(cls, client, store=None, labels=None):
+        """
+        Get the epics labelled with any of the quarters, from the issue cache when it is enabled.
+
+
+        :param jira.client.JIRA client: JIRA Client
+        :param sqlite3.Connection store: Issue cache, synced with cache.sync_epics (Default = None)
+        :param List labels: Quarter labels (Default = planning_labels())
+        :return: Graph
+        :rtype: EpicGraph
+        """
+        if store is not None:
+            return cls(cache.load_epics(store))
+        return cls.from_epics(fetch.iter_raw_issues(client, epics_jql(labels or planning_labels()),
+                                                    fields=['labels']))
+
+    def planned_masks(self, index, labels):
+        """
+        Function to find the issues of an index planned under every quarter label, and the unplanned ones.
+
+        Only issue types other than UNPLANNED_TYPES count, as in the issueFunction query this replaces.
+
+
+        :param query.IssueIndex index: Index of the base population, with the epic of every issue
+        :param List labels: Quarter labels
+        :return: Label -> mask of the issues under one of its epics, Mask of the issues under none of them
+        :rtype: Tuple
+        """
+        arrays = index.get_arrays()
+        # Epic code -> the labels it carries, one column per label
+        labelled = np.zeros((len(index.epic_codes), len(labels)), dtype=bool)
+        for epic, code in index.epic_codes.items():
+            epic_labels = self.labels.get(epic, ())
+            labelled[code] = [label in epic_labels for label in labels]
+        counted = ~np.isin(arrays['issue_types'], index.codes('type', {t.lower() for t in UNPLANNED_TYPES}))
+        planned = labelled[arrays['epics']] & counted[:, np.newaxis]
+        return {label: planned[:, column] for column, label in enumerate(labels)}, counted & ~planned.any(axis=1)
+
+    def count_planned(self, index, labels):
+        """
+        Function to count the issues of an index planned under every quarter label, and the unplanned ones.
+
+
+        :param query.IssueIndex index: Index of the base population, with the epic of every issue
+        :param List labels: Quarter labels
+        :return: Label -> issues under one of its epics, Issues under none of them
+        :rtype: Tuple
+        """
+        planned, unplanned = self.planned_masks(index, labels)
+        return {label: int(np.count_nonzero(mask)) for label, mask in planned.items()}, \
+            int(np.count_nonzero(unplanned))
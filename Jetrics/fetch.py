@@ -0,0 +1,419 @@
+# Built In Modules
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+
+# 3rd Party Modules
+import requests
+from requests.adapters import HTTPAdapter
+
+# Local Modules
+from Jetrics import instrument, snapshot
+from Jetrics.config import config
+
+# Global Variables
+RETRY_STATUSES = (429, 503)
+ORDER_BY = re.compile(r'\border\s+by\b', re.IGNORECASE)
+log = logging.getLogger(__name__)
+# JIRA client -> its server, credentials and idle keep-alive sessions (see register_client),
+# dropped with the client
+_connections = weakref.WeakKeyDictionary()
+_connections_lock = threading.Lock()
+
+
+class AdaptiveLimiter(object):
+    """
+    Additive-increase/multiplicative-decrease limit on the number of requests in flight.
+
+    The limit is halved (and every worker paused) whenever JIRA throttles us, and grows back
+    by one slot per window of healthy responses.
+    """
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.resume_at = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait for a free slot (and for any server requested pause to pass).
+        """
+        with self.condition:
+            while True:
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self, healthy=True):
+        """
+        Give back a slot, ramping the limit back up after a healthy response.
+
+
+        :param Bool healthy: The request succeeded, False for errors that should not grow the limit (Default = True)
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if healthy:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def throttle(self, delay):
+        """
+        Give back a slot after a throttled response, halve the limit and pause everyone.
+
+
+        :param Float delay: Seconds to wait before the next request
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.limit = max(self.min_limit, self.limit / 2)
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            self.condition.notify_all()
+
+
+limiter = AdaptiveLimiter(config['max_workers'])
+
+
+def register_client(client, server, auth=None, verify=True):
+    """
+    Function to give the fetcher the connection settings of a JIRA client.
+
+    The fetcher makes its own pooled requests (see get_session) to the same server, with the
+    same credentials and TLS verification the client was created with (see
+    downstream.get_jira_client).
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String server: JIRA base URL
+    :param Tuple auth: User and password for basic auth (Default = None)
+    :param Bool|String verify: TLS verification, as for requests (Default = True)
+    """
+    with _connections_lock:
+        _connections[client] = {'server': server.rstrip('/'), 'auth': auth, 'verify': verify, 'idle': []}
+
+
+def get_connection(client):
+    """
+    Helper function to get the connection settings register_client gave for a client.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :return: Connection settings and idle sessions
+    :rtype: Dict
+    """
+    with _connections_lock:
+        connection = _connections.get(client)
+    if connection is None:
+        raise ValueError('The JIRA client was not created by downstream.get_jira_client, '
+                         'give its settings to fetch.register_client first')
+    return connection
+
+
+def get_session(client):
+    """
+    Helper function to take an idle keep-alive HTTP session for a JIRA client from its pool.
+
+    requests.Session is not guaranteed to be thread safe, so a session serves one request at a
+    time. Sessions outlive the threads using them, so a long running process keeps its
+    connections to JIRA open from one run to the next. Give the session back with
+    release_session.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :return: Session
+    :rtype: requests.Session
+    """
+    connection = get_connection(client)
+    with _connections_lock:
+        if connection['idle']:
+            return connection['idle'].pop()
+    session = requests.Session()
+    session.auth = connection['auth']
+    session.verify = connection['verify']
+    session.headers.update({'Accept': 'application/json'})
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def release_session(client, session):
+    """
+    Helper function to give a session taken with get_session back to its pool.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param requests.Session session: Session
+    """
+    connection = get_connection(client)
+    with _connections_lock:
+        connection['idle'].append(session)
+
+
+def get_retry_delay(response, attempt):
+    """
+    Helper function to work out how long to wait before retrying a throttled or failed request.
+
+
+    :param requests.Response response: Throttled response (None when JIRA could not be reached)
+    :param Int attempt: Number of attempts made so far
+    :return: Seconds to wait
+    :rtype: Float
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    # Exponential backoff with full jitter
+    return random.uniform(0, config['backoff_base'] * 2 ** attempt)
+
+
+def get_json(client, path, params, query=None):
+    """
+    Function to GET a JIRA REST resource, backing off when the server throttles us.
+
+    Throttled responses (429/503), timeouts and connection errors are retried up to
+    config['max_retries'] times. Responses are also appended to config['record_snapshot'] when
+    it is set, and read from config['replay_snapshot'] instead of JIRA when that one is (see
+    snapshot).
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String path: Path under /rest/api/2/
+    :param Dict params: Query parameters
+    :param String query: Query the request is reported under (Default = None, the JQL or the path)
+    :return: Decoded JSON response
+    :rtype: Dict
+    """
+    query = query or params.get('jql', path)
+    replayer = snapshot.get_replayer()
+    if replayer is not None:
+        started = time.monotonic()
+        data, size = replayer.replay(path, params)
+        instrument.recorder.record_request(query, started, time.monotonic(), size,
+                                           page=path == 'search' and params.get('maxResults') != 0)
+        return data
+    url = f"{get_connection(client)['server']}/rest/api/2/{path}"
+    session = get_session(client)
+    attempt = 0
+    try:
+        while True:
+            limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = session.get(url, params=params, timeout=config['request_timeout'])
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt >= config['max_retries']:
+                    limiter.release(healthy=False)
+                    raise
+                instrument.recorder.record_request(query, started, time.monotonic(), 0, page=False, retry=True)
+                delay = get_retry_delay(None, attempt)
+                limiter.throttle(delay)
+                attempt += 1
+                log.warning(f'Could not reach JIRA ({error}), retrying {path} in {delay:.1f}s '
+                            f'(attempt {attempt} of {config["max_retries"]})')
+                continue
+            except BaseException:
+                limiter.release(healthy=False)
+                raise
+            retry = response.status_code in RETRY_STATUSES and attempt < config['max_retries']
+            instrument.recorder.record_request(query, started, time.monotonic(), len(response.content),
+                                               page=path == 'search' and params.get('maxResults') != 0 and response.ok,
+                                               retry=retry)
+            if retry:
+                delay = get_retry_delay(response, attempt)
+                limiter.throttle(delay)
+                attempt += 1
+                log.warning(f'JIRA answered {response.status_code}, retrying {path} in {delay:.1f}s '
+                            f'(attempt {attempt} of {config["max_retries"]})')
+                continue
+            # Errors, including a last throttled answer, do not ramp the limit up
+            limiter.release(healthy=response.ok)
+            response.raise_for_status()
+            data = response.json()
+            recorder = snapshot.get_recorder()
+            if recorder is not None:
+                recorder.record(path, params, data)
+            return data
+    finally:
+        release_session(client, session)
+
+
+def get_histories(client, key, start_at, end_at, query=None):
+    """
+    Function to page through part of an issue's changelog.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String key: Issue key
+    :param Int start_at: Position of the first history to get
+    :param Int end_at: Position after the last history to get
+    :param String query: Query the requests are reported under (Default = None, the path)
+    :return: Raw history JSON, oldest first
+    :rtype: List
+    """
+    histories = []
+    while start_at < end_at:
+        page = get_json(client, f'issue/{key}/changelog',
+                        {'startAt': start_at, 'maxResults': min(end_at - start_at, config['page_size'])}, query)
+        values = page.get('values') or []
+        if not values:
+            # The changelog shrank since the search
+            break
+        histories.extend(values[:end_at - start_at])
+        start_at += len(values)
+    return histories
+
+
+def complete_changelog(client, issue, query=None):
+    """
+    Function to fetch the histories a search left out of an issue's expanded changelog.
+
+    Searches embed a bounded number of histories per issue (100 on JIRA Cloud), the rest are
+    fetched from the issue's paginated changelog and spliced in around the embedded ones.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param Dict issue: Raw issue JSON with a truncated changelog, completed in place
+    :param String query: Query the requests are reported under (Default = None, the path)
+    """
+    changelog = issue['changelog']
+    histories = changelog['histories']
+    start_at = changelog.get('startAt') or 0
+    before = get_histories(client, issue['key'], 0, start_at, query)
+    after = get_histories(client, issue['key'], start_at + len(histories), changelog['total'], query)
+    changelog['histories'] = before + histories + after
+    changelog.update(startAt=0, maxResults=len(changelog['histories']), total=len(changelog['histories']))
+
+
+def complete_changelogs(client, issues, query=None):
+    """
+    Function to complete the truncated changelogs of a page of issues, several issues at a time.
+
+    Only issues whose changelog holds fewer histories than its total are fetched again, by at
+    most config['max_workers'] threads (the requests still share the limit on requests in flight).
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param List issues: Raw issue JSON with the changelog expanded, completed in place
+    :param String query: Query the requests are reported under (Default = None, the path)
+    """
+    truncated = [issue for issue in issues if 'changelog' in issue and
+                 issue['changelog'].get('total', 0) > len(issue['changelog'].get('histories', ()))]
+    if not truncated:
+        return
+    log.info(f'Fetching the rest of {len(truncated)} truncated changelogs...')
+    with ThreadPoolExecutor(max_workers=min(config['max_workers'], len(truncated))) as executor:
+        # Requests are made on behalf of whichever metric is reading the page
+        futures = [executor.submit(contextvars.copy_context().run, complete_changelog, client, issue, query)
+                   for issue in truncated]
+        for future in futures:
+            future.result()
+
+
+def get_issue_page(client, params, query=None):
+    """
+    Function to get a page of a JQL search, completing truncated changelogs when they are expanded.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param Dict params: Search parameters
+    :param String query: Query the requests are reported under (Default = None, the JQL)
+    :return: Decoded JSON response
+    :rtype: Dict
+    """
+    query = query or params['jql']
+    page = get_json(client, 'search', params, query)
+    if 'changelog' in params.get('expand', ''):
+        complete_changelogs(client, page.get('issues', []), query)
+    return page
+
+
+def iter_issue_pages(client, jql, fields=None, expand=None):
+    """
+    Function to stream the pages of a JQL search, pulling the next pages in parallel.
+
+    The first page tells us the total. After that at most config['max_workers'] pages are in
+    flight or waiting to be consumed, so memory stays bounded whatever the size of the result.
+    Pages are yielded in order, with any truncated changelog completed (see complete_changelogs).
+
+    A JQL without an ORDER BY is searched ORDER BY key, so issues do not move from one page
+    to another between requests.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String jql: JQL to search for
+    :param List fields: Fields to return (Default = all fields)
+    :param String expand: Extra information to expand on each issue
+    :return: Generator of pages (lists of raw issue JSON)
+    :rtype: Generator
+    """
+    ordered = jql if ORDER_BY.search(jql) else f'{jql} ORDER BY key'
+    params = {'jql': ordered, 'maxResults': config['page_size']}
+    if fields:
+        params['fields'] = ','.join(fields)
+    if expand:
+        params['expand'] = expand
+    first_page = get_issue_page(client, dict(params, startAt=0), jql)
+    total = first_page.get('total', 0)
+    # JIRA may cap the page size below what we asked for
+    page_size = first_page.get('maxResults') or config['page_size']
+    fetched = len(first_page['issues'])
+    yield first_page.pop('issues')
+    if total <= fetched or page_size <= 0:
+        return
+    start_ats = iter(range(fetched, total, page_size))
+    with ThreadPoolExecutor(max_workers=config['max_workers']) as executor:
+        window = deque()
+
+        def submit_next():
+            start_at = next(start_ats, None)
+            if start_at is not None:
+                # Pages are fetched on behalf of whichever metric is reading them
+                window.append(executor.submit(
+                    contextvars.copy_context().run,
+                    get_issue_page, client, dict(params, startAt=start_at, maxResults=page_size), jql))
+
+        for _ in range(config['max_workers']):
+            submit_next()
+        while window:
+            page = window.popleft().result()
+            submit_next()
+            yield page.pop('issues')
+
+
+def iter_raw_issues(client, jql, fields=None, expand=None):
+    """
+    Function to stream every issue matching a JQL query, one page in memory at a time.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param String jql: JQL to search for
+    :param List fields: Fields to return (Default = all fields)
+    :param String expand: Extra information to expand on each issue
+    :return: Generator of raw issue JSON
+    :rtype: Generator
+    """
+    for page in iter_issue_pages(client, jql, fields=fields, expand=expand):
+        yield from page
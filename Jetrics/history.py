@@ -0,0 +1,247 @@
+# Built In Modules
+import json
+import logging
+import math
+import os
+from urllib.parse import quote
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics import instrument
+from Jetrics.config import config
+from Jetrics.sinks import Sink
+
+# Global Variables
+MANIFEST = 'manifest.json'
+DATES = 'dates.i8'
+log = logging.getLogger(__name__)
+
+
+def to_float(value):
+    """
+    Helper function to turn a metric value into what the store keeps.
+
+
+    :param Object value: Metric value
+    :return: Value, NaN when it is missing, -1 (no data) or not a number
+    :rtype: Float
+    """
+    if value is None or isinstance(value, bool):
+        return math.nan
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return math.nan if value == -1 else value
+
+
+class HistoryStore(object):
+    """
+    Append-only columnar history of the rows of one sheet, every column a memory-mappable file.
+
+    dates.i8 holds the day of every row (int64 days since 1970-01-01) and every column a flat
+    little-endian float64 file, NaN where a row has no value. manifest.json names the column
+    files and holds the number of committed rows: an append writes past the end of every file,
+    then replaces the manifest in one step, so a reader (or a crash half way) only ever sees
+    whole rows. Reads map the files, nothing is parsed and only the pages a query touches are
+    read from disk.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        """
+        Helper to get the path of a file of the store.
+
+
+        :param String name: File name
+        :return: Path
+        :rtype: String
+        """
+        return os.path.join(self.directory, name)
+
+    def read_manifest(self):
+        """
+        Read the committed state of the store.
+
+
+        :return: {'rows': committed rows, 'columns': column titles in file order, 'ordered': dates never decrease}
+        :rtype: Dict
+        """
+        try:
+            with open(self.path(MANIFEST)) as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            return {'rows': 0, 'columns': [], 'ordered': True}
+
+    @staticmethod
+    def column_file(index):
+        """
+        Helper to name the file of a column, titles can hold any character.
+
+
+        :param Int index: Position of the column in the manifest
+        :return: File name
+        :rtype: String
+        """
+        return f'{index:04d}.f8'
+
+    def write_column(self, name, committed, values, fill=None):
+        """
+        Helper to write values right after the committed rows of a column file.
+
+        Bytes past the committed rows (left by an append that did not commit) are dropped, a
+        column file that does not exist yet is first filled with `fill` for the committed rows.
+
+
+        :param String name: Column file
+        :param Int committed: Committed rows
+        :param numpy.ndarray values: Values to append
+        :param Float fill: Value of the committed rows of a new column (Default = None)
+        """
+        path = self.path(name)
+        if not os.path.exists(path):
+            with open(path, 'wb') as column:
+                if committed:
+                    np.full(committed, fill, dtype=values.dtype).tofile(column)
+                values.tofile(column)
+            return
+        with open(path, 'r+b') as column:
+            column.seek(committed * values.itemsize)
+            column.truncate()
+            values.tofile(column)
+
+    def append(self, rows):
+        """
+        Function to append dated rows of values.
+
+        Columns the store does not have yet are added, NaN for the rows before.
+
+
+        :param List rows: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+        """
+        if not rows:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = self.read_manifest()
+        committed, columns = manifest['rows'], list(manifest['columns'])
+        for _, values in rows:
+            columns.extend(title for title in values if title not in columns)
+        days = np.array([np.datetime64(date, 'D') for date, _ in rows]).astype('<i8')
+        ordered = manifest['ordered'] and bool(np.all(np.diff(days) >= 0))
+        if ordered and committed:
+            last = np.memmap(self.path(DATES), dtype='<i8', mode='r', offset=(committed - 1) * 8, shape=(1,))[0]
+            ordered = bool(days[0] >= last)
+        self.write_column(DATES, committed, days)
+        for index, title in enumerate(columns):
+            self.write_column(self.column_file(index), committed,
+                              np.array([to_float(values.get(title)) for _, values in rows], dtype='<f8'), math.nan)
+        # Commit
+        instrument.write_atomically(self.path(MANIFEST), json.dumps(
+            {'rows': committed + len(rows), 'columns': columns, 'ordered': ordered}))
+
+    def columns(self):
+        """
+        Get the column titles.
+
+
+        :return: Column titles, in the order they were first written
+        :rtype: List
+        """
+        return list(self.read_manifest()['columns'])
+
+    def read(self, columns=None, start=None, end=None, per_day=True):
+        """
+        Function to read the history, sorted by date.
+
+        While rows were appended in date order (the usual case) a date range is found by binary
+        search and, without several rows for the same day, columns are returned as read-only
+        memory maps of the files without copying anything.
+
+
+        :param List columns: Column titles to read (Default = every column)
+        :param String start: First day, YEAR-MONTH-DAY (Default = the first row)
+        :param String end: Last day, YEAR-MONTH-DAY (Default = the last row)
+        :param Bool per_day: Only keep the last row written for every day (Default = True)
+        :return: Days (numpy datetime64[D]), Column title -> numpy float64 array
+        :rtype: Tuple
+        """
+        manifest = self.read_manifest()
+        committed = manifest['rows']
+        titles = manifest['columns'] if columns is None else columns
+        missing = [title for title in titles if title not in manifest['columns']]
+        if missing:
+            raise KeyError(f"No {', '.join(missing)} column in {self.directory}")
+        if not committed:
+            return np.array([], dtype='datetime64[D]'), {title: np.array([], dtype='<f8') for title in titles}
+
+        days = np.memmap(self.path(DATES), dtype='<i8', mode='r', shape=(committed,))
+        low = np.datetime64(start, 'D').astype(np.int64) if start else None
+        high = np.datetime64(end, 'D').astype(np.int64) if end else None
+        if manifest['ordered']:
+            first = int(np.searchsorted(days, low, 'left')) if low is not None else 0
+            last = int(np.searchsorted(days, high, 'right')) if high is not None else committed
+            index = slice(first, last)
+            if per_day and last - first > 1:
+                window = days[first:last]
+                keep = np.flatnonzero(np.append(window[1:] != window[:-1], True))
+                if len(keep) != last - first:
+                    index = keep + first
+        else:
+            # Rows appended out of order (e.g. a backfill after daily runs): sort them once
+            order = np.argsort(days, kind='stable')
+            if per_day:
+                ordered_days = days[order]
+                order = order[np.append(ordered_days[1:] != ordered_days[:-1], True)]
+            selected = np.ones(len(order), dtype=bool)
+            if low is not None:
+                selected &= days[order] >= low
+            if high is not None:
+                selected &= days[order] <= high
+            index = order[selected]
+
+        values = {}
+        for title in titles:
+            column = np.memmap(self.path(self.column_file(manifest['columns'].index(title))), dtype='<f8',
+                               mode='r', shape=(committed,))
+            values[title] = column[index]
+        return days[index].view('datetime64[D]'), values
+
+
+class HistorySink(Sink):
+    """
+    Appends the rows to a local HistoryStore per sheet, under config['history_dir'].
+    """
+    name = 'history'
+
+    def __init__(self, directory=None):
+        self.directory = directory or config['history_dir']
+
+    def store(self, sheet):
+        """
+        Get the store of a sheet.
+
+
+        :param String sheet: Sheet name
+        :return: Store
+        :rtype: HistoryStore
+        """
+        return HistoryStore(os.path.join(self.directory, quote(sheet, safe=' ')))
+
+    def write_rows(self, rows, sheet='Sheet1', dry_run=False):
+        """
+        Append dated rows to the sheet's store.
+
+
+        :param List rows: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+        :param String sheet: Sheet the rows belong to (default is Sheet1)
+        :param Bool dry_run: Only return what would be written (Default = False)
+        :return: Store directory and number of rows
+        :rtype: Dict
+        """
+        store = self.store(sheet)
+        if not dry_run:
+            store.append(rows)
+        return {'directory': store.directory, 'rows': len(rows)}
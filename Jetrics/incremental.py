@@ -0,0 +1,509 @@
+# Built In Modules
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import threading
+import time
+
+# Local Modules
+import Jetrics.downstream as d
+from Jetrics import instrument, transitions
+from Jetrics.config import config
+from Jetrics.sketch import QuantileSketch
+
+# Global Variables
+# Per issue contributions to the count metrics, in the order of IssueAggregates.counts
+COUNTERS = ('in_progress', 'qe_gaps', 'caught', 'resolved_bugs', 'resolved_other', 'deferred', 'declined')
+EVENT_KINDS = ('jira:issue_created', 'jira:issue_updated', 'jira:issue_deleted')
+log = logging.getLogger(__name__)
+
+
+class InvalidEvent(ValueError):
+    """
+    Raised for a webhook payload that is not shaped like a JIRA issue event.
+    """
+
+
+def check_event(event):
+    """
+    Function to check that a webhook payload has every field IssueAggregates.apply_event reads.
+
+    Payloads of other event kinds are left alone, apply_event ignores them.
+
+
+    :param Dict event: Webhook payload
+    :raises InvalidEvent: When an issue event is missing a field or has one of the wrong type
+    """
+    if not isinstance(event, dict):
+        raise InvalidEvent(f'Expected a JSON object, got {type(event).__name__}')
+    if event.get('webhookEvent') not in EVENT_KINDS:
+        return
+    issue = event.get('issue')
+    if not isinstance(issue, dict) or issue.get('id') is None:
+        raise InvalidEvent('The issue or its id is missing')
+    if event['webhookEvent'] == 'jira:issue_deleted':
+        return
+    fields = issue.get('fields')
+    if not isinstance(fields, dict):
+        raise InvalidEvent(f"The fields of issue {issue['id']} are missing")
+    project, issue_type = fields.get('project'), fields.get('issuetype')
+    if not isinstance(project, dict) or not project.get('key'):
+        raise InvalidEvent(f"The project of issue {issue['id']} is missing")
+    if not isinstance(issue_type, dict) or not issue_type.get('name'):
+        raise InvalidEvent(f"The issue type of issue {issue['id']} is missing")
+    for name in ('status', 'resolution'):
+        if not isinstance(fields.get(name) or {}, dict):
+            raise InvalidEvent(f"The {name} of issue {issue['id']} is not an object")
+    if not isinstance(fields.get('created') or '', str):
+        raise InvalidEvent(f"The created date of issue {issue['id']} is not a string")
+    changelog = event.get('changelog') or {}
+    if not isinstance(changelog, dict) or not isinstance(changelog.get('items', []), list) or \
+            not all(isinstance(item, dict) and 'field' in item for item in changelog.get('items', [])):
+        raise InvalidEvent(f"The changelog of issue {issue['id']} is not a list of items")
+    try:
+        int(event.get('timestamp') or 0)
+        int(changelog.get('id') or 0)
+    except (TypeError, ValueError):
+        raise InvalidEvent(f"The timestamp or changelog id of issue {issue['id']} is not a number")
+
+
+def project_keys(projects):
+    """
+    Helper function to get the project keys of config['projects'] (a JQL list or a list of keys).
+
+
+    :param String|List projects: Projects
+    :return: Project keys (None for every project)
+    :rtype: Set
+    """
+    if isinstance(projects, (list, tuple, set)):
+        return set(projects)
+    keys = {key.strip().strip('"\'') for key in projects.strip('() ').split(',')}
+    return {key for key in keys if key} or None
+
+
+def start_date():
+    """
+    Helper function to get config['start_date'] as a comparable YEAR-MONTH-DAY string.
+
+
+    :return: Start date
+    :rtype: String
+    """
+    return datetime.strptime(config['start_date'].replace('\\u002f', '-'), '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+def to_epoch_ms(created):
+    """
+    Helper function to turn a JIRA timestamp into epoch milliseconds.
+
+
+    :param String created: Timestamp as returned by JIRA
+    :return: Epoch milliseconds
+    :rtype: Int
+    """
+    return int(transitions.parse_time(created).timestamp() * 1000)
+
+
+class IssueAggregates(object):
+    """
+    Running values of the metrics of one population, updated one JIRA change at a time.
+
+    Every issue keeps a small state (its current status, resolution and type, whether it ever
+    went Verified -> Testing or Testing -> In Progress, and the start/end of every duration
+    metric's clock). A status or resolution change moves that issue's contribution to the
+    counters and sketches, so applying an event costs the same whatever the population size.
+    Start/end pairs follow the same rules as transitions.StateMachine.
+
+    With a path, every event is appended to a journal next to the last snapshot, so the
+    aggregates survive restarts; checkpoint() writes a new snapshot and empties the journal.
+
+    With a calendar, durations are the working time between the start and the end of a pair.
+    """
+    def __init__(self, projects=None, path=None, calendar=None):
+        self.projects = project_keys(projects) if projects else None
+        self.path = path
+        self.calendar = calendar
+        self.lock = threading.RLock()
+        self.machine = transitions.StateMachine(config['duration_metrics'], config['workflows'])
+        self.start_date = start_date()
+        # Events received while a rebuild runs, replayed on top of it
+        self.pending = None
+        self.reset()
+        if path:
+            self.load()
+
+    def reset(self):
+        """
+        Forget every issue.
+        """
+        with self.lock:
+            self.issues = {}
+            self.counts = [0] * len(COUNTERS)
+            self.sketches = {name: QuantileSketch(config['sketch_accuracy']) for name in self.machine.names}
+            self.updated_at = None
+            self.events = 0
+            self.cached_values = None
+
+    def in_population(self, fields):
+        """
+        Helper to check whether an issue belongs to the population (projects and start date).
+
+
+        :param Dict fields: Issue fields
+        :return: True if it does
+        :rtype: Bool
+        """
+        if self.projects is not None and (fields.get('project') or {}).get('key') not in self.projects:
+            return False
+        return (fields.get('created') or '9999')[:10] >= self.start_date
+
+    @staticmethod
+    def contributions(state):
+        """
+        Helper to get what one issue adds to each counter.
+
+
+        :param Dict state: Issue state
+        :return: One 0/1 per counter in COUNTERS
+        :rtype: List
+        """
+        status = (state['status'] or '').lower()
+        resolution = (state['resolution'] or '').lower()
+        # Matched without case, like the JQL of the batch metrics
+        is_bug = (state['type'] or '').lower() == 'bug'
+        return [int(status == 'in progress'),
+                int((state['category'] or '').lower() == 'product pipeline' and state['qe_gap']),
+                int(state['caught']),
+                int(bool(resolution) and is_bug),
+                int(bool(resolution) and not is_bug),
+                int(resolution == 'deferred'),
+                int(resolution == "won't fix")]
+
+    def add_contributions(self, state, sign):
+        """
+        Helper to add (sign=1) or take back (sign=-1) an issue's counter contributions.
+
+
+        :param Dict state: Issue state
+        :param Int sign: 1 or -1
+        """
+        for position, value in enumerate(self.contributions(state)):
+            self.counts[position] += sign * value
+
+    def new_state(self, issue):
+        """
+        Helper to build the state of an issue we have not seen yet.
+
+
+        :param Dict issue: Raw issue JSON
+        :return: Issue state
+        :rtype: Dict
+        """
+        fields = issue['fields']
+        return {'key': issue['key'], 'project': fields['project']['key'], 'type': fields['issuetype']['name'],
+                'category': (fields['project'].get('projectCategory') or {}).get('name'),
+                'status': (fields.get('status') or {}).get('name'),
+                'resolution': (fields.get('resolution') or {}).get('name'),
+                'qe_gap': False, 'caught': False, 'history': 0, 'updated': 0, 'starts': {}, 'ends': {}, 'recorded': {}}
+
+    def change_status(self, state, from_status, to_status, timestamp):
+        """
+        Apply one status change to an issue's flags and duration clocks.
+
+
+        :param Dict state: Issue state
+        :param String from_status: Status before
+        :param String to_status: Status after
+        :param Int timestamp: Epoch milliseconds of the change
+        """
+        change = ((from_status or '').lower(), (to_status or '').lower())
+        state['qe_gap'] = state['qe_gap'] or change == ('verified', 'testing')
+        state['caught'] = state['caught'] or change == ('testing', 'in progress')
+        by_to, by_from, repeat = self.machine.get_table(state['project'], state['type'])
+        matched = {'start': set(), 'end': set()}
+        for index, role, from_statuses in by_to.get(to_status, []) + by_from.get(from_status, []):
+            if from_statuses is None or from_status in from_statuses:
+                matched[role].add(self.machine.names[index])
+        starts, ends, recorded = state['starts'], state['ends'], state['recorded']
+        # StateMachine rules: a change matching both starts the clock unless it already stopped
+        started = {name for name in matched['start'] if name not in ends}
+        for name in started:
+            starts[name] = timestamp
+        for name in matched['end'] - started:
+            if name not in starts:
+                continue
+            if self.machine.names.index(name) in repeat:
+                seconds = self.duration(starts.pop(name), timestamp)
+                if seconds is not None:
+                    self.sketches[name].add(seconds)
+                continue
+            # The pair of a non repeating metric is its start and its latest end
+            ends[name] = timestamp
+            if name in recorded:
+                self.sketches[name].remove(recorded.pop(name))
+            seconds = self.duration(starts[name], timestamp)
+            if seconds is not None:
+                recorded[name] = seconds
+                self.sketches[name].add(seconds)
+
+    def duration(self, start, end):
+        """
+        Helper to measure a start/end pair, in working time when there is a calendar.
+
+        Pairs are kept on wall-clock time, as in columnar.pair_rows.
+
+
+        :param Int start: Epoch milliseconds of the start
+        :param Int end: Epoch milliseconds of the end
+        :return: Seconds, None when the pair does not count
+        :rtype: Float
+        """
+        if end <= start:
+            return None
+        if self.calendar is None:
+            return (end - start) / 1000
+        return float(self.calendar.seconds(start, end))
+
+    def apply_changes(self, state, histories, fields=None, updated=0):
+        """
+        Apply changelog histories (oldest first) to an issue, then its current fields.
+
+
+        :param Dict state: Issue state
+        :param List histories: Histories with 'created' and 'items' (and 'id' for deduplication)
+        :param Dict fields: Issue fields, authoritative for status/resolution/type unless older than
+            the ones already applied (Default = None)
+        :param Int updated: Epoch milliseconds the fields are as of (Default = 0)
+        """
+        self.add_contributions(state, -1)
+        for history in histories:
+            history_id = int(history.get('id') or 0)
+            if history_id and history_id <= state['history']:
+                # Already applied (redelivered webhook, or already in the last full recompute)
+                continue
+            state['history'] = max(state['history'], history_id)
+            timestamp = history['timestamp'] if 'timestamp' in history else to_epoch_ms(history['created'])
+            for item in history['items']:
+                if item['field'] == 'status':
+                    self.change_status(state, item.get('fromString'), item.get('toString'), timestamp)
+                    state['status'] = item.get('toString')
+                elif item['field'] == 'resolution':
+                    state['resolution'] = item.get('toString')
+        if fields and updated >= state['updated']:
+            state['updated'] = updated
+            state['status'] = (fields.get('status') or {}).get('name', state['status'])
+            state['resolution'] = (fields.get('resolution') or {}).get('name')
+            if fields.get('issuetype'):
+                state['type'] = fields['issuetype']['name']
+        self.add_contributions(state, 1)
+        self.cached_values = None
+
+    def forget(self, issue_id):
+        """
+        Take an issue (deleted, or moved out of the population) out of the aggregates.
+
+        Durations already recorded by repeating metrics cannot be told apart and stay until
+        the next full recompute.
+
+
+        :param String issue_id: Issue id
+        """
+        state = self.issues.pop(issue_id, None)
+        if state is None:
+            return
+        self.add_contributions(state, -1)
+        for name, seconds in state['recorded'].items():
+            self.sketches[name].remove(seconds)
+        self.cached_values = None
+
+    def apply_event(self, event, journal=True):
+        """
+        Function to apply a JIRA webhook event (jira:issue_created, jira:issue_updated, jira:issue_deleted).
+
+        The payload is checked before it is journaled, so a malformed one is neither applied
+        nor replayed on restart.
+
+
+        :param Dict event: Webhook payload
+        :param Bool journal: Append the event to the on-disk journal (Default = True)
+        :return: True if the event changed the aggregates
+        :rtype: Bool
+        :raises InvalidEvent: When the payload is not a well formed issue event
+        """
+        check_event(event)
+        kind = event.get('webhookEvent')
+        issue = event.get('issue')
+        if kind not in EVENT_KINDS:
+            return False
+        issue_id = str(issue['id'])
+        with self.lock:
+            if issue_id not in self.issues and not self.in_population(issue.get('fields') or {}):
+                # Another project, or created before the start date
+                return False
+            if journal and self.path:
+                self.append_journal(event)
+            if self.pending is not None:
+                self.pending.append(event)
+            if kind == 'jira:issue_deleted' or not self.in_population(issue['fields']):
+                self.forget(issue_id)
+            else:
+                state = self.issues.get(issue_id)
+                if state is None:
+                    state = self.issues[issue_id] = self.new_state(issue)
+                    self.add_contributions(state, 1)
+                changelog = event.get('changelog') or {}
+                timestamp = int(event.get('timestamp') or time.time() * 1000)
+                histories = [{'id': changelog.get('id'), 'timestamp': timestamp,
+                              'items': changelog.get('items', [])}] if changelog.get('items') else []
+                # A redelivered or late event does not roll the status back
+                self.apply_changes(state, histories, issue['fields'], timestamp)
+            self.events += 1
+            self.updated_at = time.time()
+            if journal and self.path and self.events % config['webhook_checkpoint_events'] == 0:
+                self.checkpoint()
+        return True
+
+    def add_issue(self, issue):
+        """
+        Add an issue with its full changelog.
+
+
+        :param Dict issue: Raw issue JSON with the changelog expanded
+        """
+        if not self.in_population(issue['fields']):
+            return
+        with self.lock:
+            self.forget(str(issue['id']))
+            state = self.issues[str(issue['id'])] = self.new_state(issue)
+            self.add_contributions(state, 1)
+            self.apply_changes(state, issue.get('changelog', {}).get('histories', []), issue['fields'],
+                               to_epoch_ms(issue['fields']['updated']) if issue['fields'].get('updated') else 0)
+
+    def hold_events(self):
+        """
+        Start keeping the events for the next rebuild to replay.
+
+        Call it before syncing the issues the rebuild reads, so events that arrive after the
+        sync are not lost.
+        """
+        with self.lock:
+            if self.pending is None:
+                self.pending = []
+
+    def release_events(self):
+        """
+        Stop keeping events, when the rebuild they were kept for will not happen.
+        """
+        with self.lock:
+            self.pending = None
+
+    def rebuild(self, issues):
+        """
+        Function to recompute the aggregates from full changelogs, correcting any drift.
+
+        The new aggregates are built on the side, events keep being applied (and served) in
+        the meantime and are replayed on top of the new aggregates before they are swapped in,
+        the ones the changelogs already hold being skipped by their history id.
+
+
+        :param Iterable issues: Raw issue JSON with the changelog expanded (e.g. cache.iter_issues)
+        """
+        self.hold_events()
+        try:
+            fresh = IssueAggregates(self.projects, calendar=self.calendar)
+            for issue in issues:
+                fresh.add_issue(issue)
+        except BaseException:
+            self.release_events()
+            raise
+        with self.lock:
+            self.issues, self.counts, self.sketches = fresh.issues, fresh.counts, fresh.sketches
+            pending, self.pending = self.pending, None
+            for event in pending:
+                self.apply_event(event, journal=False)
+            self.cached_values = None
+            self.updated_at = time.time()
+            if self.path:
+                self.checkpoint()
+
+    def values(self):
+        """
+        Function to get the sheet values the aggregates cover.
+
+        Work Outside of Quarterly Planning is not covered, it needs the epic links.
+
+
+        :return: Column title -> value
+        :rtype: Dict
+        """
+        with self.lock:
+            if self.cached_values is None:
+                counts = dict(zip(COUNTERS, self.counts))
+                self.cached_values = {
+                    'Current Work In Progress': counts['in_progress'],
+                    'QE Gaps': counts['qe_gaps'],
+                    'Bugs Caught': counts['caught'],
+                    'Bug Ratio': counts['resolved_bugs'] / counts['resolved_other'] if counts['resolved_other'] else -1,
+                    'Deferred Issues': counts['deferred'],
+                    'Declined Issues': counts['declined'],
+                    **d.summarize_durations(self.sketches, self.calendar),
+                }
+            return dict(self.cached_values)
+
+    def append_journal(self, event):
+        """
+        Helper to append an event to the journal, flushed before it is applied.
+
+
+        :param Dict event: Webhook payload
+        """
+        with open(f'{self.path}.journal', 'a') as journal:
+            journal.write(json.dumps(event) + '\n')
+
+    def checkpoint(self):
+        """
+        Function to write a snapshot of the aggregates and empty the journal.
+        """
+        with self.lock:
+            snapshot = {
+                'updated_at': self.updated_at,
+                'counts': self.counts,
+                'sketches': {name: sketch.to_dict() for name, sketch in self.sketches.items()},
+                'issues': self.issues,
+            }
+            instrument.write_atomically(self.path, json.dumps(snapshot))
+            open(f'{self.path}.journal', 'w').close()
+
+    def load(self):
+        """
+        Function to load the last snapshot and replay the journal written since.
+
+        Journal lines that cannot be replayed (e.g. cut short by a crash) are skipped with a warning.
+        """
+        with self.lock:
+            if os.path.exists(self.path):
+                with open(self.path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+                self.updated_at = snapshot['updated_at']
+                self.counts = snapshot['counts']
+                self.sketches.update({name: QuantileSketch.from_dict(sketch)
+                                      for name, sketch in snapshot['sketches'].items() if name in self.sketches})
+                self.issues = snapshot['issues']
+            replayed = 0
+            if os.path.exists(f'{self.path}.journal'):
+                with open(f'{self.path}.journal') as journal:
+                    for number, line in enumerate(journal, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            self.apply_event(json.loads(line), journal=False)
+                        except ValueError as error:
+                            log.warning(f'Skipping line {number} of {self.path}.journal, {error}')
+                            continue
+                        replayed += 1
+            if self.updated_at:
+                log.info(f'Loaded the aggregates of {len(self.issues)} issues as of '
+                         f'{datetime.fromtimestamp(self.updated_at, timezone.utc).isoformat()}, '
+                         f'replayed {replayed} events')
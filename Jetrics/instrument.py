@@ -0,0 +1,318 @@
+# Built In Modules
+import contextvars
+import cProfile
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Global Variables
+log = logging.getLogger(__name__)
+# Metric the current thread is working for, copied into the threads a metric starts
+current_metric = contextvars.ContextVar('current_metric', default=None)
+REQUEST_COUNTERS = ('requests', 'pages', 'bytes', 'retries')
+
+
+class RunRecorder(object):
+    """
+    Thread safe counters of one run: wall time of every metric and JIRA query, HTTP requests,
+    search pages, bytes received, throttling retries and Sheets API calls.
+
+    Work done once for several metrics (e.g. load_population) is measured like a metric and
+    declared shared (see share): the report lists it apart with the metrics reading it, and
+    every metric names the shared work it reads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far and start a new run.
+        """
+        with self.lock:
+            self.started = time.time()
+            self.metrics = {}
+            self.queries = {}
+            self.sheets = {}
+            # Shared work -> metrics reading it
+            self.shared = {}
+
+    def record_request(self, query, started, finished, size, page=False, retry=False):
+        """
+        Record one HTTP request against its query and the metric that made it.
+
+
+        :param String query: JQL of the search (or the REST path for other resources)
+        :param Float started: time.monotonic() when the request was sent
+        :param Float finished: time.monotonic() when the response was read
+        :param Int size: Bytes received
+        :param Bool page: The response is a page of search results
+        :param Bool retry: The response was throttled and the request will be retried
+        """
+        counts = {'requests': 1, 'pages': int(page), 'bytes': size, 'retries': int(retry)}
+        metric = current_metric.get()
+        with self.lock:
+            entry = self.queries.setdefault(query, dict.fromkeys(REQUEST_COUNTERS, 0))
+            entry['first'] = min(entry.get('first', started), started)
+            entry['last'] = max(entry.get('last', finished), finished)
+            targets = [entry]
+            if metric is not None:
+                targets.append(self.metrics.setdefault(metric, dict.fromkeys(REQUEST_COUNTERS, 0)))
+            for target in targets:
+                for name, count in counts.items():
+                    target[name] = target.get(name, 0) + count
+
+    def record_metric(self, metric, seconds, status):
+        """
+        Record how long a metric took and how it ended.
+
+
+        :param String metric: Metric name
+        :param Float seconds: Wall time
+        :param String status: 'ok', 'failed' or 'timeout'
+        """
+        with self.lock:
+            entry = self.metrics.setdefault(metric, dict.fromkeys(REQUEST_COUNTERS, 0))
+            # A timed out metric keeps running in its thread, do not let it overwrite the timeout
+            if entry.get('status') != 'timeout':
+                entry['seconds'] = seconds
+                entry['status'] = status
+
+    def share(self, stage, metrics):
+        """
+        Declare that metrics read what a measured stage loaded for all of them.
+
+
+        :param String stage: Name the stage was measured under (see run_measured)
+        :param List metrics: Names of the metrics reading it
+        """
+        with self.lock:
+            self.shared[stage] = list(metrics)
+
+    def record_sheets_call(self, method, seconds):
+        """
+        Record one Sheets API call.
+
+
+        :param String method: API method (e.g. values.batchGet)
+        :param Float seconds: Wall time
+        """
+        with self.lock:
+            entry = self.sheets.setdefault(method, {'calls': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+
+    def merge(self, report, prefix=''):
+        """
+        Add the metrics, queries and Sheets calls of another run's report (e.g. from a worker process).
+
+
+        :param Dict report: Report from report()
+        :param String prefix: Prefix for the metric names (Default = '')
+        """
+        with self.lock:
+            for metric, entry in report['metrics'].items():
+                self.metrics[f'{prefix}{metric}'] = {name: value for name, value in entry.items() if name != 'shared'}
+            for stage, entry in report['shared'].items():
+                self.metrics[f'{prefix}{stage}'] = {name: value for name, value in entry.items() if name != 'metrics'}
+                self.shared[f'{prefix}{stage}'] = [f'{prefix}{metric}' for metric in entry['metrics']]
+            for query, entry in report['queries'].items():
+                mine = self.queries.setdefault(query, dict.fromkeys(REQUEST_COUNTERS, 0))
+                for name in REQUEST_COUNTERS:
+                    mine[name] += entry[name]
+                mine['merged_seconds'] = mine.get('merged_seconds', 0) + entry['seconds']
+            for method, entry in report['sheets'].items():
+                mine = self.sheets.setdefault(method, {'calls': 0, 'seconds': 0.0})
+                mine['calls'] += entry['calls']
+                mine['seconds'] += entry['seconds']
+
+    def report(self):
+        """
+        Get everything recorded so far.
+
+
+        :return: JSON serializable run report
+        :rtype: Dict
+        """
+        with self.lock:
+            finished = time.time()
+            queries = {}
+            for query, entry in self.queries.items():
+                seconds = entry['last'] - entry['first'] if 'first' in entry else 0.0
+                queries[query] = {'name': query_name(query), 'seconds': seconds + entry.get('merged_seconds', 0),
+                                  **{name: entry[name] for name in REQUEST_COUNTERS}}
+            metrics = {metric: dict(entry) for metric, entry in self.metrics.items() if metric not in self.shared}
+            shared = {}
+            for stage, readers in self.shared.items():
+                shared[stage] = dict(self.metrics.get(stage, {}), metrics=list(readers))
+                for metric in readers:
+                    if metric in metrics:
+                        metrics[metric].setdefault('shared', []).append(stage)
+            report = {
+                'started': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                'finished': datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+                'seconds': finished - self.started,
+                'metrics': metrics,
+                'shared': shared,
+                'queries': queries,
+                'sheets': {method: dict(entry) for method, entry in self.sheets.items()},
+            }
+        report['totals'] = {name: sum(entry[name] for entry in queries.values()) for name in REQUEST_COUNTERS}
+        report['totals']['sheets_calls'] = sum(entry['calls'] for entry in report['sheets'].values())
+        return report
+
+
+recorder = RunRecorder()
+
+
+def task_name(function):
+    """
+    Helper function to name a metric task after the function it runs.
+
+
+    :param Function function: Metric function (or functools.partial of one)
+    :return: Name
+    :rtype: String
+    """
+    return getattr(function, 'func', function).__name__
+
+
+def run_measured(metric, function, profile_dir=None):
+    """
+    Function to run a metric, timing it and attributing its requests to it.
+
+    Call it through contextvars.copy_context().run so the metric name does not leak into
+    other work done by the same thread.
+
+
+    :param String metric: Metric name
+    :param Function function: Metric function
+    :param String profile_dir: Directory to dump a cProfile of the metric to, <metric>.prof (Default = None)
+    :return: Whatever the function returns
+    """
+    current_metric.set(metric)
+    profile = cProfile.Profile() if profile_dir else None
+    started = time.monotonic()
+    status = 'failed'
+    try:
+        result = profile.runcall(function) if profile else function()
+        status = 'ok'
+        return result
+    finally:
+        recorder.record_metric(metric, time.monotonic() - started, status)
+        if profile:
+            os.makedirs(profile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(profile_dir, f'{metric}.prof'))
+
+
+def query_name(query):
+    """
+    Helper function to get the short stable name a query is labelled with, the run report maps it to the query.
+
+
+    :param String query: JQL (or REST path)
+    :return: Name, e.g. query-3f786850e3
+    :rtype: String
+    """
+    return f"query-{hashlib.sha1(query.encode('utf-8')).hexdigest()[:10]}"
+
+
+def escape_label(value):
+    """
+    Helper function to escape a Prometheus label value.
+
+
+    :param String value: Label value
+    :return: Escaped value
+    :rtype: String
+    """
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_prometheus(report):
+    """
+    Function to lay out a run report in the Prometheus text exposition format.
+
+
+    :param Dict report: Report from RunRecorder.report()
+    :return: Text for the node exporter's textfile collector
+    :rtype: String
+    """
+    families = [
+        ('jetrics_run_seconds', 'Wall time of the last run', [('', report['seconds'])]),
+        ('jetrics_run_finished_timestamp_seconds', 'When the last run finished',
+         [('', datetime.fromisoformat(report['finished']).timestamp())]),
+        ('jetrics_metric_seconds', 'Wall time of every metric in the last run',
+         [(f'metric="{escape_label(metric)}",status="{entry.get("status", "unknown")}"', entry.get('seconds', 0))
+          for metric, entry in report['metrics'].items()]),
+    ]
+    for name in REQUEST_COUNTERS:
+        families.append((f'jetrics_metric_{name}', f'JIRA {name} of every metric in the last run',
+                         [(f'metric="{escape_label(metric)}"', entry.get(name, 0))
+                          for metric, entry in report['metrics'].items()]))
+    families.append(('jetrics_shared_seconds', 'Wall time of the work shared by several metrics in the last run',
+                     [(f'stage="{escape_label(stage)}",status="{entry.get("status", "unknown")}"',
+                       entry.get('seconds', 0)) for stage, entry in report['shared'].items()]))
+    for name in REQUEST_COUNTERS:
+        families.append((f'jetrics_shared_{name}', f'JIRA {name} of the work shared by several metrics in the last run',
+                         [(f'stage="{escape_label(stage)}"', entry.get(name, 0))
+                          for stage, entry in report['shared'].items()]))
+    families.append(('jetrics_metric_shared', 'Shared work every metric reads, 1 for every pair',
+                     [(f'metric="{escape_label(metric)}",stage="{escape_label(stage)}"', 1)
+                      for stage, entry in report['shared'].items() for metric in entry['metrics']]))
+    # Queries are labelled by name, the JSON report maps the names to the JQL
+    families.append(('jetrics_query_seconds', 'Wall time of every JIRA query in the last run',
+                     [(f'query="{entry["name"]}"', entry['seconds']) for entry in report['queries'].values()]))
+    for name in REQUEST_COUNTERS:
+        families.append((f'jetrics_query_{name}', f'JIRA {name} of every query in the last run',
+                         [(f'query="{entry["name"]}"', entry[name]) for entry in report['queries'].values()]))
+    families.append(('jetrics_sheets_calls', 'Sheets API calls in the last run',
+                     [(f'method="{method}"', entry['calls']) for method, entry in report['sheets'].items()]))
+    families.append(('jetrics_sheets_seconds', 'Time spent in Sheets API calls in the last run',
+                     [(f'method="{method}"', entry['seconds']) for method, entry in report['sheets'].items()]))
+    lines = []
+    for name, description, samples in families:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_atomically(path, text):
+    """
+    Helper function to replace a file in one step, so readers never see half of it.
+
+
+    :param String path: File to write
+    :param String text: Content
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as output:
+        output.write(text)
+    os.replace(temporary, path)
+
+
+def write_reports(report_path=None, prometheus_path=None):
+    """
+    Function to write the run report as JSON and/or as a Prometheus textfile.
+
+
+    :param String report_path: JSON report file (Default = None, not written)
+    :param String prometheus_path: Prometheus textfile collector file (Default = None, not written)
+    :return: The report
+    :rtype: Dict
+    """
+    report = recorder.report()
+    if report_path:
+        write_atomically(report_path, json.dumps(report, indent=2) + '\n')
+        log.info(f'Run report written to {report_path}')
+    if prometheus_path:
+        write_atomically(prometheus_path, format_prometheus(report))
+    return report
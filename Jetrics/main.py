@@ -1,48 +1,136 @@
 # Built In Modules
+import contextvars
+from datetime import datetime, timedelta, timezone
+from functools import partial
 import logging
+import sys
 
 # Local Modules
+import Jetrics.cache as c
 import Jetrics.downstream as d
-import Jetrics.upstream as u
+import Jetrics.epics as e
+import Jetrics.instrument as i
+import Jetrics.runner as r
+import Jetrics.sinks as s
+import Jetrics.teams as t
+from Jetrics.config import config
 
 # Global Variables
 log = logging.getLogger('Jetrics.main')
 
 def main():
     """
-    Main function to start the program
+    Main function to start the program, same as `jetrics sync`
 
+    """
+    from Jetrics import cli
+
+    cli.main(['sync'] + sys.argv[1:])
+
+
+def sync_cache(client, store=None, fields=None):
+    """
+    Function to bring the local issue cache and its epics up to date, when it is enabled.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param sqlite3.Connection store: Open issue cache to reuse (Default = None, opened)
+    :param List fields: Issue fields the run reads (Default = downstream.issue_fields)
+    :return: Issue cache, None when it is disabled
+    :rtype: sqlite3.Connection
+    """
+    if not config['cache_dir']:
+        return store
+    log.info('Syncing issue cache...')
+    if store is None:
+        store = c.open_cache(d.standard_jql)
+    c.sync(client, store, d.standard_jql, fields or d.issue_fields)
+    c.sync_epics(client, store, e.epics_jql(e.planning_labels()))
+    return store
+
+
+def compute(client, store=None, profile_dir=None, executor=None, issues=None):
+    """
+    Function to compute the metrics of every sheet.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param sqlite3.Connection store: Open issue cache to reuse (Default = None, opened if enabled)
+    :param String profile_dir: Directory to dump a cProfile of every metric to (Default = None)
+    :param concurrent.futures.ProcessPoolExecutor executor: Pool to compute the teams in (Default = None)
+    :param List issues: Already fetched issues of every sheet when the cache is disabled (Default = None, fetched)
+    :return: Sheet name -> (Column -> value)
+    :rtype: Dict
+    """
+    if config['teams']:
+        # One full report per team, each synced to the sheet named after the team
+        log.info(f"Generating Jetrics for {len(config['teams'])} teams...")
+        return t.compute_teams(client, config['teams'], config['quarter_label'], profile_dir, executor, issues)
+
+    store = sync_cache(client, store)
+
+    # Go over the issues once, then build our downstream values, running the independent metrics concurrently
+    log.info('Generating Jetrics...')
+    index, sketches = contextvars.copy_context().run(
+        i.run_measured, 'load_population', partial(d.load_population, client, store, issues), profile_dir)
+    tasks = d.metric_tasks(client, config['quarter_label'], index, sketches, store)
+    # The JIRA requests of the load are reported once, for every metric reading it
+    i.recorder.share('load_population', [i.task_name(function) for function in tasks.values()])
+    return {'Sheet1': r.run_metrics(tasks, profile_dir=profile_dir)}
+
+
+def breakdown(client, windows, dimension=None, store=None, today=None):
+    """
+    Function to compute the metrics over rolling windows, optionally broken down, from one pass over the issues.
+
+    Every window and breakdown is answered from the same cube (see cube.MetricCube), a window
+    holding the issues of config['projects'] created in its last days.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param List windows: Window lengths in days (0 for every issue since config['start_date'])
+    :param String dimension: One of cube.DIMENSIONS to break the metrics down by (Default = None)
+    :param sqlite3.Connection store: Open issue cache to reuse (Default = None, opened if enabled)
+    :param datetime.date today: Last day of every window (Default = today, UTC)
+    :return: Window -> (Column -> value), with a dimension Window -> (Value name -> (Column -> value))
+    :rtype: Dict
+    """
+    store = sync_cache(client, store, d.issue_fields + d.breakdown_fields)
+    log.info('Building the metric cube...')
+    pairs = {name: [] for name in config['duration_metrics']}
+    index, _ = contextvars.copy_context().run(
+        i.run_measured, 'load_population', partial(d.load_population, client, store, pairs=pairs))
+    # Only the cube reads it, no metric is measured on its own
+    i.recorder.share('load_population', [])
+    graph = e.EpicGraph.load(client, store, e.planning_labels())
+    cube = d.metric_cube(index, pairs, graph, config['quarter_label'])
+    today = today or datetime.now(timezone.utc).date()
+    return {f'last {days} days' if days else 'all time':
+            cube.values(today - timedelta(days=days - 1) if days else None, today, dimension) for days in windows}
+
+
+def run(profile_dir=None, dry_run=False):
+    """
+    Function to compute the metrics and write them to every sink (config['sinks']).
+
+
+    :param String profile_dir: Directory to dump a cProfile of every metric to (Default = None)
+    :param Bool dry_run: Only return what would be written (Default = False)
+    :return: Sheet name -> (Sink name -> what was written, or would be)
+    :rtype: Dict
     """
     # Get our JIRA client
     log.info('Getting JIRA client...')
     client = d.get_jira_client()
 
-    # Build our downstream values
-    log.info('Generating Jetrics...')
-    ret = d.deferred_or_declined(client)
-    deferred, declined = ret[0], ret[1]
-    ret = d.cycle_time(client)
-    bug_cycle_time, story_cycle_time = ret[0], ret[1]
-    values = {
-        'Current Work In Progress': d.current_work_in_progress(client),
-        'Average Code Review Time': d.average_code_review_time(client),
-        'Average Code Review to QE': d.average_code_review_to_qe(client),
-        'Time to Deploy': d.time_to_deploy(client),
-        'Bug Cycle Time': bug_cycle_time,
-        'Story Cycle Time': story_cycle_time,
-        'QE Gaps': d.qe_gaps(client),
-        'Bugs Caught': d.bugs_caught(client),
-        'Bug Ratio': d.bug_ratio(client),
-        'Work Outside of Quarterly Planning': d.work_outside_of_quarterly_planning(client, 'Y19-Q4'),
-        'Passing QE': d.passing_qe(client),
-        'Deferred Issues': deferred,
-        'Declined Issues': declined,
-    }
-
     # Sync these values upstream
-    log.info('Syncing upstream...')
-    u.sync_with_upstream(values)
+    written = {}
+    sinks = s.get_sinks()
+    for sheet, values in compute(client, profile_dir=profile_dir).items():
+        log.info(f'Syncing upstream to {sheet}...')
+        written[sheet] = s.sync(values, sheet=sheet, dry_run=dry_run, sinks=sinks)
+    return written
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,565 @@
+# Built In Modules
+from datetime import datetime, timezone
+import logging
+import re
+import threading
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics.columnar import intern
+
+# Global Variables
+TOKENS = re.compile(r"""\s*(?:(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|(?P<operator>!=|>=|<=|!~|[=<>~(),])|"""
+                    r"""(?P<word>[^\s"'=!<>~(),]+))""")
+UNICODE_ESCAPE = re.compile(r'\\u([0-9a-fA-F]{4})')
+DATE = re.compile(r'^(\d{4})[/-](\d{1,2})[/-](\d{1,2})(?: (\d{1,2}):(\d{2}))?$')
+KEYWORDS = {'and', 'or', 'not', 'in', 'is', 'empty', 'null', 'changed', 'from', 'to', 'order', 'by'}
+# JQL field -> indexed field, every other field makes a query unsupported
+FIELDS = {
+    'project': 'project',
+    'type': 'type',
+    'issuetype': 'type',
+    'status': 'status',
+    'resolution': 'resolution',
+    'category': 'category',
+    'created': 'created',
+    'createddate': 'created',
+    'epic link': 'epic',
+    'priority': 'priority',
+    'component': 'component',
+}
+# Indexed field -> (Issue level array, name table), 'status' and 'resolution' also have transitions.
+# Assignees are only kept for breakdowns (see cube), JQL can name them by login, display name or email
+TABLES = {
+    'project': ('projects', 'project_codes'),
+    'type': ('issue_types', 'type_codes'),
+    'category': ('categories', 'category_codes'),
+    'status': ('statuses', 'status_codes'),
+    'resolution': ('resolutions', 'resolution_codes'),
+    'epic': ('epics', 'epic_codes'),
+    'assignee': ('assignees', 'assignee_codes'),
+    'priority': ('priorities', 'priority_codes'),
+    'component': ('components', 'component_codes'),
+}
+# Indexed field with any number of values per issue -> issue position of every value (its array in TABLES)
+MULTI_VALUED = {
+    'component': 'component_issues',
+}
+# Indexed field -> (Issue position, from code, to code) arrays of its transitions
+TRANSITIONS = {
+    'status': ('issue_index', 'from_codes', 'to_codes'),
+    'resolution': ('resolution_index', 'resolution_from', 'resolution_to'),
+}
+log = logging.getLogger(__name__)
+
+
+class UnsupportedQuery(ValueError):
+    """
+    Raised for JQL the local evaluator cannot answer, the caller asks JIRA instead.
+    """
+
+
+def unescape(value):
+    """
+    Helper function to decode the escapes JQL allows in values (e.g. 2019\\u002f06\\u002f1).
+
+
+    :param String value: Raw value
+    :return: Value
+    :rtype: String
+    """
+    return re.sub(r'\\(.)', lambda match: match.group(1),
+                  UNICODE_ESCAPE.sub(lambda match: chr(int(match.group(1), 16)), value))
+
+
+def tokenize(jql):
+    """
+    Function to split JQL into (kind, value) tokens.
+
+
+    :param String jql: JQL
+    :return: Tokens, kind is 'string', 'operator', 'word' or 'keyword'
+    :rtype: List
+    """
+    tokens, position = [], 0
+    jql = jql.rstrip()
+    while position < len(jql):
+        match = TOKENS.match(jql, position)
+        if match is None or match.end() == position:
+            raise UnsupportedQuery(f'Cannot read {jql[position:]!r}')
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = unescape(value[1:-1])
+        elif kind == 'word' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        elif kind == 'word':
+            value = unescape(value)
+        tokens.append((kind, value))
+    return tokens
+
+
+class Parser(object):
+    """
+    Recursive descent parser for the subset of JQL the IssueIndex answers.
+
+    Clauses are turned into hashable tuples, so the index can reuse the matches of a clause
+    every metric shares::
+
+        ('all',)                                    Every issue
+        ('and', clause, ...) / ('or', clause, ...)
+        ('not', clause)
+        ('in', field, values, negated)              =, !=, in, not in (a None value is EMPTY)
+        ('empty', field, negated)                   is EMPTY, is not EMPTY
+        ('compare', field, operator, epoch ms)      created >, >=, <, <=, =, !=
+        ('changed', field, from values, to values)  changed [from X] [to Y], None for any
+
+    Values are lower case, as JQL matches them without case. ORDER BY is ignored.
+    """
+    def __init__(self, jql):
+        self.jql = jql
+        self.tokens = tokenize(jql)
+        self.position = 0
+
+    def peek(self, offset=0):
+        """
+        Helper to look at a token without consuming it.
+
+
+        :param Int offset: Tokens ahead of the current one (Default = 0)
+        :return: Token, (None, None) at the end
+        :rtype: Tuple
+        """
+        position = self.position + offset
+        return self.tokens[position] if position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        """
+        Helper to consume the current token if it matches, raising UnsupportedQuery if not.
+
+
+        :param String kind: Expected kind (Default = any)
+        :param String value: Expected value (Default = any)
+        :return: Value of the token
+        :rtype: String
+        """
+        token_kind, token_value = self.peek()
+        if token_kind is None or (kind and token_kind != kind) or (value and token_value != value):
+            raise UnsupportedQuery(f'Expected {value or kind or "more"} at token {self.position} of {self.jql!r}')
+        self.position += 1
+        return token_value
+
+    def accept(self, kind, value):
+        """
+        Helper to consume the current token only if it matches.
+
+
+        :param String kind: Expected kind
+        :param String value: Expected value
+        :return: Whether it was consumed
+        :rtype: Bool
+        """
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        """
+        Parse the whole query.
+
+
+        :return: Clause tree
+        :rtype: Tuple
+        """
+        if not self.tokens or self.peek() == ('keyword', 'order'):
+            return ('all',)
+        tree = self.parse_or()
+        if self.accept('keyword', 'order'):
+            # Ordering does not change a count
+            self.take('keyword', 'by')
+            self.position = len(self.tokens)
+        if self.position != len(self.tokens):
+            raise UnsupportedQuery(f'Unexpected {self.peek()[1]!r} in {self.jql!r}')
+        return tree
+
+    def parse_or(self):
+        """
+        Parse clauses joined by OR.
+
+
+        :return: Clause tree
+        :rtype: Tuple
+        """
+        clauses = [self.parse_and()]
+        while self.accept('keyword', 'or'):
+            clauses.append(self.parse_and())
+        return clauses[0] if len(clauses) == 1 else ('or',) + tuple(clauses)
+
+    def parse_and(self):
+        """
+        Parse clauses joined by AND, which binds tighter than OR.
+
+
+        :return: Clause tree
+        :rtype: Tuple
+        """
+        clauses = [self.parse_not()]
+        while self.accept('keyword', 'and'):
+            clauses.append(self.parse_not())
+        return clauses[0] if len(clauses) == 1 else ('and',) + tuple(clauses)
+
+    def parse_not(self):
+        """
+        Parse a NOT, a parenthesised query or a single clause.
+
+
+        :return: Clause tree
+        :rtype: Tuple
+        """
+        if self.accept('keyword', 'not'):
+            return ('not', self.parse_not())
+        if self.accept('operator', '('):
+            tree = self.parse_or()
+            self.take('operator', ')')
+            # Keep parenthesised ORs apart from the top level ones (see IssueIndex.parse)
+            return ('group', tree) if tree[0] == 'or' else tree
+        return self.parse_clause()
+
+    def parse_value(self):
+        """
+        Parse one value, EMPTY and NULL become None.
+
+
+        :return: Value
+        :rtype: String
+        """
+        kind, value = self.peek()
+        if kind == 'keyword' and value in ('empty', 'null'):
+            self.position += 1
+            return None
+        if kind not in ('word', 'string'):
+            raise UnsupportedQuery(f'Expected a value at token {self.position} of {self.jql!r}')
+        if kind == 'word' and self.peek(1) == ('operator', '('):
+            raise UnsupportedQuery(f'Function {value}() in {self.jql!r}')
+        self.position += 1
+        return value
+
+    def parse_values(self):
+        """
+        Parse a value or a parenthesised list of values.
+
+
+        :return: Values
+        :rtype: List
+        """
+        if not self.accept('operator', '('):
+            return [self.parse_value()]
+        values = [self.parse_value()]
+        while self.accept('operator', ','):
+            values.append(self.parse_value())
+        self.take('operator', ')')
+        return values
+
+    def parse_clause(self):
+        """
+        Parse one field clause, raising UnsupportedQuery for fields and operators that are not indexed.
+
+
+        :return: Clause tree
+        :rtype: Tuple
+        """
+        kind, name = self.peek()
+        if kind not in ('word', 'string'):
+            raise UnsupportedQuery(f'Expected a field at token {self.position} of {self.jql!r}')
+        field = FIELDS.get(name.lower())
+        if field is None:
+            raise UnsupportedQuery(f'{name} is not indexed')
+        self.position += 1
+        kind, operator = self.peek()
+        if field == 'created':
+            if kind != 'operator' or operator not in ('=', '!=', '>', '>=', '<', '<='):
+                raise UnsupportedQuery(f'Unsupported operator {operator} on {name} in {self.jql!r}')
+            self.position += 1
+            return ('compare', field, operator, parse_date(self.parse_value()))
+        if (kind, operator) == ('operator', '=') or (kind, operator) == ('operator', '!='):
+            self.position += 1
+            return ('in', field, lower([self.parse_value()]), operator == '!=')
+        if (kind, operator) == ('keyword', 'in') or (kind, operator) == ('keyword', 'not'):
+            negated = self.accept('keyword', 'not')
+            self.take('keyword', 'in')
+            return ('in', field, lower(self.parse_values()), negated)
+        if self.accept('keyword', 'is'):
+            negated = self.accept('keyword', 'not')
+            if self.parse_value() is not None:
+                raise UnsupportedQuery(f'Expected EMPTY after IS in {self.jql!r}')
+            return ('empty', field, negated)
+        if self.accept('keyword', 'changed'):
+            if field not in TRANSITIONS:
+                raise UnsupportedQuery(f'Changes of {name} are not indexed')
+            from_values = to_values = None
+            while True:
+                if self.accept('keyword', 'from'):
+                    from_values = lower(self.parse_values())
+                elif self.accept('keyword', 'to'):
+                    to_values = lower(self.parse_values())
+                else:
+                    break
+            if self.peek()[0] == 'word':
+                # AFTER, BEFORE, BY, DURING, ON
+                raise UnsupportedQuery(f'Unsupported {self.peek()[1]} predicate in {self.jql!r}')
+            return ('changed', field, from_values, to_values)
+        raise UnsupportedQuery(f'Unsupported operator {operator} on {name} in {self.jql!r}')
+
+
+def lower(values):
+    """
+    Helper function to turn values into the case-insensitive set clauses keep.
+
+
+    :param List values: Values, None for EMPTY
+    :return: Lower case values
+    :rtype: frozenset
+    """
+    return frozenset(value.lower() if value is not None else None for value in values)
+
+
+def parse_date(value):
+    """
+    Helper function to turn a JQL date (2019/06/1, 2019-06-01 or 2019/06/01 10:30) into epoch milliseconds.
+
+    Dates are taken as UTC. Relative dates (-4w) and functions (startOfMonth()) are not supported.
+
+
+    :param String value: Date
+    :return: Epoch milliseconds
+    :rtype: Int
+    """
+    match = DATE.match(value or '')
+    if match is None:
+        raise UnsupportedQuery(f'Unsupported date {value!r}')
+    year, month, day, hour, minute = (int(part) if part else 0 for part in match.groups())
+    return int(datetime(year, month, day, hour, minute, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def parse(jql):
+    """
+    Function to parse JQL into a clause tree (see Parser).
+
+
+    :param String jql: JQL
+    :return: Clause tree
+    :rtype: Tuple
+    """
+    return Parser(jql).parse()
+
+
+class IssueIndex(object):
+    """
+    In memory index of a base population of issues, counting JQL without asking JIRA.
+
+    Issues are added a columnar.Changelog (e.g. a search page) at a time, their names re-coded
+    into tables shared by every page. A query is answered with NumPy masks over the issue level
+    codes (project, type, category, status, resolution, epic, assignee, priority, components, created)
+    and the status and resolution transitions, every clause is matched once and reused by the queries
+    sharing it.
+
+    A query starting with `base_jql AND` only evaluates the rest: the population was fetched
+    with the base query, so JIRA already answered that part. Anything outside the supported
+    subset raises UnsupportedQuery.
+    """
+    def __init__(self, base_jql=None):
+        self.base_jql = base_jql
+        self.project_codes, self.type_codes, self.category_codes = {}, {}, {None: 0}
+        self.status_codes, self.resolution_codes, self.epic_codes = {None: 0}, {None: 0}, {None: 0}
+        self.assignee_codes, self.priority_codes, self.component_codes = {None: 0}, {None: 0}, {None: 0}
+        self.parts = {name: [] for name in ('projects', 'issue_types', 'categories', 'statuses', 'resolutions',
+                                            'epics', 'assignees', 'priorities', 'component_issues', 'components',
+                                            'created', 'issue_index', 'from_codes', 'to_codes',
+                                            'resolution_index', 'resolution_from', 'resolution_to')}
+        self.arrays = None
+        self.issues = 0
+        self.matches = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.issues
+
+    def add(self, changelog):
+        """
+        Add the issues of a Changelog.
+
+
+        :param columnar.Changelog changelog: Changelog
+        """
+        remap = {}
+        for array, table in TABLES.values():
+            codes = getattr(self, table)
+            remap[table] = np.array([intern(codes, name) for name in getattr(changelog, table)], dtype=np.int32)
+            self.parts[array].append(remap[table][getattr(changelog, array)])
+        self.parts['created'].append(changelog.created)
+        for positions in MULTI_VALUED.values():
+            self.parts[positions].append(getattr(changelog, positions) + self.issues)
+        for field, (positions, from_codes, to_codes) in TRANSITIONS.items():
+            table = remap[TABLES[field][1]]
+            self.parts[positions].append(getattr(changelog, positions) + self.issues)
+            self.parts[from_codes].append(table[getattr(changelog, from_codes)])
+            self.parts[to_codes].append(table[getattr(changelog, to_codes)])
+        self.issues += len(changelog.keys)
+        with self.lock:
+            self.arrays, self.matches = None, {}
+
+    def get_arrays(self):
+        """
+        Get the indexed arrays, joining the pages added since the last query.
+
+
+        :return: Array name -> numpy.ndarray
+        :rtype: Dict
+        """
+        with self.lock:
+            if self.arrays is None:
+                self.arrays = {name: np.concatenate(parts) if parts else
+                               np.zeros(0, dtype=np.int64 if name == 'created' else np.int32)
+                               for name, parts in self.parts.items()}
+                self.parts = {name: [array] for name, array in self.arrays.items()}
+            return self.arrays
+
+    def codes(self, field, values):
+        """
+        Helper to get the codes of the names a clause matches, ignoring case.
+
+
+        :param String field: Indexed field
+        :param frozenset values: Lower case names, None for EMPTY
+        :return: Codes
+        :rtype: List
+        """
+        return [code for name, code in getattr(self, TABLES[field][1]).items()
+                if (name.lower() if name is not None else None) in values]
+
+    def match(self, clause):
+        """
+        Get the issues matching a clause tree, reusing clauses matched before.
+
+
+        :param Tuple clause: Clause tree (see Parser)
+        :return: Mask over the issues
+        :rtype: numpy.ndarray
+        """
+        mask = self.matches.get(clause)
+        if mask is None:
+            mask = self.matches[clause] = self.evaluate(clause)
+        return mask
+
+    def evaluate(self, clause):
+        """
+        Function to match a clause tree against the index.
+
+
+        :param Tuple clause: Clause tree (see Parser)
+        :return: Mask over the issues
+        :rtype: numpy.ndarray
+        """
+        arrays = self.get_arrays()
+        kind = clause[0]
+        if kind == 'all':
+            return np.ones(self.issues, dtype=bool)
+        if kind == 'group':
+            return self.match(clause[1])
+        if kind == 'and':
+            return np.logical_and.reduce([self.match(part) for part in clause[1:]])
+        if kind == 'or':
+            return np.logical_or.reduce([self.match(part) for part in clause[1:]])
+        if kind == 'not':
+            return ~self.match(clause[1])
+        if kind == 'compare':
+            _, _, operator, value = clause
+            created = arrays['created']
+            return {'=': created == value, '!=': created != value, '>': created > value,
+                    '>=': created >= value, '<': created < value, '<=': created <= value}[operator]
+        codes = arrays[TABLES[clause[1]][0]]
+        if kind == 'empty':
+            # Project and type are never empty, they have no None code
+            empty = self.any_value(clause[1], np.isin(codes, self.codes(clause[1], {None})))
+            return ~empty if clause[2] else empty
+        if kind == 'in':
+            _, field, values, negated = clause
+            if negated:
+                # As in JIRA, `!=` and `not in` never match an empty field
+                return ~self.any_value(field, np.isin(codes, self.codes(field, values | {None})))
+            return self.any_value(field, np.isin(codes, self.codes(field, values)))
+        if kind == 'changed':
+            _, field, from_values, to_values = clause
+            positions, from_codes, to_codes = (arrays[name] for name in TRANSITIONS[field])
+            rows = np.ones(len(positions), dtype=bool)
+            if from_values is not None:
+                rows &= np.isin(from_codes, self.codes(field, from_values))
+            if to_values is not None:
+                rows &= np.isin(to_codes, self.codes(field, to_values))
+            mask = np.zeros(self.issues, dtype=bool)
+            mask[positions[rows]] = True
+            return mask
+        raise UnsupportedQuery(f'Unknown clause {kind}')
+
+    def any_value(self, field, rows):
+        """
+        Helper to get the issues with any value of a field matching, for fields with several values per issue.
+
+
+        :param String field: Indexed field
+        :param numpy.ndarray rows: Mask over the values of the field
+        :return: Mask over the issues
+        :rtype: numpy.ndarray
+        """
+        positions = MULTI_VALUED.get(field)
+        if positions is None:
+            return rows
+        mask = np.zeros(self.issues, dtype=bool)
+        mask[self.get_arrays()[positions][rows]] = True
+        return mask
+
+    def parse(self, jql):
+        """
+        Function to parse a query, leaving out the base query it refines.
+
+
+        :param String jql: JQL
+        :return: Clause tree
+        :rtype: Tuple
+        """
+        if self.base_jql:
+            if jql.strip() == self.base_jql:
+                return ('all',)
+            prefix = f'{self.base_jql} AND '
+            if jql.startswith(prefix):
+                rest = parse(jql[len(prefix):])
+                # `base AND a OR b` is `(base AND a) OR b`, the base cannot be left out
+                if rest[0] != 'or':
+                    return rest
+        return parse(jql)
+
+    def mask(self, jql):
+        """
+        Function to find the indexed issues matching a JQL query.
+
+
+        :param String jql: JQL
+        :return: Mask over the issues, in the order they were added
+        :rtype: numpy.ndarray
+        """
+        return self.match(self.parse(jql))
+
+    def count(self, jql):
+        """
+        Function to count the indexed issues matching a JQL query.
+
+
+        :param String jql: JQL
+        :return: Number of matching issues
+        :rtype: Int
+        """
+        return int(np.count_nonzero(self.mask(jql)))
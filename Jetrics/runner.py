@@ -0,0 +1,100 @@
+# Built In Modules
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from functools import partial
+import logging
+
+# Local Modules
+from Jetrics import instrument
+from Jetrics.config import config
+
+# Global Variables
+log = logging.getLogger(__name__)
+
+
+async def run_metric(loop, executor, semaphore, columns, function, timeout, profile_dir=None):
+    """
+    Run one metric task in the thread pool once the semaphore lets it through.
+
+
+    :param asyncio.AbstractEventLoop loop: Event loop
+    :param concurrent.futures.Executor executor: Thread pool running the (blocking) metric
+    :param asyncio.Semaphore semaphore: Shared limit on the metrics running at once
+    :param Tuple columns: Sheet columns the task produces
+    :param Function function: Metric function, returns one value per column
+    :param Float timeout: Seconds before the metric is reported as missing
+    :param String profile_dir: Directory to dump a cProfile of the metric to (Default = None)
+    :return: Column -> value (None for every column if the metric failed)
+    :rtype: Dict
+    """
+    name = instrument.task_name(function)
+    async with semaphore:
+        measured = partial(instrument.run_measured, name, function, profile_dir)
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(executor, contextvars.copy_context().run, measured), timeout)
+        except asyncio.TimeoutError:
+            log.error(f'{", ".join(columns)} timed out after {timeout}s')
+            instrument.recorder.record_metric(name, timeout, 'timeout')
+            return dict.fromkeys(columns)
+        except Exception:
+            log.exception(f'{", ".join(columns)} failed')
+            return dict.fromkeys(columns)
+        log.info(f'{name} took {instrument.recorder.metrics[name]["seconds"]:.2f}s')
+    if len(columns) == 1:
+        result = (result,)
+    return dict(zip(columns, result))
+
+
+async def run_metrics_async(tasks, concurrency, timeout, profile_dir=None):
+    """
+    Run every metric task concurrently and gather their values.
+
+
+    :param Dict tasks: Tuple of sheet columns -> function returning one value per column
+    :param Int concurrency: Maximum number of metrics running at once
+    :param Float timeout: Seconds before a metric is reported as missing
+    :param String profile_dir: Directory to dump a cProfile of every metric to (Default = None)
+    :return: Column -> value (None for missing metrics)
+    :rtype: Dict
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        results = await asyncio.gather(*[run_metric(loop, executor, semaphore, columns, function, timeout,
+                                                    profile_dir)
+                                         for columns, function in tasks.items()])
+    finally:
+        # A timed out metric cannot be interrupted, do not wait for it
+        executor.shutdown(wait=False)
+    values = {}
+    for result in results:
+        values.update(result)
+    return values
+
+
+def run_metrics(tasks, concurrency=None, timeout=None, profile_dir=None):
+    """
+    Function to run independent metrics concurrently.
+
+    A metric that raises or times out is logged and reported as None, the rest of the report
+    is still produced. Every metric is timed and its JIRA requests counted in
+    instrument.recorder.
+
+
+    :param Dict tasks: Tuple of sheet columns -> function returning one value per column
+    :param Int concurrency: Maximum number of metrics running at once (Default = config['max_workers'])
+    :param Float timeout: Seconds before a metric is reported as missing (Default = config['metric_timeout'])
+    :param String profile_dir: Directory to dump a cProfile of every metric to, <metric>.prof. Metrics
+        are then run one at a time so the profiles do not overlap (Default = None)
+    :return: Column -> value (None for missing metrics)
+    :rtype: Dict
+    """
+    if profile_dir:
+        concurrency = 1
+    return asyncio.run(run_metrics_async(tasks,
+                                         concurrency or config['max_workers'],
+                                         timeout or config['metric_timeout'],
+                                         profile_dir))
@@ -0,0 +1,340 @@
+# Built In Modules
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+# Local Modules
+import Jetrics.cache as c
+import Jetrics.downstream as d
+import Jetrics.instrument as i
+import Jetrics.main as m
+import Jetrics.sinks as s
+import Jetrics.teams as t
+from Jetrics.config import config
+from Jetrics.incremental import InvalidEvent, IssueAggregates
+from Jetrics.workdays import WorkingCalendar
+
+# Global Variables
+log = logging.getLogger(__name__)
+
+
+class LatestValues(object):
+    """
+    The values of the last successful refresh, shared between the scheduler and the HTTP server.
+
+    The values the webhook driven aggregates cover are read from them instead, so they are
+    as recent as the last JIRA event.
+    """
+    def __init__(self, aggregates=None):
+        self.lock = threading.Lock()
+        self.aggregates = aggregates or {}
+        self.sheets = {}
+        self.computed_at = None
+        self.refresh_seconds = None
+        self.last_error = None
+        self.refreshing = False
+
+    def update(self, sheets, seconds):
+        """
+        Replace the values with the ones of a refresh.
+
+
+        :param Dict sheets: Sheet name -> (Column -> value)
+        :param Float seconds: How long the refresh took
+        """
+        with self.lock:
+            self.sheets = sheets
+            self.computed_at = time.time()
+            self.refresh_seconds = seconds
+            self.last_error = None
+
+    def snapshot(self):
+        """
+        Get the values and how old they are.
+
+
+        :return: JSON serializable values
+        :rtype: Dict
+        """
+        with self.lock:
+            age = time.time() - self.computed_at if self.computed_at else None
+            sheets = {sheet: dict(values) for sheet, values in self.sheets.items()}
+            snapshot = {
+                'computed_at': datetime.fromtimestamp(self.computed_at, timezone.utc).isoformat()
+                if self.computed_at else None,
+                'age_seconds': age,
+                'updated_at': None,
+                'refresh_seconds': self.refresh_seconds,
+                'refreshing': self.refreshing,
+                'last_error': self.last_error,
+                'sheets': sheets,
+            }
+        updated = [aggregates.updated_at for aggregates in self.aggregates.values() if aggregates.updated_at]
+        for sheet, aggregates in self.aggregates.items():
+            if aggregates.updated_at:
+                sheets.setdefault(sheet, {}).update(aggregates.values())
+        if updated:
+            snapshot['updated_at'] = datetime.fromtimestamp(max(updated), timezone.utc).isoformat()
+        return snapshot
+
+
+def format_prometheus(snapshot):
+    """
+    Function to lay out the latest values in the Prometheus text exposition format.
+
+
+    :param Dict snapshot: Snapshot from LatestValues.snapshot()
+    :return: Text
+    :rtype: String
+    """
+    lines = ['# HELP jetrics_value Latest value of every Jetrics column', '# TYPE jetrics_value gauge']
+    for sheet, values in snapshot['sheets'].items():
+        for column, value in values.items():
+            if isinstance(value, (int, float)):
+                lines.append(f'jetrics_value{{sheet="{i.escape_label(sheet)}",column="{i.escape_label(column)}"}} '
+                             f'{value}')
+    lines += ['# HELP jetrics_value_age_seconds Seconds since the values were computed',
+              '# TYPE jetrics_value_age_seconds gauge',
+              f"jetrics_value_age_seconds {snapshot['age_seconds'] if snapshot['age_seconds'] is not None else 'NaN'}"]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the latest values from memory, never queries JIRA.
+
+    GET /values (JSON), GET /metrics (Prometheus), GET /health and POST /webhook (JIRA issue events).
+    """
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+    def send(self, status, content_type, body):
+        """
+        Send a response.
+
+
+        :param Int status: HTTP status
+        :param String content_type: Content type
+        :param String body: Body
+        """
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        snapshot = self.server.latest.snapshot()
+        path = self.path.split('?')[0].rstrip('/')
+        if path in ('', '/values'):
+            self.send(200, 'application/json', json.dumps(snapshot))
+        elif path == '/metrics':
+            self.send(200, 'text/plain; version=0.0.4', format_prometheus(snapshot))
+        elif path == '/health':
+            # Unhealthy until the first refresh, or when the values are more than two intervals old
+            healthy = snapshot['age_seconds'] is not None and \
+                snapshot['age_seconds'] < 2 * config['service_interval']
+            self.send(200 if healthy else 503, 'application/json',
+                      json.dumps({'healthy': healthy, 'age_seconds': snapshot['age_seconds'],
+                                  'last_error': snapshot['last_error']}))
+        else:
+            self.send(404, 'application/json', json.dumps({'error': f'No such resource {path}'}))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/webhook':
+            return self.send(404, 'application/json', json.dumps({'error': f'No such resource {url.path}'}))
+        if not config['webhook_secret']:
+            # Anyone able to reach the port could rewrite the served values
+            return self.send(403, 'application/json',
+                             json.dumps({'error': "Webhooks are disabled until config['webhook_secret'] is set"}))
+        if not hmac.compare_digest(parse_qs(url.query).get('secret', [''])[0], config['webhook_secret']):
+            return self.send(403, 'application/json', json.dumps({'error': 'Wrong webhook secret'}))
+        try:
+            event = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        except ValueError as error:
+            return self.send(400, 'application/json', json.dumps({'error': f'Invalid JSON: {error}'}))
+        try:
+            applied = self.server.service.receive(event)
+        except InvalidEvent as error:
+            return self.send(400, 'application/json', json.dumps({'error': f'Invalid event: {error}'}))
+        self.send(200, 'application/json', json.dumps({'applied': applied}))
+
+
+class Service(object):
+    """
+    Recomputes the metrics every config['service_interval'] seconds with clients that stay warm.
+
+    The JIRA client, its pooled keep-alive sessions, the sinks (e.g. the Sheets client), the
+    issue cache connection and (with teams) the worker processes are created once and reused
+    by every refresh.
+
+    Between refreshes, JIRA webhook events update incremental aggregates of every sheet (see
+    incremental.IssueAggregates), which every refresh rebuilds from the synced changelogs.
+    Without the issue cache, a refresh downloads the issues once and both computes the
+    metrics and rebuilds the aggregates from them.
+    """
+    def __init__(self, interval=None, sync_upstream=None):
+        self.interval = interval or config['service_interval']
+        self.sync_upstream = config['service_sync_upstream'] if sync_upstream is None else sync_upstream
+        self.stopped = threading.Event()
+        self.client = d.get_jira_client()
+        self.store = c.open_cache(d.standard_jql) if config['cache_dir'] and not config['teams'] else None
+        populations = config['teams'] or {'Sheet1': config['projects']}
+        self.aggregates = {sheet: IssueAggregates(projects, os.path.join(config['cache_dir'],
+                                                                         f'jetrics-aggregates-{sheet}.json')
+                                                  if config['cache_dir'] else None,
+                                                  WorkingCalendar.from_config(sheet if config['teams'] else None))
+                           for sheet, projects in populations.items()}
+        self.latest = LatestValues(self.aggregates)
+        self.executor = ProcessPoolExecutor(max_workers=config['team_workers']) if config['teams'] else None
+        self.sinks = s.get_sinks() if self.sync_upstream else []
+        for sink in self.sinks:
+            # e.g. authenticate and load the Sheets API description now rather than on the first refresh
+            sink.open()
+
+    def refresh(self):
+        """
+        Compute the metrics once, publish them and sync them upstream.
+        """
+        with self.latest.lock:
+            self.latest.refreshing = True
+        i.recorder.reset()
+        for aggregates in self.aggregates.values():
+            aggregates.hold_events()
+        started = time.monotonic()
+        try:
+            issues = None if config['cache_dir'] else self.fetch_population()
+            sheets = m.compute(self.client, self.store, executor=self.executor, issues=issues)
+            self.latest.update(sheets, time.monotonic() - started)
+            log.info(f'Refreshed the metrics in {time.monotonic() - started:.1f}s')
+            self.rebuild_aggregates(issues)
+            for sheet, values in sheets.items():
+                s.sync(values, sheet=sheet, sinks=self.sinks)
+        except Exception as error:
+            log.exception('Could not refresh the metrics, keeping the previous values')
+            with self.latest.lock:
+                self.latest.last_error = f'{type(error).__name__}: {error}'
+        finally:
+            for aggregates in self.aggregates.values():
+                aggregates.release_events()
+            with self.latest.lock:
+                self.latest.refreshing = False
+            i.write_reports(config['run_report'], config['prometheus_textfile'])
+
+    def fetch_population(self):
+        """
+        Function to download the issues of every sheet once, for a refresh without the issue cache.
+
+
+        :return: Raw issue JSON with the changelog expanded
+        :rtype: List
+        """
+        if not config['teams']:
+            return list(d.iter_population(self.client))
+        with d.configured(t.get_all_projects(config['teams'])):
+            return list(d.iter_population(self.client))
+
+    def rebuild_aggregates(self, issues=None):
+        """
+        Rebuild the aggregates of every sheet from the issues the refresh just synced.
+
+
+        :param List issues: Issues of every sheet the refresh downloaded, when the cache is disabled
+            (Default = None, read from the cache)
+        """
+        started = time.monotonic()
+        if config['cache_dir'] and self.store is None:
+            # Teams share the cache compute_teams synced
+            with d.configured(t.get_all_projects(config['teams'])):
+                self.store = c.open_cache(d.standard_jql)
+        for aggregates in self.aggregates.values():
+            if self.store is not None:
+                projects = sorted(aggregates.projects) if aggregates.projects else None
+                aggregates.rebuild(c.iter_issues(self.store, projects=projects))
+            else:
+                # Issues of other sheets are left out by the aggregates
+                aggregates.rebuild(issues)
+        log.info(f'Rebuilt the incremental aggregates in {time.monotonic() - started:.1f}s')
+
+    def receive(self, event):
+        """
+        Apply a JIRA webhook event to the aggregates of every sheet.
+
+
+        :param Dict event: Webhook payload
+        :return: True if the event changed any sheet
+        :rtype: Bool
+        """
+        applied = False
+        for aggregates in self.aggregates.values():
+            applied = aggregates.apply_event(event) or applied
+        return applied
+
+    def schedule(self):
+        """
+        Refresh now, then every interval until stopped. A refresh that overruns delays the next one.
+        """
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            self.refresh()
+            self.stopped.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def serve(self, host=None, port=None):
+        """
+        Start the scheduler and serve the values until interrupted.
+
+
+        :param String host: Address to listen on (Default = config['service_host'])
+        :param Int port: Port to listen on (Default = config['service_port'])
+        """
+        server = ThreadingHTTPServer((host or config['service_host'], port or config['service_port']),
+                                     MetricsHandler)
+        server.daemon_threads = True
+        server.latest = self.latest
+        server.service = self
+        scheduler = threading.Thread(target=self.schedule, name='jetrics-scheduler', daemon=True)
+        scheduler.start()
+        log.info(f'Serving the metrics on http://{server.server_address[0]}:{server.server_address[1]}')
+        if not config['webhook_secret']:
+            log.warning("POST /webhook is refused until config['webhook_secret'] (JETRICS_WEBHOOK_SECRET) is set, "
+                        'the values only change on refreshes')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stopped.set()
+            server.server_close()
+            if self.executor:
+                self.executor.shutdown(cancel_futures=True)
+
+
+def main():
+    """
+    Main function to run Jetrics as a service
+
+    """
+    parser = argparse.ArgumentParser(description='Recompute the Jetrics on a schedule and serve them over HTTP')
+    parser.add_argument('--host', help=f"Address to listen on (default: {config['service_host']})")
+    parser.add_argument('--port', type=int, help=f"Port to listen on (default: {config['service_port']})")
+    parser.add_argument('--interval', type=float,
+                        help=f"Seconds between refreshes (default: {config['service_interval']})")
+    parser.add_argument('--no-sync', action='store_true',
+                        help="Do not write the refreshed values to the sheet (or config['sinks'])")
+    args = parser.parse_args()
+
+    Service(args.interval, False if args.no_sync else None).serve(args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Built In Modules
+import datetime
+import importlib
+import logging
+
+# Local Modules
+from Jetrics.config import config
+
+# Global Variables
+# Sink name -> dotted path of its class, config['sinks'] also takes dotted paths of other Sink classes
+SINKS = {
+    'sheets': 'Jetrics.upstream.SheetsSink',
+    'history': 'Jetrics.history.HistorySink',
+}
+log = logging.getLogger(__name__)
+
+
+class Sink(object):
+    """
+    Somewhere computed rows are written.
+
+    Subclasses implement write_rows, and open() when they hold a connection worth setting up
+    before the first write (e.g. when the service starts).
+    """
+    name = None
+
+    def open(self):
+        """
+        Set up what the first write would otherwise pay for.
+        """
+
+    def write_rows(self, rows, sheet='Sheet1', dry_run=False):
+        """
+        Write dated rows of values.
+
+
+        :param List rows: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+        :param String sheet: Sheet (population) the rows belong to (default is Sheet1)
+        :param Bool dry_run: Only return what would be written (Default = False)
+        :return: What was written (or would be), JSON serializable
+        :rtype: Object
+        """
+        raise NotImplementedError
+
+
+def get_sinks(names=None):
+    """
+    Function to create the sinks, importing only the modules they live in.
+
+
+    :param List names: Sink names or dotted class paths (Default = config['sinks'])
+    :return: Sinks
+    :rtype: List
+    """
+    sinks = []
+    for name in config['sinks'] if names is None else names:
+        module, _, cls = SINKS.get(name, name).rpartition('.')
+        if not module:
+            raise ValueError(f"Unknown sink {name}, expected one of {', '.join(SINKS)} or a dotted class path")
+        sinks.append(getattr(importlib.import_module(module), cls)())
+    return sinks
+
+
+def write_rows(rows, sheet='Sheet1', dry_run=False, sinks=None):
+    """
+    Function to write dated rows to every sink.
+
+    A sink failing does not stop the others from being written, the first error is raised
+    once they all ran.
+
+
+    :param List rows: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+    :param String sheet: Sheet (population) the rows belong to (default is Sheet1)
+    :param Bool dry_run: Only return what would be written (Default = False)
+    :param List sinks: Sinks to write to (Default = None, get_sinks())
+    :return: Sink name -> what was written (or would be)
+    :rtype: Dict
+    """
+    written, error = {}, None
+    for sink in get_sinks() if sinks is None else sinks:
+        try:
+            written[sink.name] = sink.write_rows(rows, sheet=sheet, dry_run=dry_run)
+        except Exception as sink_error:
+            log.exception(f'Could not write {len(rows)} rows of {sheet} to the {sink.name} sink')
+            error = error or sink_error
+    if error is not None:
+        raise error
+    return written
+
+
+def sync(values, sheet='Sheet1', dry_run=False, sinks=None):
+    """
+    Function to write today's values to every sink.
+
+
+    :param Dict values: Column title -> value
+    :param String sheet: Sheet (population) the values belong to (default is Sheet1)
+    :param Bool dry_run: Only return what would be written (Default = False)
+    :param List sinks: Sinks to write to (Default = None, get_sinks())
+    :return: Sink name -> what was written (or would be)
+    :rtype: Dict
+    """
+    return write_rows([(datetime.datetime.today().strftime('%Y-%m-%d'), values)], sheet, dry_run, sinks)
@@ -0,0 +1,217 @@
+# Built In Modules
+import logging
+import math
+
+# 3rd Party Modules
+import numpy as np
+
+# Global Variables
+log = logging.getLogger(__name__)
+
+
+class QuantileSketch(object):
+    """
+    Mergeable streaming quantile sketch of non-negative values (DDSketch style).
+
+    Values are counted in logarithmic buckets, bucket i holding (gamma^(i-1), gamma^i] with
+    gamma = (1 + accuracy) / (1 - accuracy), so any quantile is returned within the relative
+    accuracy whatever the distribution. Zeros (e.g. a duration with no working time) are
+    counted apart. Memory is bounded by max_buckets: past it the lowest
+    buckets are folded together, which only costs accuracy in the lowest quantiles.
+
+    Count and sum are kept exactly, min and max too until a value is removed (see remove).
+    Two sketches with the same accuracy merge by adding their bucket counts, without keeping
+    any sample.
+    """
+    def __init__(self, accuracy=0.01, max_buckets=2048):
+        self.accuracy = accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        """
+        Add one value.
+
+
+        :param Float value: Non-negative value
+        """
+        self.add_many(np.array([value], dtype=np.float64))
+
+    def add_many(self, values):
+        """
+        Add an array of values in bulk.
+
+
+        :param numpy.ndarray values: Non-negative values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        if values.min() < 0:
+            raise ValueError('QuantileSketch only holds non-negative values')
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        indexes, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64),
+                                    return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.collapse()
+
+    def remove(self, value):
+        """
+        Take back one value added before.
+
+        The exact minimum and maximum cannot be recovered once their value is removed, they
+        fall back to the value of the lowest and highest remaining buckets (within the relative accuracy).
+
+
+        :param Float value: Value to remove
+        """
+        if value == 0:
+            if self.zeros < 1:
+                raise ValueError(f'{value} is not in the sketch')
+            self.zeros -= 1
+            self.count -= 1
+            if not self.count:
+                self.sum, self.min, self.max = 0.0, math.inf, -math.inf
+            elif not self.zeros:
+                self.min = self.bucket_value(min(self.buckets))
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        if self.buckets.get(index, 0) < 1:
+            # Folded into the lowest bucket by collapse()
+            index = min(self.buckets, default=index)
+            if self.buckets.get(index, 0) < 1:
+                raise ValueError(f'{value} is not in the sketch')
+        self.buckets[index] -= 1
+        if not self.buckets[index]:
+            del self.buckets[index]
+        self.count -= 1
+        self.sum -= value
+        if not self.count:
+            self.sum, self.min, self.max = 0.0, math.inf, -math.inf
+            return
+        if value >= self.max:
+            self.max = min(self.max, self.bucket_value(max(self.buckets))) if self.buckets else 0.0
+        if value <= self.min and not self.zeros:
+            self.min = max(self.min, self.bucket_value(min(self.buckets)))
+
+    def merge(self, other):
+        """
+        Add every value of another sketch to this one.
+
+
+        :param QuantileSketch other: Sketch with the same accuracy
+        :return: This sketch
+        :rtype: QuantileSketch
+        """
+        if other.gamma != self.gamma:
+            raise ValueError(f'Cannot merge sketches of accuracy {self.accuracy} and {other.accuracy}')
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.collapse()
+        return self
+
+    def collapse(self):
+        """
+        Fold the lowest buckets together until there are at most max_buckets.
+        """
+        if len(self.buckets) <= self.max_buckets:
+            return
+        indexes = sorted(self.buckets)
+        excess = indexes[:len(indexes) - self.max_buckets + 1]
+        self.buckets[excess[-1]] = sum(self.buckets.pop(index) for index in excess[:-1]) + \
+            self.buckets[excess[-1]]
+
+    def bucket_value(self, index):
+        """
+        Helper to get the value standing for a bucket: its middle in relative terms, within the
+        relative accuracy of every value in it.
+
+
+        :param Int index: Bucket index
+        :return: Value
+        :rtype: Float
+        """
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+
+        :param Float q: Quantile between 0 and 1
+        :return: Value (None if the sketch is empty)
+        :rtype: Float
+        """
+        if not self.count:
+            return None
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        """
+        Exact mean of the values.
+
+
+        :return: Mean (None if the sketch is empty)
+        :rtype: Float
+        """
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        """
+        Get the sketch as JSON serializable data.
+
+
+        :return: Sketch data
+        :rtype: Dict
+        """
+        return {'accuracy': self.accuracy, 'max_buckets': self.max_buckets, 'count': self.count, 'zeros': self.zeros,
+                'sum': self.sum, 'min': self.min if self.count else None, 'max': self.max if self.count else None,
+                'buckets': [[index, count] for index, count in sorted(self.buckets.items())]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a sketch from to_dict's data.
+
+
+        :param Dict data: Sketch data
+        :return: Sketch
+        :rtype: QuantileSketch
+        """
+        sketch = cls(data['accuracy'], data['max_buckets'])
+        sketch.buckets = {index: count for index, count in data['buckets']}
+        sketch.count, sketch.sum, sketch.zeros = data['count'], data['sum'], data.get('zeros', 0)
+        if sketch.count:
+            sketch.min, sketch.max = data['min'], data['max']
+        return sketch
@@ -0,0 +1,184 @@
+# Built In Modules
+from collections import deque
+from datetime import datetime, timezone
+import gzip
+import json
+import logging
+import os
+import threading
+
+# Local Modules
+from Jetrics.config import config
+
+# Global Variables
+FORMAT = 1
+_lock = threading.Lock()
+# Process id -> Recorder or Replayer of that process, worker processes open their own
+_recorders, _replayers = {}, {}
+log = logging.getLogger(__name__)
+
+
+class SnapshotMiss(LookupError):
+    """
+    Raised when a replayed run asks for a response the snapshot does not hold.
+    """
+
+
+def request_key(path, params):
+    """
+    Helper function to identify a request whatever the order of its parameters.
+
+
+    :param String path: Path under /rest/api/2/
+    :param Dict params: Query parameters
+    :return: Key
+    :rtype: String
+    """
+    return json.dumps([path, params], sort_keys=True)
+
+
+def start(path):
+    """
+    Function to record the run to a new snapshot, replacing any file at path.
+
+
+    :param String path: Snapshot file, e.g. run.ndjson.gz
+    """
+    with open(path, 'wb'):
+        pass
+    config['record_snapshot'] = path
+
+
+def get_recorder():
+    """
+    Get the recorder of this process when config['record_snapshot'] is set.
+
+
+    :return: Recorder, None when not recording
+    :rtype: Recorder
+    """
+    if not config['record_snapshot']:
+        return None
+    with _lock:
+        recorder = _recorders.get(os.getpid())
+        if recorder is None or recorder.path != config['record_snapshot']:
+            recorder = _recorders[os.getpid()] = Recorder(config['record_snapshot'])
+        return recorder
+
+
+def get_replayer():
+    """
+    Get the replayer of this process when config['replay_snapshot'] is set.
+
+
+    :return: Replayer, None when not replaying
+    :rtype: Replayer
+    """
+    if not config['replay_snapshot']:
+        return None
+    with _lock:
+        replayer = _replayers.get(os.getpid())
+        if replayer is None or replayer.path != config['replay_snapshot']:
+            replayer = _replayers[os.getpid()] = Replayer(config['replay_snapshot'])
+        return replayer
+
+
+class Recorder(object):
+    """
+    Appends raw JIRA responses to a snapshot: gzip compressed NDJSON, one line per response.
+
+    Every line is compressed as a gzip member of its own and appended with a single write, so
+    the snapshot can be read while it grows, a run stopped half way leaves only whole lines, and
+    worker processes (e.g. teams) append to the same file. gzip reads the members back as one stream.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if not os.fstat(self.fd).st_size:
+            # What the run was asked for, replaying it with other settings asks for other pages
+            self.write({'snapshot': FORMAT, 'server': os.environ.get('JIRA_URL'),
+                        'recorded_at': datetime.now(timezone.utc).isoformat(), 'start_date': config['start_date'],
+                        'projects': config['projects'], 'page_size': config['page_size']})
+
+    def write(self, record):
+        """
+        Helper to append one line as a gzip member of its own.
+
+
+        :param Dict record: JSON serializable line
+        """
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        os.write(self.fd, gzip.compress(line.encode('utf-8'), compresslevel=6))
+
+    def record(self, path, params, response):
+        """
+        Append a response.
+
+
+        :param String path: Path under /rest/api/2/
+        :param Dict params: Query parameters
+        :param Dict response: Decoded JSON response
+        """
+        self.write({'path': path, 'params': params, 'response': response})
+
+
+class Replayer(object):
+    """
+    Answers JIRA requests from a snapshot instead of the network.
+
+    The snapshot is read as a stream: lines are read until the asked request shows up, keeping
+    the ones read ahead (e.g. search pages fetched in parallel) until they are asked for, so only
+    responses in flight are held in memory. A request asked for more often than it was recorded
+    (e.g. `jetrics bench`) gets its last response again.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'rt', encoding='utf-8')
+        self.header = json.loads(self.file.readline() or '{}')
+        if self.header.get('snapshot') != FORMAT:
+            raise ValueError(f'{path} is not a Jetrics snapshot')
+        # Request key -> responses read ahead, Request key -> last line replayed
+        self.pending, self.replayed = {}, {}
+        self.lock = threading.Lock()
+
+    def read_record(self):
+        """
+        Helper to read the next response of the snapshot.
+
+
+        :return: Request key, line, None at the end of the snapshot
+        :rtype: Tuple
+        """
+        try:
+            line = self.file.readline()
+        except EOFError:
+            # The recording was cut short in the middle of a line
+            line = ''
+        if not line:
+            return None
+        record = json.loads(line)
+        return request_key(record['path'], record['params']), line, record['response']
+
+    def replay(self, path, params):
+        """
+        Function to get the recorded response of a request.
+
+
+        :param String path: Path under /rest/api/2/
+        :param Dict params: Query parameters
+        :return: Decoded JSON response, Size of its line in bytes
+        :rtype: Tuple
+        """
+        key = request_key(path, params)
+        with self.lock:
+            while not self.pending.get(key):
+                record = self.read_record()
+                if record is None:
+                    if key in self.replayed:
+                        line = self.replayed[key]
+                        return json.loads(line)['response'], len(line)
+                    raise SnapshotMiss(f'{self.path} has no response for {path} {params}')
+                self.pending.setdefault(record[0], deque()).append(record[1:])
+            line, response = self.pending[key].popleft()
+            self.replayed[key] = line
+            return response, len(line)
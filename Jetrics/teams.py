@@ -0,0 +1,117 @@
+# Built In Modules
+from concurrent.futures import ProcessPoolExecutor
+import contextvars
+from functools import partial
+import logging
+import os
+
+# Local Modules
+import Jetrics.cache as c
+import Jetrics.downstream as d
+import Jetrics.epics as e
+import Jetrics.runner as r
+from Jetrics import instrument
+from Jetrics.config import config
+
+# Global Variables
+log = logging.getLogger(__name__)
+# JIRA client of a worker process, kept for every team the worker computes
+_client = None
+
+
+def get_all_projects(teams):
+    """
+    Helper function to get every project used by at least one team, without duplicates.
+
+
+    :param Dict teams: Team name -> List of project keys
+    :return: Project keys
+    :rtype: List
+    """
+    projects = []
+    for team_projects in teams.values():
+        projects.extend(project for project in team_projects if project not in projects)
+    return projects
+
+
+def compute_team(projects, quarter_label, cache_jql=None, issues=None, profile_dir=None, team=None):
+    """
+    Function to compute the full metric set of one team, run in a worker process.
+
+
+    :param List projects: Project keys of the team
+    :param String quarter_label: Quarter Label used by work_outside_of_quarterly_planning
+    :param String cache_jql: JQL of the shared issue cache to read from (Default = None)
+    :param List issues: The team's issues, with their changelogs, when there is no cache (Default = None)
+    :param String profile_dir: Directory to dump a cProfile of every metric to (Default = None)
+    :param String team: Team name, selecting its working calendar (Default = None)
+    :return: Column -> value, Run report of the worker
+    :rtype: Tuple
+    """
+    global _client
+    # Workers are reused across teams, only report on this one
+    instrument.recorder.reset()
+    if _client is None:
+        _client = d.get_jira_client()
+    store = c.open_cache(cache_jql) if cache_jql else None
+    with d.configured(projects, team):
+        index, sketches = contextvars.copy_context().run(
+            instrument.run_measured, 'load_population', partial(d.load_population, _client, store, issues),
+            profile_dir)
+        tasks = d.metric_tasks(_client, quarter_label, index, sketches, store)
+        instrument.recorder.share('load_population', [instrument.task_name(function) for function in tasks.values()])
+        values = r.run_metrics(tasks, profile_dir=profile_dir)
+    return values, instrument.recorder.report()
+
+
+def compute_teams(client, teams, quarter_label, profile_dir=None, executor=None, issues=None):
+    """
+    Function to compute the metrics of every team in a process pool.
+
+    The issues of all teams are fetched once (into the shared cache, or in memory when the
+    cache is disabled), so projects shared by several teams are only downloaded once. The
+    workers' run reports are merged into instrument.recorder, metrics prefixed with the team.
+
+
+    :param jira.client.JIRA client: JIRA Client
+    :param Dict teams: Team name -> List of project keys
+    :param String quarter_label: Quarter Label used by work_outside_of_quarterly_planning
+    :param String profile_dir: Directory to dump per team cProfiles of every metric to (Default = None)
+    :param concurrent.futures.ProcessPoolExecutor executor: Pool to reuse, keeping its workers (and their
+        JIRA clients) warm (Default = None, a pool is started for this call)
+    :param List issues: Already fetched issues of every team when the cache is disabled (Default = None, fetched)
+    :return: Team name -> (Column -> value), teams whose worker failed are left out
+    :rtype: Dict
+    """
+    cache_jql, team_issues = None, dict.fromkeys(teams)
+    with d.configured(get_all_projects(teams)):
+        if config['cache_dir']:
+            cache_jql = d.standard_jql
+            store = c.open_cache(cache_jql)
+            c.sync(client, store, cache_jql, d.issue_fields)
+            c.sync_epics(client, store, e.epics_jql(e.planning_labels(quarter_label)))
+        elif issues is None:
+            issues = list(d.iter_population(client))
+    if not config['cache_dir']:
+        for name, projects in teams.items():
+            team_issues[name] = [issue for issue in issues if issue['fields']['project']['key'] in projects]
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=config['team_workers'])
+    results = {}
+    try:
+        futures = {name: executor.submit(compute_team, projects, quarter_label, cache_jql, team_issues[name],
+                                         os.path.join(profile_dir, name) if profile_dir else None, name)
+                   for name, projects in teams.items()}
+        for name, future in futures.items():
+            try:
+                results[name], report = future.result()
+            except Exception:
+                log.exception(f'Could not compute the metrics of team {name}')
+                continue
+            instrument.recorder.merge(report, prefix=f'{name}/')
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return results
@@ -0,0 +1,138 @@
+# Built In Modules
+from datetime import datetime
+import logging
+
+# Global Variables
+DEFAULT_WORKFLOW = 'default'
+log = logging.getLogger(__name__)
+
+
+def get_workflow(project, workflows):
+    """
+    Helper function to find which workflow a project follows.
+
+
+    :param String project: Project key
+    :param Dict workflows: Workflow name -> List of project keys
+    :return: Workflow name
+    :rtype: String
+    """
+    for name, projects in workflows.items():
+        if project in projects:
+            return name
+    return DEFAULT_WORKFLOW
+
+
+def resolve_definition(definition, workflow):
+    """
+    Helper function to apply a workflow's overrides to a metric definition.
+
+
+    :param Dict definition: Metric definition
+    :param String workflow: Workflow name
+    :return: Definition with the overrides applied
+    :rtype: Dict
+    """
+    overrides = definition.get('workflows', {}).get(workflow, {})
+    return {**definition, **overrides}
+
+
+def compile_condition(condition):
+    """
+    Helper function to turn a {'from': [...], 'to': [...]} condition into sets.
+
+
+    :param Dict condition: Transition condition, either side may be left out to match anything
+    :return: From statuses, To statuses (None matches any status)
+    :rtype: Tuple
+    """
+    from_statuses = set(condition['from']) if condition.get('from') else None
+    to_statuses = set(condition['to']) if condition.get('to') else None
+    if from_statuses is None and to_statuses is None:
+        raise ValueError(f'Transition condition {condition} must set "from" and/or "to"')
+    return from_statuses, to_statuses
+
+
+class StateMachine(object):
+    """
+    Every duration metric compiled into one dispatch table per (project, issue type).
+
+    A metric is defined as data::
+
+        {
+            'issue_types': ['Bug'],                  # Optional, Default = every type
+            'projects': ['ABC'],                     # Optional, Default = every project
+            'start': {'from': [...], 'to': [...]},   # Transition that starts the clock
+            'end': {'from': [...], 'to': [...]},     # Transition that stops the clock
+            'repeat': False,                         # Record every start/end pair, not one per issue
+            'workflows': {'alternate': {...}},       # Per-workflow overrides of the keys above
+        }
+
+    Within an issue the clock starts on the last start transition before the first end, and stops
+    on the last end transition (or on every end when 'repeat' is set). State never carries over
+    from one issue to the next. columnar.match_rows/pair_issues evaluate the definitions over
+    whole pages and incremental.IssueAggregates one change at a time, both with these rules.
+    """
+    def __init__(self, definitions, workflows):
+        self.names = list(definitions)
+        self.definitions = definitions
+        self.workflows = workflows
+        self.tables = {}
+
+    @property
+    def issue_types(self):
+        """
+        Every issue type at least one metric needs (None if a metric needs every type).
+        """
+        issue_types = []
+        for definition in self.definitions.values():
+            if not definition.get('issue_types'):
+                return None
+            issue_types.extend(t for t in definition['issue_types'] if t not in issue_types)
+        return issue_types
+
+    def get_table(self, project, issue_type):
+        """
+        Get (building it the first time) the dispatch table for a project and issue type.
+
+
+        :param String project: Project key
+        :param String issue_type: Issue type name
+        :return: To status -> handlers, From status -> handlers, repeating metric indexes
+        :rtype: Tuple
+        """
+        key = (project, issue_type)
+        table = self.tables.get(key)
+        if table is None:
+            workflow = get_workflow(project, self.workflows)
+            by_to, by_from, repeat = {}, {}, set()
+            for index, name in enumerate(self.names):
+                definition = resolve_definition(self.definitions[name], workflow)
+                if definition.get('issue_types') and issue_type not in definition['issue_types']:
+                    continue
+                if definition.get('projects') and project not in definition['projects']:
+                    continue
+                if definition.get('repeat'):
+                    repeat.add(index)
+                for role in ('start', 'end'):
+                    from_statuses, to_statuses = compile_condition(definition[role])
+                    if to_statuses is None:
+                        for status in from_statuses:
+                            by_from.setdefault(status, []).append((index, role, None))
+                    else:
+                        for status in to_statuses:
+                            by_to.setdefault(status, []).append((index, role, from_statuses))
+            table = self.tables[key] = (by_to, by_from, repeat)
+        return table
+
+
+def parse_time(created):
+    """
+    Helper function to parse a changelog timestamp.
+
+
+    :param String created: Timestamp as returned by JIRA
+    :return: Timezone aware timestamp
+    :rtype: datetime.datetime
+    """
+    return datetime.strptime(created, '%Y-%m-%dT%H:%M:%S.%f%z')
@@ -3,25 +3,36 @@ import datetime
 import logging
 import os
 import os.path
-
-# 3rd Party Modules
-import requests
 import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import time
 
+# Local Modules
+from Jetrics import instrument
+from Jetrics.config import config
+from Jetrics.sinks import Sink
 
 # Global Variables
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-SPREADSHEET_ID = os.environ['SPREADSHEET_ID']
 log = logging.getLogger(__name__)
+# Sheets client, built once per process by get_google_sheets
+_sheets = None
 
 
 def get_google_sheets():
     """
     Gets the Sheets client
+
+    The client is built once per process, from the discovery document shipped with the
+    client library. The Google client libraries are only imported here, runs that never
+    touch the sheet do not load them.
     """
+    global _sheets
+    if _sheets is not None:
+        return _sheets
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     creds = None
     # The file token.pickle stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
@@ -44,8 +55,39 @@ def get_google_sheets():
     service = build('sheets', 'v4', credentials=creds)
 
     # Call the Sheets API
-    sheet = service.spreadsheets()
-    return sheet
+    _sheets = service.spreadsheets()
+    return _sheets
+
+
+def get_spreadsheet_id():
+    """
+    Helper function to get the spreadsheet to sync with, resolved when it is first needed.
+
+
+    :return: config['spreadsheet_id'], or the SPREADSHEET_ID environment variable
+    :rtype: String
+    """
+    spreadsheet_id = config['spreadsheet_id'] or os.environ.get('SPREADSHEET_ID')
+    if not spreadsheet_id:
+        raise RuntimeError("No spreadsheet to sync with, set SPREADSHEET_ID (or config['spreadsheet_id'])")
+    return spreadsheet_id
+
+
+def execute(method, request):
+    """
+    Helper function to execute a Sheets API request, recording it in the run report.
+
+
+    :param String method: API method (e.g. values.get)
+    :param googleapiclient.http.HttpRequest request: Request to execute
+    :return: Response
+    :rtype: Dict
+    """
+    started = time.monotonic()
+    try:
+        return request.execute()
+    finally:
+        instrument.recorder.record_sheets_call(method, time.monotonic() - started)
 
 
 def get_values(client, x1, x2, y1, y2, sheet='Sheet1'):
@@ -62,15 +104,14 @@ def get_values(client, x1, x2, y1, y2, sheet='Sheet1'):
     :return: Values
     :rtype: List
     """
-    pass
     if sheet == 'Sheet1':
-        resp = client.values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=get_coordinates_string(x1, x2, y1, y2)).execute()
+        resp = execute('values.get', client.values().get(
+            spreadsheetId=get_spreadsheet_id(),
+            range=get_coordinates_string(x1, x2, y1, y2)))
     else:
-        resp = client.values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=get_coordinates_string(x1, x2, y1, y2, sheet=sheet)).execute()
+        resp = execute('values.get', client.values().get(
+            spreadsheetId=get_spreadsheet_id(),
+            range=get_coordinates_string(x1, x2, y1, y2, sheet=sheet)))
     return resp.get('values', [])
 
 
@@ -93,50 +134,152 @@ def get_letter_from_coordinate(x):
     Helper function to get coordinate from number
 
 
-    :param Int x: X coordinate
+    :param Int x: X coordinate (1 is column A, 27 is column AA)
     :return: Letter corresponding to number
     :rtype: String
     """
-    alpha = ['INVALID', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K',
-             'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U',
-             'V', 'W', 'X', 'Y', 'Z']
-    return alpha[x]
+    if x < 1:
+        raise IndexError(f'Invalid column number: {x}')
+    letters = ''
+    while x:
+        x, remainder = divmod(x - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
 
 
-def sync_with_upstream(values):
+def get_header_and_next_row(client, sheet='Sheet1'):
     """
-    Function to sync with upstream source.
+    Helper function to read the header row and find the next empty row with one request.
 
 
-    :param Dict values: List of values returned from downstream
+    :param googleapiclient.discovery.Resource client: Sheets client
+    :param String sheet: Which sheet to parse data from (default is Sheet1)
+    :return: Column titles, Index of the first row with an empty first column
+    :rtype: Tuple
+    """
+    resp = execute('values.batchGet', client.values().batchGet(
+        spreadsheetId=get_spreadsheet_id(),
+        ranges=[f"{sheet}!1:1", f"{sheet}!A:A"]))
+    header_range, first_column = resp['valueRanges']
+    header = header_range.get('values', [[]])[0]
+    rows = first_column.get('values', [])
+    for index, row in enumerate(rows, start=1):
+        if not row or row[0] == '':
+            return header, index
+    return header, len(rows) + 1
+
+
+def build_row(header, values, date):
+    """
+    Helper function to lay out a row of values under the sheet's column titles.
+
+
+    :param List header: Column titles (the first column holds the date)
+    :param Dict values: Column title -> value
+    :param String date: Date of the row (YEAR-MONTH-DAY)
+    :return: Row
+    :rtype: List
+    """
+    row = [date]
+    for title_of_column in header[1:]:
+        title_of_column = title_of_column.strip()
+        if title_of_column not in values:
+            log.warning(f"No value for column {title_of_column}")
+            row.append('')
+            continue
+        if values[title_of_column] is None:
+            log.warning(f"{title_of_column} is missing on {date}")
+            row.append('')
+            continue
+        if values[title_of_column] == -1:
+            log.warning(f"{title_of_column} returned -1 on {date}")
+        row.append(values[title_of_column])
+    return row
+
+
+def write_rows(rows, sheet='Sheet1', dry_run=False):
+    """
+    Function to append several dated rows of values to the sheet in one request.
+
+
+    :param List rows: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+    :param String sheet: Which sheet to write to (default is Sheet1)
+    :param Bool dry_run: Only read the sheet and return what would be written (Default = False)
+    :return: Ranges and values written (or that would be)
+    :rtype: List
     """
     # Get out Google Sheet client
     client = get_google_sheets()
 
-    # Find the next empty row
-    index = 1
-    while True:
-        if not get_values(client, 1, 1, index, index):
-            break
-        else:
-            index += 1
-
-    # Add the date to the first column
-    val = [[datetime.datetime.today().strftime('%Y-%m-%d')]]
-    client.values().append(
-        spreadsheetId=SPREADSHEET_ID,
-        range=get_coordinates_string(1, 1, index, index),
-        body={'values': val},
-        valueInputOption='USER_ENTERED').execute()
-    # Append our values to the sheet
-    for column in range(2, 15):
-        title_of_column = get_values(client, column, column, 1, 1)[0][0]
-        # Add the appropriate value
-        if values[title_of_column.strip()] == -1:
-            log.warning(f"{title_of_column.strip()} returned -1")
-        val = [[values[title_of_column.strip()]]]
-        client.values().append(
-            spreadsheetId=SPREADSHEET_ID,
-            range=get_coordinates_string(column, column, index, index),
-            body={'values': val},
-            valueInputOption='USER_ENTERED').execute()
+    # Read the column titles and find the next empty row
+    header, index = get_header_and_next_row(client, sheet=sheet)
+
+    if not rows:
+        return []
+
+    # Columns the sheet does not have yet (e.g. a new duration metric) are added after the last title
+    titles = [title.strip() for title in header]
+    new_titles = [] if titles else ['Date']
+    for _, values in rows:
+        new_titles.extend(title for title in values if title not in titles and title not in new_titles)
+    data = []
+    if new_titles:
+        data.append({'range': get_coordinates_string(len(titles) + 1, len(titles) + len(new_titles), 1, 1,
+                                                     sheet=sheet),
+                     'values': [new_titles]})
+        titles += new_titles
+        # Never write over the header row
+        index = max(index, 2)
+
+    # The date goes in the first column, our values under their column title
+    body = [build_row(titles, values, date) for date, values in rows]
+    data.append({'range': get_coordinates_string(1, len(titles), index, index + len(body) - 1, sheet=sheet),
+                 'values': body})
+
+    # Write the new titles and every row in one request
+    if not dry_run:
+        execute('values.batchUpdate', client.values().batchUpdate(
+            spreadsheetId=get_spreadsheet_id(),
+            body={'valueInputOption': 'USER_ENTERED', 'data': data}))
+    return data
+
+
+def sync_with_upstream(values, sheet='Sheet1', dry_run=False):
+    """
+    Function to sync with upstream source.
+
+
+    :param Dict values: List of values returned from downstream
+    :param String sheet: Which sheet to write to (default is Sheet1)
+    :param Bool dry_run: Only read the sheet and return what would be written (Default = False)
+    :return: Ranges and values written (or that would be)
+    :rtype: List
+    """
+    return write_rows([(datetime.datetime.today().strftime('%Y-%m-%d'), values)], sheet=sheet, dry_run=dry_run)
+
+
+class SheetsSink(Sink):
+    """
+    Appends the rows to the Google Sheet, one tab per sheet.
+    """
+    name = 'sheets'
+
+    def open(self):
+        """
+        Authenticate and build the Sheets client.
+        """
+        get_google_sheets()
+
+    def write_rows(self, rows, sheet='Sheet1', dry_run=False):
+        """
+        Append dated rows to a tab in one request, see write_rows.
+
+
+        :param List rows: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+        :param String sheet: Which sheet to write to (default is Sheet1)
+        :param Bool dry_run: Only read the sheet and return what would be written (Default = False)
+        :return: Ranges and values written (or that would be)
+        :rtype: List
+        """
+        return write_rows(rows, sheet=sheet, dry_run=dry_run)
+
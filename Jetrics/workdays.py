@@ -0,0 +1,91 @@
+# Built In Modules
+import logging
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics.columnar import parse_offset
+from Jetrics.config import config
+
+# Global Variables
+DAY_MS = 24 * 60 * 60 * 1000
+log = logging.getLogger(__name__)
+
+
+class WorkingCalendar(object):
+    """
+    Working days and hours that durations are measured in, instead of wall-clock time.
+
+    Durations are computed for whole arrays of (start, end) times at once: working days
+    between the two days come from numpy.busday_count, and the working time already gone on
+    the first day and still to come on the last day is added with a clip against the working
+    hours. Times are moved to the calendar's UTC offset first, so working hours are local.
+    """
+    def __init__(self, weekmask='Mon Tue Wed Thu Fri', holidays=(), hours=None, utc_offset='+0000'):
+        """
+        :param String weekmask: Working days, e.g. 'Mon Tue Wed Thu Fri' or '1111100' (Default = Monday to Friday)
+        :param List holidays: Days off as YEAR-MONTH-DAY (Default = none)
+        :param Tuple hours: Working hours as (start, end) hours of the day, e.g. (9, 17.5) (Default = None, whole days)
+        :param String utc_offset: Offset of the working hours, e.g. -0500 (Default = +0000)
+        """
+        self.busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=list(holidays))
+        opens, closes = hours if hours else (0, 24)
+        if not 0 <= opens < closes <= 24:
+            raise ValueError(f'Working hours must be (start, end) within a day, not {hours}')
+        self.open_ms, self.close_ms = int(opens * 60 * 60 * 1000), int(closes * 60 * 60 * 1000)
+        self.offset_ms = parse_offset(utc_offset) * 1000
+
+    @classmethod
+    def from_config(cls, team=None):
+        """
+        Get the calendar of config['calendar'], overridden by the team's config['team_calendars'] entry.
+
+
+        :param String team: Team name (Default = None, the calendar of the whole report)
+        :return: Calendar, None to measure wall-clock time
+        :rtype: WorkingCalendar
+        """
+        settings = dict(config['calendar'] or {})
+        settings.update(config['team_calendars'].get(team) or {})
+        return cls(**settings) if settings else None
+
+    @property
+    def day_seconds(self):
+        """
+        Seconds of a working day, what a duration is divided by to report it in days.
+        """
+        return (self.close_ms - self.open_ms) / 1000
+
+    def worked_into_day(self, moments, days):
+        """
+        Helper to get the working time between the start of a day and moments within it.
+
+
+        :param numpy.ndarray moments: Local epoch milliseconds
+        :param numpy.ndarray days: Day of every moment, datetime64[D]
+        :return: Working milliseconds
+        :rtype: numpy.ndarray
+        """
+        into_day = moments - days.astype(np.int64) * DAY_MS
+        worked = np.clip(into_day, self.open_ms, self.close_ms) - self.open_ms
+        return np.where(np.is_busday(days, busdaycal=self.busdaycal), worked, 0)
+
+    def seconds(self, starts, ends):
+        """
+        Function to measure the working time between starts and ends.
+
+
+        :param numpy.ndarray starts: Epoch milliseconds (UTC)
+        :param numpy.ndarray ends: Epoch milliseconds (UTC), not before the starts
+        :return: Working seconds
+        :rtype: numpy.ndarray
+        """
+        starts = np.asarray(starts, dtype=np.int64) + self.offset_ms
+        ends = np.asarray(ends, dtype=np.int64) + self.offset_ms
+        start_days = (starts // DAY_MS).astype('datetime64[D]')
+        end_days = (ends // DAY_MS).astype('datetime64[D]')
+        whole_days = np.busday_count(start_days, end_days, busdaycal=self.busdaycal)
+        worked = whole_days * (self.close_ms - self.open_ms) + self.worked_into_day(ends, end_days) - \
+            self.worked_into_day(starts, start_days)
+        return worked / 1000
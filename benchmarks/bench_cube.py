@@ -0,0 +1,70 @@
+"""
+Time the rolling window and breakdown cube (Jetrics/cube.py): load synthetic issues once, build
+the prefix sums of every dimension, then answer hundreds of windows of every length from them,
+checking a few windows against the metrics of the issues created in them.
+
+    > python benchmarks/bench_cube.py 10000 100000
+"""
+# Built In Modules
+from datetime import timedelta
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local Modules
+from benchmarks.synthetic import EPICS, PROJECTS, make_epic, make_issues
+import Jetrics.downstream as d
+from Jetrics import cube, epics
+from Jetrics.config import config
+
+# Global Variables
+WINDOWS = [1, 7, 30, 90, 365]
+CHECKED = 3
+
+
+def main(sizes):
+    """
+    Run the benchmark for every size and print one line per size and dimension.
+
+
+    :param List sizes: Number of issues to benchmark with
+    """
+    d.configure(list(PROJECTS))
+    graph = epics.EpicGraph.from_epics(make_epic(index) for index in range(EPICS))
+    print(f"{'issues':>8} {'dimension':>10} {'values':>7} {'load':>8} {'build':>8} {'windows':>8} {'per window':>11}")
+    for size in sizes:
+        issues = make_issues(size)
+        started = time.perf_counter()
+        pairs = {name: [] for name in config['duration_metrics']}
+        index, _ = d.load_population(None, issues=issues, pairs=pairs)
+        metric_cube = d.metric_cube(index, pairs, graph, config['quarter_label'])
+        load_time = time.perf_counter() - started
+        first, last = (cube.EPOCH + timedelta(days=int(day)) for day in metric_cube.days[[0, -1]])
+        ends = [first + timedelta(days=day) for day in range((last - first).days + 1)]
+        for dimension in (None,) + cube.DIMENSIONS:
+            started = time.perf_counter()
+            names, _ = metric_cube.get_table(dimension)
+            build_time = time.perf_counter() - started
+            started = time.perf_counter()
+            for end in ends:
+                for days in WINDOWS:
+                    metric_cube.sums(end - timedelta(days=days - 1), end, dimension)
+            windows_time = time.perf_counter() - started
+            windows = len(ends) * len(WINDOWS)
+            print(f'{size:>8} {dimension or "-":>10} {len(names):>7} {load_time:>7.3f}s {build_time:>7.3f}s '
+                  f'{windows:>8} {windows_time / windows * 1e6:>9.1f}us')
+        # The cube against the index of the issues created in a window
+        for end in ends[-CHECKED:]:
+            start = end - timedelta(days=29)
+            window = [issue for issue, day in zip(issues, index.get_arrays()['created'] // cube.DAY_MS)
+                      if start <= cube.EPOCH + timedelta(days=int(day)) <= end]
+            expected = d.load_population(None, issues=window)[0] if window else None
+            values = metric_cube.values(start, end)
+            assert values['Current Work In Progress'] == (expected.count(d.work_in_progress_jql) if window else 0)
+            assert values['Bugs Caught'] == (expected.count(d.bugs_caught_jql) if window else 0)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000])
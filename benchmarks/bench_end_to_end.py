@@ -0,0 +1,145 @@
+"""
+Run `jetrics sync` end to end against the local fake JIRA and Sheets server (fake_server.py) and
+report its runtime, API calls and peak memory for several population sizes.
+
+The fake server and every run get their own process: the peak RSS is the one of the run only,
+and every run starts with cold caches (issue cache, HTTP sessions).
+
+    > python benchmarks/bench_end_to_end.py 1000 10000 100000
+    > python benchmarks/bench_end_to_end.py --latency 0.05 --rate-limit 100 --cache 10000
+"""
+# Built In Modules
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss():
+    """
+    Helper function to get the peak resident set size of this process.
+
+
+    :return: Megabytes
+    :rtype: Float
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_once(url):
+    """
+    Run `jetrics sync` against the fake server and print the runtime and peak RSS as JSON, run in a child process.
+
+    The environment (JIRA_URL, SPREADSHEET_ID, JETRICS_CACHE_DIR...) is set by the parent.
+
+
+    :param String url: Base URL of the fake server
+    """
+    from google.auth.credentials import AnonymousCredentials
+    from googleapiclient.discovery import build
+    from Jetrics import cli
+    import Jetrics.upstream as u
+    from Jetrics.config import config
+
+    if os.environ.get('JETRICS_CACHE_DIR') == '':
+        config['cache_dir'] = None
+    # The Sheets client get_google_sheets would build, pointed at the fake server
+    u._sheets = build('sheets', 'v4', credentials=AnonymousCredentials(), static_discovery=True,
+                      client_options={'api_endpoint': f'{url}/'}).spreadsheets()
+    started = time.perf_counter()
+    cli.main(['sync'])
+    print(json.dumps({'seconds': time.perf_counter() - started, 'peak_rss': peak_rss()}))
+
+
+def start_fake_server(size, args):
+    """
+    Function to start the fake server in its own process.
+
+
+    :param Int size: Number of synthetic issues
+    :param argparse.Namespace args: Benchmark options
+    :return: Server process, Base URL
+    :rtype: Tuple
+    """
+    command = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_server.py'), '--issues', str(size),
+               '--latency', str(args.latency), '--rework', str(args.rework),
+               '--changelog-limit', str(args.changelog_limit)]
+    if args.rate_limit:
+        command += ['--rate-limit', str(args.rate_limit)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    port = int(server.stdout.readline())
+    return server, f'http://127.0.0.1:{port}'
+
+
+def measure(size, args):
+    """
+    Function to benchmark one population size.
+
+
+    :param Int size: Number of synthetic issues
+    :param argparse.Namespace args: Benchmark options
+    :return: Runtime, peak RSS, fake server request counts
+    :rtype: Dict
+    """
+    server, url = start_fake_server(size, args)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, JIRA_URL=url, JIRA_USER='bench', JIRA_PW='bench', SPREADSHEET_ID='bench',
+                       JETRICS_CACHE_DIR=os.path.join(directory, 'cache') if args.cache else '',
+                       JETRICS_RUN_REPORT=os.path.join(directory, 'run.json'))
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', url], env=env,
+                                    cwd=directory, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        with urlopen(f'{url}/_stats') as response:
+            result['calls'] = json.load(response)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def main():
+    """
+    Run the benchmark for every size and print one line per size.
+    """
+    if sys.argv[1:2] == ['--child']:
+        return run_once(sys.argv[2])
+    parser = argparse.ArgumentParser(description='End to end Jetrics benchmark against a fake JIRA and Sheets')
+    parser.add_argument('sizes', type=int, nargs='*', default=[1000, 10000, 100000], help='Numbers of issues')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests per second before the server answers 429 (default: no limit)')
+    parser.add_argument('--rework', type=float, default=0.15,
+                        help='Probability of an issue moving back a status at every transition (default: 0.15)')
+    parser.add_argument('--changelog-limit', type=int, default=100,
+                        help='Histories a search embeds per issue, the rest are fetched per issue (default: 100)')
+    parser.add_argument('--cache', action='store_true', help='Run with the local issue cache (cold)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results to FILE')
+    args = parser.parse_args()
+
+    print(f"{'issues':>8} {'seconds':>9} {'peak':>9} {'jira':>6} {'sheets':>7} {'429s':>6}")
+    results = {}
+    for size in args.sizes:
+        result = results[size] = measure(size, args)
+        calls = result['calls']
+        jira_calls = sum(count for endpoint, count in calls.items() if endpoint.startswith('jira.'))
+        sheets_calls = sum(count for endpoint, count in calls.items() if endpoint.startswith('sheets.'))
+        print(f"{size:>8} {result['seconds']:>8.2f}s {result['peak_rss']:>7.1f}MB {jira_calls:>6} "
+              f"{sheets_calls:>7} {calls.get('throttled', 0):>6}")
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark the local history store (Jetrics/history.py): append years of daily rows with every
+Jetrics column, then time the trend queries charts and regression checks run.
+
+    > python benchmarks/bench_history.py 1 5 20
+"""
+# Built In Modules
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 3rd Party Modules
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local Modules
+import Jetrics.downstream as d
+from Jetrics.history import HistoryStore
+
+# Global Variables
+COUNT_COLUMNS = ['Current Work In Progress', 'QE Gaps', 'Bugs Caught', 'Bug Ratio',
+                 'Work Outside of Quarterly Planning', 'Deferred Issues', 'Declined Issues']
+
+
+def make_rows(days, seed=0):
+    """
+    Function to make one row of plausible values per day.
+
+
+    :param Int days: Number of days
+    :param Int seed: Random seed
+    :return: (Date as YEAR-MONTH-DAY, Column title -> value) tuples
+    :rtype: List
+    """
+    rnd = random.Random(seed)
+    columns = COUNT_COLUMNS + d.duration_columns()
+    first = np.datetime64('2000-01-01')
+    return [(str(first + day), {column: rnd.random() * 20 for column in columns}) for day in range(days)]
+
+
+def best_of(function, repeat=5):
+    """
+    Helper function to time a function.
+
+
+    :param Function function: Function to time
+    :param Int repeat: Runs
+    :return: Fastest run in milliseconds
+    :rtype: Float
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def measure(years):
+    """
+    Function to benchmark one history length.
+
+
+    :param Int years: Years of daily rows
+    :return: Milliseconds per operation
+    :rtype: Dict
+    """
+    rows = make_rows(years * 365)
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(directory)
+        started = time.perf_counter()
+        store.append(rows)
+        results = {'append all': (time.perf_counter() - started) * 1000}
+        results['append 1 day'] = best_of(lambda: store.append(make_rows(1, seed=1)))
+
+        def read_all():
+            days, values = store.read()
+            return sum(float(np.nansum(column)) for column in values.values())
+
+        def read_column():
+            days, values = store.read(['Bug Cycle Time p85'])
+            return np.nanmean(values['Bug Cycle Time p85'])
+
+        def read_quarter():
+            days, values = store.read(['Bug Cycle Time p85'], '2000-04-01', '2000-06-30')
+            return np.nanmean(values['Bug Cycle Time p85'])
+
+        def regression_check():
+            # Last 28 days against the 28 before, on every column
+            days, values = store.read()
+            return {column: np.nanmean(series[-28:]) / np.nanmean(series[-56:-28]) for column, series in values.items()}
+
+        results['read all columns'] = best_of(read_all)
+        results['read 1 column'] = best_of(read_column)
+        results['read 1 quarter'] = best_of(read_quarter)
+        results['regression check'] = best_of(regression_check)
+    return results
+
+
+def main():
+    """
+    Run the benchmark for every history length and print one line per length.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the local history store')
+    parser.add_argument('years', type=int, nargs='*', default=[1, 5, 20], help='Years of daily rows')
+    args = parser.parse_args()
+
+    header = None
+    for years in args.years:
+        results = measure(years)
+        if header is None:
+            header = list(results)
+            print(f"{'years':>6} " + ' '.join(f'{name:>17}' for name in header) + '   (milliseconds)')
+        print(f'{years:>6} ' + ' '.join(f'{results[name]:>17.2f}' for name in header))
+
+
+if __name__ == '__main__':
+    main()
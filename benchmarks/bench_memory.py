@@ -0,0 +1,107 @@
+"""
+Compare the peak memory of computing the duration metrics from a fully materialized search
+result (every field of every issue in one list), from a list of projected issues, and with the
+streaming pipeline (projected fields, pages folded into running totals and dropped).
+
+Every measurement runs in its own process so the peak RSS of one does not hide the other.
+
+    > python benchmarks/bench_memory.py 1000 10000 100000
+"""
+# Built In Modules
+import os
+import random
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Global Variables
+MODES = ['materialized', 'projected', 'streaming']
+
+
+def add_unused_fields(issue, rnd):
+    """
+    Helper function to pad an issue with the fields an unprojected search returns.
+
+
+    :param Dict issue: Raw issue JSON
+    :param random.Random rnd: Random generator
+    :return: The issue
+    :rtype: Dict
+    """
+    fields = issue['fields']
+    fields['summary'] = f"{issue['key']} " + 'summary ' * rnd.randint(3, 12)
+    fields['description'] = 'Lorem ipsum dolor sit amet. ' * rnd.randint(5, 60)
+    fields['reporter'] = fields['assignee'] = {
+        'name': f'user{rnd.randint(0, 20)}', 'displayName': 'Some User', 'emailAddress': 'user@example.com',
+        'avatarUrls': {size: f'https://jira.example.com/avatar?size={size}' for size in ('16x16', '24x24', '48x48')}}
+    fields['comment'] = {'comments': [{'body': 'Looks good to me. ' * rnd.randint(1, 10)}
+                                      for _ in range(rnd.randint(0, 5))]}
+    for number in range(40):
+        fields[f'customfield_{10000 + number}'] = None if rnd.random() < 0.7 else f'value {number}'
+    return issue
+
+
+def peak_rss():
+    """
+    Helper function to get the peak resident set size of this process.
+
+
+    :return: Megabytes
+    :rtype: Float
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def measure(mode, size):
+    """
+    Compute the duration metrics of a synthetic population and print the peak RSS, run in a child process.
+
+
+    :param String mode: One of MODES
+    :param Int size: Number of issues
+    """
+    from benchmarks.synthetic import make_pages
+    import Jetrics.downstream as d
+
+    imported = peak_rss()
+    rnd = random.Random(1)
+    if mode == 'materialized':
+        # The old way: every page of every field kept until the whole result is processed
+        issues = [add_unused_fields(issue, rnd) for page in make_pages(size) for issue in page]
+        values = d.summarize_durations(d.duration_sketches(issues))
+    elif mode == 'projected':
+        issues = [issue for page in make_pages(size) for issue in page]
+        values = d.summarize_durations(d.duration_sketches(issues))
+    else:
+        values = d.summarize_durations(d.duration_sketches(issue for page in make_pages(size) for issue in page))
+    assert list(values) == d.duration_columns()
+    print(f'{imported:.1f} {peak_rss():.1f}')
+
+
+def main(sizes):
+    """
+    Run every mode for every size and print one line per size.
+
+
+    :param List sizes: Number of issues to benchmark with
+    """
+    print(f"{'issues':>8} {'imports':>9} " + ' '.join(f'{mode:>13}' for mode in MODES))
+    for size in sizes:
+        peaks = []
+        for mode in MODES:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, str(size)],
+                                    check=True, capture_output=True, text=True).stdout.split()
+            imported, peak = float(output[0]), float(output[1])
+            peaks.append(peak)
+        print(f'{size:>8} {imported:>7.1f}MB ' + ' '.join(f'{peak:>11.1f}MB' for peak in peaks))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        measure(sys.argv[2], int(sys.argv[3]))
+    else:
+        main([int(size) for size in sys.argv[1:]] or [1000, 10000, 100000])
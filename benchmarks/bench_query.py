@@ -0,0 +1,86 @@
+"""
+Time the local JQL evaluator (Jetrics/query.py): index the base population once, then count
+dozens of count metric queries from it, checking every count against a plain Python filter.
+
+    > python benchmarks/bench_query.py 1000 10000 100000
+"""
+# Built In Modules
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local Modules
+from benchmarks.synthetic import ISSUE_TYPES, PROJECTS, make_issues
+import Jetrics.downstream as d
+from Jetrics import query
+
+
+def make_queries():
+    """
+    Function to build count queries the way the count metrics do, once per project and issue type.
+
+
+    :return: JQL -> function telling whether a raw issue matches
+    :rtype: Dict
+    """
+    def status_changed(issue, from_status, to_status):
+        return any(item['field'] == 'status' and item['fromString'] == from_status and item['toString'] == to_status
+                   for history in issue['changelog']['histories'] for item in history['items'])
+
+    def resolution(issue):
+        return (issue['fields']['resolution'] or {}).get('name')
+
+    queries = {}
+    for project in PROJECTS:
+        def in_project(issue, project=project):
+            return issue['fields']['project']['key'] == project
+        queries.update({
+            f"{d.standard_jql} AND project = {project} AND status = 'In Progress'":
+                lambda issue, in_project=in_project: in_project(issue) and
+                issue['fields']['status']['name'] == 'In Progress',
+            f"{d.standard_jql} AND project = {project} AND status changed from Testing to 'In Progress'":
+                lambda issue, in_project=in_project: in_project(issue) and
+                status_changed(issue, 'Testing', 'In Progress'),
+            f"{d.standard_jql} AND project = {project} AND resolution = Deferred":
+                lambda issue, in_project=in_project: in_project(issue) and resolution(issue) == 'Deferred',
+        })
+        for issue_type in ISSUE_TYPES:
+            queries[f"{d.standard_jql} AND project = {project} AND type = {issue_type} and resolution is not EMPTY"] = \
+                lambda issue, in_project=in_project, issue_type=issue_type: in_project(issue) and \
+                issue['fields']['issuetype']['name'] == issue_type and resolution(issue) is not None
+    return queries
+
+
+def main(sizes):
+    """
+    Run the benchmark for every size and print one line per size.
+
+
+    :param List sizes: Number of issues to benchmark with
+    """
+    d.configure(list(PROJECTS))
+    queries = make_queries()
+    print(f"{'issues':>8} {'queries':>8} {'index':>9} {'first':>9} {'again':>9}")
+    for size in sizes:
+        issues = make_issues(size)
+        started = time.perf_counter()
+        index = query.IssueIndex(d.standard_jql)
+        for changelog in d.iter_changelogs(issues):
+            index.add(changelog)
+        index_time = time.perf_counter() - started
+        started = time.perf_counter()
+        counts = {jql: index.count(jql) for jql in queries}
+        first_time = time.perf_counter() - started
+        started = time.perf_counter()
+        for jql in queries:
+            index.count(jql)
+        again_time = time.perf_counter() - started
+        for jql, matches in queries.items():
+            assert counts[jql] == sum(map(matches, issues)), jql
+        print(f'{size:>8} {len(queries):>8} {index_time:>8.3f}s {first_time:>8.3f}s {again_time:>8.3f}s')
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,100 @@
+"""
+Record `jetrics compute` against the local fake JIRA server (fake_server.py), then replay the
+snapshot with the server stopped, and report both runtimes and the snapshot size for several
+population sizes. The replayed values must be the recorded ones.
+
+    > python benchmarks/bench_replay.py 1000 10000 100000
+    > python benchmarks/bench_replay.py --latency 0.05 10000
+"""
+# Built In Modules
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def start_fake_server(size, latency):
+    """
+    Function to start the fake server in its own process.
+
+
+    :param Int size: Number of synthetic issues
+    :param Float latency: Seconds added to every request
+    :return: Server process, Base URL
+    :rtype: Tuple
+    """
+    command = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_server.py'), '--issues', str(size),
+               '--latency', str(latency)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    port = int(server.stdout.readline())
+    return server, f'http://127.0.0.1:{port}'
+
+
+def run_compute(directory, env, *options):
+    """
+    Helper function to run `jetrics compute` in a child process.
+
+
+    :param String directory: Working directory
+    :param Dict env: Environment of the child
+    :param String options: Global command line options, e.g. --replay FILE
+    :return: Seconds, Computed values
+    :rtype: Tuple
+    """
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-m', 'Jetrics.cli', *options, 'compute'], env=env, cwd=directory,
+                            check=True, capture_output=True, text=True).stdout
+    return time.perf_counter() - started, json.loads(output)
+
+
+def measure(size, latency):
+    """
+    Function to benchmark one population size.
+
+
+    :param Int size: Number of synthetic issues
+    :param Float latency: Seconds added to every request
+    :return: Record and replay seconds, snapshot bytes
+    :rtype: Dict
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, 'run.ndjson.gz')
+        env = dict(os.environ, PYTHONPATH=ROOT, JETRICS_RUN_REPORT=os.path.join(directory, 'run.json'))
+        server, url = start_fake_server(size, latency)
+        try:
+            recorded, values = run_compute(directory, dict(env, JIRA_URL=url, JIRA_USER='bench', JIRA_PW='bench'),
+                                           '--record', snapshot)
+        finally:
+            server.terminate()
+            server.wait()
+        # No JIRA_URL and no server: any request not in the snapshot fails the run
+        replayed, replayed_values = run_compute(directory, env, '--replay', snapshot)
+        if replayed_values != values:
+            raise AssertionError(f'Replaying {size} issues computed other values')
+        return {'record': recorded, 'replay': replayed, 'bytes': os.path.getsize(snapshot)}
+
+
+def main():
+    """
+    Run the benchmark for every size and print one line per size.
+    """
+    parser = argparse.ArgumentParser(description='Record and replay Jetrics runs against a fake JIRA')
+    parser.add_argument('sizes', type=int, nargs='*', default=[1000, 10000, 100000], help='Numbers of issues')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request (default: 0)')
+    args = parser.parse_args()
+
+    print(f"{'issues':>8} {'record':>9} {'replay':>9} {'snapshot':>10}")
+    for size in args.sizes:
+        result = measure(size, args.latency)
+        print(f"{size:>8} {result['record']:>8.2f}s {result['replay']:>8.2f}s "
+              f"{result['bytes'] / (1024 * 1024):>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Check the startup budget of the jetrics command line with `python -X importtime`.
+
+Every scenario runs `python -m Jetrics.cli ...` in a fresh interpreter (`compute` against the
+local fake JIRA server, without SPREADSHEET_ID or Google credentials) and reports its wall
+time and the time spent importing modules after the interpreter's own startup (site). A
+scenario fails when its imports go over budget or it loads a module it must not need, and
+the script exits with 1 so it can run in CI.
+
+    > python benchmarks/bench_startup.py
+    > python benchmarks/bench_startup.py --budget help=30 --budget compute=400 --repeat 5
+"""
+# Built In Modules
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scenario -> (Command line arguments, Import budget in milliseconds, Modules it must not import)
+SCENARIOS = {
+    'help': (['--help'], 40, ('jira', 'requests', 'numpy', 'googleapiclient', 'google_auth_oauthlib')),
+    'compute': (['compute'], 450, ('googleapiclient', 'google_auth_oauthlib', 'httplib2')),
+}
+
+
+def parse_importtime(stderr):
+    """
+    Function to read the output of -X importtime.
+
+
+    :param String stderr: Standard error of the run
+    :return: Top level module -> cumulative microseconds (imported after site), every module imported
+    :rtype: Tuple
+    """
+    top_level, modules, after_site = {}, set(), False
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        module = name.strip()
+        modules.add(module)
+        if len(name) - len(name.lstrip()) == 1:
+            if after_site:
+                top_level[module] = top_level.get(module, 0) + int(cumulative)
+            after_site = after_site or module == 'site'
+    return top_level, modules
+
+
+def run_scenario(arguments, env, cwd):
+    """
+    Function to run the command line once.
+
+
+    :param List arguments: Command line arguments
+    :param Dict env: Environment
+    :param String cwd: Working directory
+    :return: Wall seconds, Top level module -> cumulative microseconds, every module imported
+    :rtype: Tuple
+    """
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'Jetrics.cli'] + arguments, env=env,
+                             cwd=cwd, capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    if process.returncode:
+        raise RuntimeError(f'jetrics {" ".join(arguments)} failed:\n{process.stderr[-2000:]}')
+    return (seconds,) + parse_importtime(process.stderr)
+
+
+def start_fake_server(issues):
+    """
+    Function to start the fake JIRA server in its own process.
+
+
+    :param Int issues: Number of synthetic issues
+    :return: Server process, Base URL
+    :rtype: Tuple
+    """
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_server.py'),
+                               '--issues', str(issues)], stdout=subprocess.PIPE, text=True)
+    return server, f'http://127.0.0.1:{int(server.stdout.readline())}'
+
+
+def main():
+    """
+    Run every scenario and print its startup costs, exiting with 1 if any is over budget.
+    """
+    parser = argparse.ArgumentParser(description='Check the startup budget of the jetrics command line')
+    defaults = ', '.join(f'{name}={budget}' for name, (_, budget, _) in SCENARIOS.items())
+    parser.add_argument('--budget', action='append', default=[], metavar='SCENARIO=MS',
+                        help=f'Import budget of a scenario in milliseconds (defaults: {defaults})')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario, the fastest counts (default: 3)')
+    parser.add_argument('--issues', type=int, default=50, help='Synthetic issues behind compute (default: 50)')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest imports to list per scenario (default: 5)')
+    args = parser.parse_args()
+    budgets = {name: budget for name, (_, budget, _) in SCENARIOS.items()}
+    budgets.update({name: float(budget) for name, budget in (entry.split('=') for entry in args.budget)})
+
+    server, url = start_fake_server(args.issues)
+    failed = False
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, JIRA_URL=url, JIRA_USER='bench', JIRA_PW='bench', JETRICS_CACHE_DIR='',
+                       JETRICS_RUN_REPORT=os.path.join(directory, 'run.json'),
+                       PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+            env.pop('SPREADSHEET_ID', None)
+            for name, (arguments, _, forbidden) in SCENARIOS.items():
+                runs = [run_scenario(arguments, env, directory) for _ in range(args.repeat)]
+                seconds, top_level, modules = min(runs, key=lambda run: sum(run[1].values()))
+                imports = sum(top_level.values()) / 1000
+                loaded = sorted(module for module in forbidden if module in modules)
+                over = imports > budgets[name]
+                failed = failed or over or bool(loaded)
+                print(f"{name:<8} wall {min(run[0] for run in runs) * 1000:>7.1f}ms  imports {imports:>7.1f}ms "
+                      f"(budget {budgets[name]:g}ms){'  OVER BUDGET' if over else ''}")
+                for module, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+                    print(f'    {cumulative / 1000:>7.1f}ms  {module}')
+                if loaded:
+                    print(f"    must not import: {', '.join(loaded)}")
+    finally:
+        server.terminate()
+        server.wait()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
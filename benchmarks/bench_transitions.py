@@ -0,0 +1,115 @@
+"""
+Compare a per-transition Python loop over the transitions.StateMachine dispatch tables with
+the vectorized columnar evaluation of the duration metrics.
+
+    > python benchmarks/bench_transitions.py 1000 10000 100000
+"""
+# Built In Modules
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local Modules
+from benchmarks.synthetic import make_issues
+from Jetrics import columnar, transitions
+from Jetrics.config import config
+
+
+def record(durations, start_time, end_time):
+    """
+    Helper function to record a start/end pair, ignoring pairs that do not move forward in time.
+
+
+    :param List durations: Durations in seconds
+    :param datetime.datetime start_time: When the clock started
+    :param datetime.datetime end_time: When the clock stopped
+    """
+    if start_time < end_time:
+        durations.append((end_time - start_time).total_seconds())
+
+
+def loop_durations(machine, issues):
+    """
+    Evaluate every metric with one Python step per transition, the reference the columnar pairs must match.
+
+
+    :param transitions.StateMachine machine: Compiled metric definitions
+    :param Iterable issues: Raw issue JSON with the changelog expanded
+    :return: Metric name -> List of durations in seconds
+    :rtype: Dict
+    """
+    durations = [[] for _ in machine.names]
+    for issue in issues:
+        fields = issue['fields']
+        by_to, by_from, repeat = machine.get_table(fields['project']['key'], fields['issuetype']['name'])
+        if not by_to and not by_from:
+            continue
+        starts, ends = {}, {}
+        for history in issue['changelog']['histories']:
+            created = None
+            for item in history['items']:
+                if item['field'] != 'status':
+                    continue
+                from_status, to_status = item['fromString'], item['toString']
+                handlers = by_to.get(to_status, []) + by_from.get(from_status, [])
+                if not handlers:
+                    continue
+                if created is None:
+                    created = transitions.parse_time(history['created'])
+                matched = {'start': set(), 'end': set()}
+                for index, role, from_statuses in handlers:
+                    if from_statuses is None or from_status in from_statuses:
+                        matched[role].add(index)
+                # A transition matching both conditions starts the clock unless it already stopped
+                started = {index for index in matched['start'] if index not in ends}
+                for index in started:
+                    starts[index] = created
+                for index in matched['end'] - started:
+                    if index in starts:
+                        ends[index] = created
+                        if index in repeat:
+                            record(durations[index], starts.pop(index), ends.pop(index))
+        for index, end_time in ends.items():
+            record(durations[index], starts[index], end_time)
+    return dict(zip(machine.names, durations))
+
+
+def timed(function, *args):
+    """
+    Helper function to run a function and time it.
+
+
+    :param Function function: Function to run
+    :return: Seconds taken, Result
+    :rtype: Tuple
+    """
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def main(sizes):
+    """
+    Run the benchmark for every size and print one line per size.
+
+
+    :param List sizes: Number of issues to benchmark with
+    """
+    definitions, workflows = config['duration_metrics'], config['workflows']
+    print(f"{'issues':>8} {'transitions':>12} {'loop':>9} {'flatten':>9} {'vectorized':>11} {'speedup':>8}")
+    for size in sizes:
+        issues = make_issues(size)
+        loop_time, loop = timed(loop_durations, transitions.StateMachine(definitions, workflows), issues)
+        flatten_time, changelog = timed(columnar.Changelog.from_issues, issues)
+        vector_time, vectorized = timed(lambda: columnar.pair_rows(changelog, columnar.match_rows(
+            changelog, definitions, workflows)))
+        for name in definitions:
+            assert sorted(loop[name]) == sorted(vectorized[name].tolist()), name
+        print(f'{size:>8} {len(changelog):>12} {loop_time:>8.3f}s {flatten_time:>8.3f}s {vector_time:>10.3f}s '
+              f'{loop_time / (flatten_time + vector_time):>7.1f}x')
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1000, 10000, 100000])
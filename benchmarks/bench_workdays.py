@@ -0,0 +1,68 @@
+"""
+Time measuring durations in working time (Jetrics/workdays.py): random intervals of up to a
+quarter, over weekends, holidays and working hours, checking a sample against a day by day loop.
+
+    > python benchmarks/bench_workdays.py 100000 300000 1000000
+"""
+# Built In Modules
+from datetime import date, timedelta
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics.workdays import DAY_MS, WorkingCalendar
+
+# Global Variables
+HOLIDAYS = ['2019-12-25', '2019-12-26', '2020-01-01', '2020-04-10', '2020-05-25']
+HOURS = (9, 17.5)
+SAMPLE = 1000
+
+
+def day_by_day(start, end):
+    """
+    Reference: add the working hours of every day between start and end in plain Python.
+
+
+    :param Int start: Epoch milliseconds
+    :param Int end: Epoch milliseconds
+    :return: Working seconds
+    :rtype: Float
+    """
+    worked = 0
+    for day in range(start // DAY_MS, end // DAY_MS + 1):
+        today = date(1970, 1, 1) + timedelta(days=day)
+        if today.weekday() < 5 and today.isoformat() not in HOLIDAYS:
+            opens, closes = day * DAY_MS + int(HOURS[0] * 3600000), day * DAY_MS + int(HOURS[1] * 3600000)
+            worked += max(0, min(end, closes) - max(start, opens))
+    return worked / 1000
+
+
+def main(sizes):
+    """
+    Run the benchmark for every size and print one line per size.
+
+
+    :param List sizes: Number of intervals to benchmark with
+    """
+    calendar = WorkingCalendar(holidays=HOLIDAYS, hours=HOURS)
+    rng = np.random.default_rng(0)
+    print(f"{'intervals':>10} {'seconds':>9} {'per sec':>12}")
+    for size in sizes:
+        starts = rng.integers(1_546_300_800_000, 1_609_459_200_000, size)
+        ends = starts + rng.integers(0, 90 * DAY_MS, size)
+        started = time.perf_counter()
+        worked = calendar.seconds(starts, ends)
+        took = time.perf_counter() - started
+        for row in range(min(size, SAMPLE)):
+            assert np.isclose(worked[row], day_by_day(int(starts[row]), int(ends[row]))), row
+        print(f'{size:>10} {took:>8.3f}s {size / took:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [100000, 300000, 1000000])
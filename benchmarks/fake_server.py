@@ -0,0 +1,387 @@
+"""
+Local stand-in for the JIRA and Google Sheets APIs Jetrics talks to, backed by synthetic issues.
+
+JIRA: serverInfo, search (startAt/maxResults paging, fields projection, expand=changelog with
+the changelog cut at --changelog-limit histories like JIRA does) and the paginated issue
+changelog. Sheets: values get/update/batchGet/batchUpdate over an in-memory grid. GET /_stats
+returns the requests served per endpoint.
+
+The JQL is not evaluated: every search matches the whole synthetic population, which is
+enough to exercise the paging, the transfer and the metric computations at scale. Searches
+for `type = Epic` match the synthetic epics instead.
+
+    > python benchmarks/fake_server.py --issues 10000 --latency 0.05 --rate-limit 50
+"""
+# Built In Modules
+import argparse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local Modules
+from benchmarks.synthetic import EPICS, make_epic, make_issue_at
+
+# Global Variables
+ISSUE_CHANGELOG = re.compile(r'^/rest/api/2/issue/([^/]+)/changelog$')
+EPIC_SEARCH = re.compile(r'type\s*=\s*epic\b', re.IGNORECASE)
+SHEETS_VALUES = re.compile(r'^/v4/spreadsheets/([^/]+)/values(?::(batchGet|batchUpdate)|/(.+))$')
+A1_RANGE = re.compile(r'^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$')
+
+
+def column_number(letters):
+    """
+    Helper function to turn column letters into a 1 based column number.
+
+
+    :param String letters: Column letters (e.g. AB)
+    :return: Column number
+    :rtype: Int
+    """
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def parse_range(a1, default_sheet='Sheet1'):
+    """
+    Helper function to parse an A1 range (e.g. Sheet1!A2:C4, Sheet1!1:1, A:A).
+
+
+    :param String a1: Range
+    :param String default_sheet: Sheet when the range does not name one
+    :return: Sheet, first column, last column, first row, last row (None when open ended)
+    :rtype: Tuple
+    """
+    sheet, _, cells = a1.rpartition('!')
+    match = A1_RANGE.match(cells)
+    if not match:
+        raise ValueError(f'Unsupported range {a1}')
+    first_column, first_row, last_column, last_row = match.groups()
+    if last_column is None and last_row is None:
+        last_column, last_row = first_column, first_row
+    return (sheet.strip("'") or default_sheet,
+            column_number(first_column) if first_column else 1, column_number(last_column) if last_column else None,
+            int(first_row) if first_row else 1, int(last_row) if last_row else None)
+
+
+class TokenBucket(object):
+    """
+    Requests per second limit, with bursts of up to one second worth of requests.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Take a token if one is available.
+
+
+        :return: Seconds until a token is available (0 if one was taken)
+        :rtype: Float
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class FakeBackend(object):
+    """
+    State of the fake services: the synthetic population, the sheets and the request counters.
+    """
+    def __init__(self, issues, seed=0, latency=0.0, rate_limit=None, page_limit=100, changelog_limit=100,
+                 **issue_options):
+        self.issues = issues
+        self.seed = seed
+        self.latency = latency
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.page_limit = page_limit
+        self.changelog_limit = changelog_limit
+        self.issue_options = issue_options
+        self.sheets = {}
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def count(self, endpoint):
+        """
+        Count one request to an endpoint.
+
+
+        :param String endpoint: Endpoint name
+        """
+        with self.lock:
+            self.stats[endpoint] += 1
+
+    def issue(self, index):
+        """
+        Build one synthetic issue.
+
+
+        :param Int index: Issue number
+        :return: Raw issue JSON with its full changelog
+        :rtype: Dict
+        """
+        return make_issue_at(index, self.seed, **self.issue_options)
+
+    def search(self, query):
+        """
+        Answer /rest/api/2/search.
+
+
+        :param Dict query: Query parameters (lists of values)
+        :return: Search result
+        :rtype: Dict
+        """
+        start_at = int(query.get('startAt', ['0'])[0])
+        max_results = min(int(query.get('maxResults', ['50'])[0]), self.page_limit)
+        fields = query.get('fields', [''])[0].split(',') if query.get('fields', [''])[0] else None
+        expand = query.get('expand', [''])[0].split(',')
+        epics = bool(EPIC_SEARCH.search(query.get('jql', [''])[0]))
+        total = EPICS if epics else self.issues
+        issues = []
+        for index in range(start_at, min(start_at + max_results, total)):
+            issue = make_epic(index) if epics else self.issue(index)
+            if fields and '*all' not in fields:
+                issue['fields'] = {name: value for name, value in issue['fields'].items() if name in fields}
+            if 'changelog' in expand:
+                histories = issue['changelog']['histories']
+                issue['changelog'] = {'startAt': 0, 'maxResults': min(len(histories), self.changelog_limit),
+                                      'total': len(histories), 'histories': histories[:self.changelog_limit]}
+            else:
+                del issue['changelog']
+            issues.append(issue)
+        return {'startAt': start_at, 'maxResults': max_results, 'total': total, 'issues': issues}
+
+    def changelog(self, key, query):
+        """
+        Answer /rest/api/2/issue/{key}/changelog.
+
+
+        :param String key: Issue key or id
+        :param Dict query: Query parameters (lists of values)
+        :return: Changelog page, None if there is no such issue
+        :rtype: Dict
+        """
+        index = int(key.rsplit('-', 1)[-1]) if '-' in key else int(key) - 10000
+        if not 0 <= index < self.issues:
+            return None
+        histories = self.issue(index)['changelog']['histories']
+        start_at = int(query.get('startAt', ['0'])[0])
+        max_results = min(int(query.get('maxResults', ['100'])[0]), self.changelog_limit)
+        values = histories[start_at:start_at + max_results]
+        return {'startAt': start_at, 'maxResults': max_results, 'total': len(histories),
+                'isLast': start_at + len(values) >= len(histories), 'values': values}
+
+    def get_values(self, a1):
+        """
+        Read a range of a sheet.
+
+
+        :param String a1: Range
+        :return: ValueRange
+        :rtype: Dict
+        """
+        sheet, first_column, last_column, first_row, last_row = parse_range(a1)
+        rows = self.sheets.get(sheet, [])
+        values = []
+        for row in rows[first_row - 1:last_row]:
+            values.append(row[first_column - 1:last_column])
+        # Like Sheets, drop trailing empty cells and rows
+        for row in values:
+            while row and row[-1] == '':
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return {'range': a1, 'majorDimension': 'ROWS', 'values': values} if values else {'range': a1}
+
+    def update_values(self, a1, values):
+        """
+        Write a block of values to a sheet.
+
+
+        :param String a1: Range (its top left cell is where the block goes)
+        :param List values: Rows of values
+        :return: Number of updated cells
+        :rtype: Int
+        """
+        sheet, first_column, _, first_row, _ = parse_range(a1)
+        rows = self.sheets.setdefault(sheet, [])
+        for offset, row in enumerate(values):
+            while len(rows) < first_row + offset:
+                rows.append([])
+            target = rows[first_row - 1 + offset]
+            while len(target) < first_column - 1 + len(row):
+                target.append('')
+            target[first_column - 1:first_column - 1 + len(row)] = ['' if cell is None else str(cell) for cell in row]
+        return sum(len(row) for row in values)
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """
+    Routes the JIRA and Sheets endpoints to the server's FakeBackend.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, body, status=200, headers=None):
+        """
+        Send a JSON response.
+
+
+        :param Dict body: Response body
+        :param Int status: HTTP status
+        :param Dict headers: Extra headers
+        """
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        """
+        Read a JSON request body.
+
+
+        :return: Request body
+        :rtype: Dict
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def handle_request(self, method):
+        """
+        Answer a request, after the configured latency and rate limit.
+
+
+        :param String method: HTTP method
+        """
+        backend = self.server.backend
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        if path == '/_stats':
+            with backend.lock:
+                return self.send_json(dict(backend.stats))
+        body = self.read_json() if method in ('POST', 'PUT') else None
+        if backend.latency:
+            time.sleep(backend.latency)
+        if backend.bucket:
+            wait = backend.bucket.take()
+            if wait:
+                backend.count('throttled')
+                return self.send_json({'errorMessages': ['Rate limit exceeded']}, 429,
+                                      {'Retry-After': f'{wait:.3f}'})
+        if path == '/rest/api/2/serverInfo':
+            backend.count('jira.serverInfo')
+            return self.send_json({'baseUrl': f'http://{self.headers["Host"]}', 'version': '8.5.0',
+                                   'versionNumbers': [8, 5, 0], 'deploymentType': 'Server',
+                                   'serverTitle': 'Fake JIRA'})
+        if path == '/rest/api/2/search':
+            backend.count('jira.search')
+            return self.send_json(backend.search(query))
+        match = ISSUE_CHANGELOG.match(path)
+        if match:
+            backend.count('jira.changelog')
+            result = backend.changelog(match.group(1), query)
+            if result is None:
+                return self.send_json({'errorMessages': ['Issue Does Not Exist']}, 404)
+            return self.send_json(result)
+        match = SHEETS_VALUES.match(path)
+        if match:
+            action, a1 = match.group(2), unquote(match.group(3) or '')
+            backend.count(f'sheets.{action or ("get" if method == "GET" else "update")}')
+            with backend.lock:
+                if action == 'batchGet':
+                    return self.send_json({'spreadsheetId': match.group(1),
+                                           'valueRanges': [backend.get_values(a1) for a1 in query.get('ranges', [])]})
+                if action == 'batchUpdate':
+                    cells = sum(backend.update_values(data['range'], data['values']) for data in body['data'])
+                    return self.send_json({'spreadsheetId': match.group(1), 'totalUpdatedCells': cells})
+                if method == 'GET':
+                    return self.send_json(backend.get_values(a1))
+                return self.send_json({'updatedRange': a1, 'updatedCells': backend.update_values(a1, body['values'])})
+        backend.count('not_found')
+        self.send_json({'errorMessages': [f'No fake for {method} {path}']}, 404)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+
+def start_server(backend, port=0):
+    """
+    Function to serve a FakeBackend from a background thread.
+
+
+    :param FakeBackend backend: Backend to serve
+    :param Int port: Port to listen on (Default = 0, any free port)
+    :return: Server (server.server_port is the port)
+    :rtype: http.server.ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeHandler)
+    server.daemon_threads = True
+    server.backend = backend
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """
+    Run the fake server until interrupted, printing its port first.
+    """
+    parser = argparse.ArgumentParser(description='Fake JIRA and Sheets APIs backed by synthetic issues')
+    parser.add_argument('--issues', type=int, default=1000, help='Number of synthetic issues (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--port', type=int, default=0, help='Port to listen on (default: any free port)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests per second before answering 429 (default: no limit)')
+    parser.add_argument('--page-limit', type=int, default=100, help='Largest search page served (default: 100)')
+    parser.add_argument('--changelog-limit', type=int, default=100,
+                        help='Histories embedded in a search result or changelog page (default: 100)')
+    parser.add_argument('--rework', type=float, default=0.15,
+                        help='Probability of an issue moving back a status at every transition (default: 0.15)')
+    parser.add_argument('--other-items', type=float, default=0.3,
+                        help='Probability of a history also changing a non status field (default: 0.3)')
+    args = parser.parse_args()
+
+    backend = FakeBackend(args.issues, seed=args.seed, latency=args.latency, rate_limit=args.rate_limit,
+                          page_limit=args.page_limit, changelog_limit=args.changelog_limit,
+                          rework=args.rework, other_items=args.other_items)
+    server = start_server(backend, args.port)
+    print(server.server_port, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
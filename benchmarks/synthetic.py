@@ -0,0 +1,173 @@
+"""
+Synthetic JIRA issues for the benchmarks.
+
+Issues walk a workflow picked from WORKFLOWS, with random detours (rework loops) so that
+changelogs look like the ones our projects produce.
+"""
+# Built In Modules
+from datetime import datetime, timedelta
+import random
+
+# Global Variables
+WORKFLOWS = {
+    # Default workflow with a QE team
+    'default': ['Open', 'In Progress', 'Code Review', 'Merged', 'Testing', 'Verified',
+                'Release Pending', 'Closed'],
+    # Resolved based workflow without QE
+    'alternate': ['Open', 'In Progress', 'Code Review', 'Testing', 'Release Pending', 'Resolved'],
+}
+PROJECTS = {'DEMO': 'default', 'OTHER': 'default', 'FACTORY': 'alternate', 'NOS': 'alternate'}
+ISSUE_TYPES = ['Bug', 'Story', 'Task']
+OFFSETS = ['+0000', '-0500', '+0530']
+RESOLUTIONS = ['Done', 'Done', 'Done', 'Deferred', "Won't Fix"]
+# Epics issues are filed under (EPIC-0 to EPIC-<EPICS - 1>), labelled with one quarter each
+EPICS = 20
+QUARTERS = ['Y19-Q3', 'Y19-Q4', 'Y20-Q1', 'Y20-Q2']
+EPIC_LINK_FIELD = 'customfield_10008'
+# Breakdown dimensions, picked from the issue number so they do not change the random issues
+ASSIGNEES = 25
+PRIORITIES = ['Highest', 'High', 'Medium', 'Low']
+COMPONENTS = ['API', 'UI', 'Docs']
+
+
+def format_time(moment, offset):
+    """
+    Helper function to format a UTC datetime the way JIRA does in a given offset.
+
+
+    :param datetime.datetime moment: UTC time
+    :param String offset: Offset such as +0530
+    :return: JIRA timestamp
+    :rtype: String
+    """
+    sign = -1 if offset[0] == '-' else 1
+    local = moment + sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+    return local.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + offset
+
+
+def make_issue(index, rnd, start=datetime(2019, 6, 2), rework=0.15, other_items=0.3):
+    """
+    Function to build one raw issue (search JSON with changelog expanded).
+
+
+    :param Int index: Issue number
+    :param random.Random rnd: Random generator
+    :param datetime.datetime start: Earliest creation date
+    :param Float rework: Probability of moving back a step at every transition
+    :param Float other_items: Probability of a history also changing a non status field
+    :return: Raw issue JSON
+    :rtype: Dict
+    """
+    project = rnd.choice(list(PROJECTS))
+    steps = WORKFLOWS[PROJECTS[project]]
+    offset = rnd.choice(OFFSETS)
+    moment = start + timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+    created = moment
+    position, histories, resolution = 0, [], None
+    target = rnd.randint(0, len(steps) - 1)
+    while position < target:
+        moment += timedelta(minutes=rnd.randint(5, 60 * 24 * 4))
+        if position > 1 and rnd.random() < rework:
+            new_position = position - 1
+        else:
+            new_position = position + 1
+        items = []
+        if rnd.random() < other_items:
+            items.append({'field': 'assignee', 'fromString': None, 'toString': f'user{rnd.randint(0, 20)}'})
+        items.append({'field': 'status', 'fromString': steps[position], 'toString': steps[new_position]})
+        if new_position == len(steps) - 1:
+            resolution = rnd.choice(RESOLUTIONS)
+            items.append({'field': 'resolution', 'fromString': None, 'toString': resolution})
+        histories.append({'id': str(len(histories)), 'created': format_time(moment, offset), 'items': items})
+        position = new_position
+    issue_type = rnd.choice(ISSUE_TYPES)
+    return {
+        'id': str(10000 + index),
+        'key': f'{project}-{index}',
+        'fields': {
+            'project': {'key': project, 'projectCategory': {'name': rnd.choice(['Product Pipeline', 'Other'])}},
+            'issuetype': {'name': issue_type},
+            'status': {'name': steps[position]},
+            'resolution': {'name': resolution} if resolution else None,
+            'created': format_time(created, offset),
+            'updated': format_time(moment, offset),
+            'labels': [],
+            # Every fifth issue is under no epic
+            EPIC_LINK_FIELD: f'EPIC-{index % EPICS}' if index % 5 else None,
+            # Every seventh issue is unassigned, every eighth has no component
+            'assignee': {'name': f'user{index % ASSIGNEES}', 'displayName': f'User {index % ASSIGNEES}'}
+            if index % 7 else None,
+            'priority': {'name': PRIORITIES[index % len(PRIORITIES)]},
+            'components': [{'name': name} for bit, name in enumerate(COMPONENTS) if index >> bit & 1],
+        },
+        'changelog': {'startAt': 0, 'maxResults': len(histories), 'total': len(histories),
+                      'histories': histories},
+    }
+
+
+def make_epic(index):
+    """
+    Function to build one raw epic (search JSON, without changelog).
+
+
+    :param Int index: Epic number
+    :return: Raw issue JSON
+    :rtype: Dict
+    """
+    return {
+        'id': str(1000000 + index),
+        'key': f'EPIC-{index}',
+        'fields': {
+            'project': {'key': 'EPIC', 'projectCategory': None},
+            'issuetype': {'name': 'Epic'},
+            'status': {'name': 'Open'},
+            'resolution': None,
+            'created': '2019-06-01T00:00:00.000+0000',
+            'updated': '2019-06-01T00:00:00.000+0000',
+            'labels': [QUARTERS[index % len(QUARTERS)]],
+        },
+        'changelog': {'startAt': 0, 'maxResults': 0, 'total': 0, 'histories': []},
+    }
+
+
+def make_issues(count, seed=0, **kwargs):
+    """
+    Function to build a list of raw issues.
+
+
+    :param Int count: Number of issues
+    :param Int seed: Random seed
+    :return: Raw issue JSON
+    :rtype: List
+    """
+    rnd = random.Random(seed)
+    return [make_issue(index, rnd, **kwargs) for index in range(count)]
+
+
+def make_pages(count, page_size=100, seed=0, **kwargs):
+    """
+    Function to build raw issues lazily, one search page at a time, like JIRA returns them.
+
+
+    :param Int count: Number of issues
+    :param Int page_size: Issues per page
+    :param Int seed: Random seed
+    :return: Generator of pages (lists of raw issue JSON)
+    :rtype: Generator
+    """
+    rnd = random.Random(seed)
+    for start_at in range(0, count, page_size):
+        yield [make_issue(index, rnd, **kwargs) for index in range(start_at, min(start_at + page_size, count))]
+
+
+def make_issue_at(index, seed=0, **kwargs):
+    """
+    Function to build the issue at a given position on its own, without building the ones before it.
+
+
+    :param Int index: Issue number
+    :param Int seed: Random seed
+    :return: Raw issue JSON
+    :rtype: Dict
+    """
+    return make_issue(index, random.Random(seed * 1000003 + index), **kwargs)
@@ -20,7 +20,9 @@ setup(
     zip_safe=False,
     entry_points={
         'console_scripts': [
-            "jetrics=Jetrics.main:main",
+            "jetrics=Jetrics.cli:main",
+            "jetrics-backfill=Jetrics.backfill:main",
+            "jetrics-service=Jetrics.service:main",
         ],
     },
 )
\ No newline at end of file
@@ -0,0 +1,85 @@
+# Built In Modules
+from datetime import datetime, timezone
+
+# 3rd Party Modules
+import jira
+import pytest
+
+# Local Modules
+from benchmarks.fake_server import start_server
+from Jetrics import fetch
+
+
+def epoch_ms(*date):
+    """
+    Helper function to get the epoch milliseconds of a UTC date.
+    """
+    return int(datetime(*date, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def jira_time(*date):
+    """
+    Helper function to get the JIRA timestamp of a UTC date.
+    """
+    return datetime(*date).strftime('%Y-%m-%dT%H:%M:%S.000+0000')
+
+
+def make_issue(key, issue_type='Story', changes=(), status=None, resolution=None, created=(2020, 1, 1, 8),
+               category=None, components=()):
+    """
+    Helper function to build the raw JSON of an issue, with its status changes as (date, from, to).
+
+    The issue id is the number of its key and history ids follow it (1001, 1002... for DEMO-1).
+    The status is the one the last change went to unless given, and a resolution is set by the
+    last change when there is one.
+    """
+    project, number = key.rsplit('-', 1)
+    histories = [{'id': str(int(number) * 1000 + position), 'created': jira_time(*date),
+                  'items': [{'field': 'status', 'fromString': from_status, 'toString': to_status}]}
+                 for position, (date, from_status, to_status) in enumerate(changes, 1)]
+    if resolution and histories:
+        histories[-1]['items'].append({'field': 'resolution', 'fromString': None, 'toString': resolution})
+    project_json = {'key': project}
+    if category:
+        project_json['projectCategory'] = {'name': category}
+    return {
+        'id': number,
+        'key': key,
+        'fields': {
+            'project': project_json,
+            'issuetype': {'name': issue_type},
+            'status': {'name': status or (changes[-1][2] if changes else 'Open')},
+            'resolution': {'name': resolution} if resolution else None,
+            'created': jira_time(*created),
+            'updated': histories[-1]['created'] if histories else jira_time(*created),
+            'components': [{'name': component} for component in components],
+        },
+        'changelog': {'histories': histories},
+    }
+
+
+def make_client(url):
+    """
+    Helper function to create a JIRA client the fetcher knows the settings of.
+    """
+    client = jira.client.JIRA(options={'server': url}, get_server_info=False)
+    fetch.register_client(client, url, ('user', 'secret'))
+    return client
+
+
+@pytest.fixture
+def serve():
+    """
+    Start fake JIRA servers (see benchmarks/fake_server.py), returning a registered client of each.
+    """
+    servers = []
+
+    def start(backend):
+        server = start_server(backend)
+        servers.append(server)
+        return make_client(f'http://127.0.0.1:{server.server_port}')
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,74 @@
+# Built In Modules
+from datetime import date
+
+# 3rd Party Modules
+import numpy as np
+
+# Local Modules
+from Jetrics import backfill
+from Jetrics.columnar import Changelog
+from tests.conftest import epoch_ms, make_issue
+
+# Global Variables
+OPEN, IN_PROGRESS, TESTING, CLOSED = range(4)
+ISSUES = [
+    make_issue('DEMO-1', 'Story', [((2020, 1, 2, 10), 'Open', 'In Progress'),
+                                   ((2020, 1, 3, 10), 'In Progress', 'Code Review'),
+                                   ((2020, 1, 4, 10), 'Code Review', 'Closed')], resolution='Done'),
+    make_issue('DEMO-2', 'Bug', [((2020, 1, 2, 12), 'Open', 'In Progress'),
+                                 ((2020, 1, 5, 12), 'In Progress', 'Testing'),
+                                 ((2020, 1, 6, 12), 'Testing', 'In Progress')]),
+    make_issue('DEMO-3', 'Bug', [((2020, 1, 5, 10), 'Open', 'Closed')], resolution="Won't Fix",
+               created=(2020, 1, 5, 8)),
+]
+
+
+def replay(timestamp):
+    """
+    Helper function to get the state of three issues at a time of January 2nd 2020: the first
+    moves to In Progress at 10:00 then to Closed at 14:00, the second to Testing at 12:00 and
+    the third never changes.
+    """
+    return list(backfill.state_at(3, np.array([0, 1, 0]), np.array([OPEN, OPEN, IN_PROGRESS]),
+                                  np.array([IN_PROGRESS, TESTING, CLOSED]),
+                                  np.array([epoch_ms(2020, 1, 2, 10), epoch_ms(2020, 1, 2, 12),
+                                            epoch_ms(2020, 1, 2, 14)]),
+                                  np.array([CLOSED, TESTING, TESTING]), timestamp))
+
+
+def test_state_at():
+    # Before their first change issues hold its 'from' value
+    assert replay(epoch_ms(2020, 1, 2, 9)) == [OPEN, OPEN, TESTING]
+    assert replay(epoch_ms(2020, 1, 2, 10)) == [IN_PROGRESS, OPEN, TESTING]
+    assert replay(epoch_ms(2020, 1, 2, 13)) == [IN_PROGRESS, TESTING, TESTING]
+    assert replay(epoch_ms(2020, 1, 3)) == [CLOSED, TESTING, TESTING]
+
+
+def test_state_at_without_transitions():
+    current = np.array([OPEN, CLOSED])
+    empty = np.zeros(0, dtype=np.int32)
+    assert list(backfill.state_at(2, empty, empty, empty, np.zeros(0, dtype=np.int64), current, 0)) == [OPEN, CLOSED]
+
+
+def test_snapshot_dates():
+    assert backfill.snapshot_dates(date(2020, 1, 1), date(2020, 1, 15), 7) == \
+        [date(2020, 1, 1), date(2020, 1, 8), date(2020, 1, 15)]
+    assert backfill.snapshot_dates(date(2020, 1, 2), date(2020, 1, 1), 7) == []
+
+
+def test_snapshots():
+    rows = dict(backfill.snapshots([Changelog.from_issues(ISSUES)], [date(2020, 1, day) for day in (1, 2, 4, 5, 6)]))
+    assert [rows[day]['Current Work In Progress'] for day in sorted(rows)] == [0, 2, 1, 0, 1]
+    # DEMO-3 did not exist before January 5th
+    assert [rows[day]['Declined Issues'] for day in sorted(rows)] == [0, 0, 0, 1, 1]
+    assert [rows[day]['Bug Ratio'] for day in sorted(rows)] == [-1, -1, 0, 1, 1]
+    assert [rows[day]['Bugs Caught'] for day in sorted(rows)] == [0, 0, 0, 0, 1]
+    assert rows['2020-01-02']['Average Code Review Time'] == -1
+    assert rows['2020-01-04']['Average Code Review Time'] == 1
+    assert rows['2020-01-04']['Work Outside of Quarterly Planning'] is None
+
+
+def test_snapshots_over_pages():
+    days = [date(2020, 1, day) for day in range(1, 8)]
+    whole = backfill.snapshots([Changelog.from_issues(ISSUES)], days)
+    assert backfill.snapshots((Changelog.from_issues([issue]) for issue in ISSUES), days) == whole
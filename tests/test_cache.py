@@ -0,0 +1,144 @@
+# Built In Modules
+import sqlite3
+
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+import Jetrics.downstream as d
+from Jetrics import cache, fetch
+from Jetrics.config import config
+from tests.conftest import make_issue
+
+# Global Variables
+JQL = 'project in (DEMO)'
+ISSUES = [
+    make_issue('DEMO-1', 'Story', [((2020, 1, 1, 10), 'Open', 'In Progress'),
+                                   ((2020, 1, 1, 12), 'In Progress', 'Code Review'),
+                                   ((2020, 1, 2, 12), 'Code Review', 'Closed')], resolution='Done',
+               components=['UI']),
+    make_issue('DEMO-2', 'Bug', [((2020, 1, 1, 9), 'Open', 'In Progress'),
+                                 ((2020, 1, 3, 9), 'In Progress', 'Code Review')], category='Product Pipeline'),
+    make_issue('DEMO-3', 'Task'),
+]
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """
+    Serve the searches of the sync from a list of issue lists, one per search, returning the JQL
+    and the fields of each.
+    """
+    answers, searched, fields_asked = [], [], []
+
+    def iter_issue_pages(client, jql, fields=None, expand=None):
+        searched.append(jql)
+        fields_asked.append(fields)
+        yield answers.pop(0)
+
+    monkeypatch.setattr(fetch, 'iter_issue_pages', iter_issue_pages)
+    return answers, searched, fields_asked
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """
+    Empty cache in a temporary directory.
+    """
+    monkeypatch.setitem(config, 'cache_dir', str(tmp_path))
+    conn = cache.open_cache(JQL)
+    yield conn
+    conn.close()
+
+
+def test_issues_round_trip(conn, searches):
+    answers, searched, _ = searches
+    answers.append(ISSUES)
+    assert cache.sync(None, conn, JQL, d.issue_fields) == 3
+    assert searched == [JQL]
+    cached = list(cache.iter_issues(conn))
+    assert [issue['key'] for issue in cached] == ['DEMO-3', 'DEMO-2', 'DEMO-1']
+    assert cached[2]['fields']['components'] == [{'name': 'UI'}]
+    assert cached[1]['fields']['project']['projectCategory'] == {'name': 'Product Pipeline'}
+    # The status and resolution changes of DEMO-1's last history stay in one history
+    assert [len(history['items']) for history in cached[2]['changelog']['histories']] == [1, 1, 2]
+    assert d.summarize_durations(d.duration_sketches(cached)) == d.summarize_durations(d.duration_sketches(ISSUES))
+
+
+def test_incremental_sync(conn, searches):
+    answers, searched, _ = searches
+    answers.extend([ISSUES, [make_issue('DEMO-3', 'Task', [((2020, 1, 5, 9), 'Open', 'In Progress')])]])
+    cache.sync(None, conn, JQL, d.issue_fields)
+    assert cache.sync(None, conn, JQL, d.issue_fields) == 1
+    assert searched[1].startswith(f'{JQL} AND updated >= -')
+    cached = {issue['key']: issue for issue in cache.iter_issues(conn)}
+    assert len(cached) == 3
+    assert cached['DEMO-3']['fields']['status'] == {'name': 'In Progress'}
+    assert len(cached['DEMO-3']['changelog']['histories']) == 1
+
+
+def test_full_sync_drops_removed_issues(conn, searches, monkeypatch):
+    answers, searched, _ = searches
+    answers.extend([ISSUES, ISSUES[:2]])
+    cache.sync(None, conn, JQL, d.issue_fields)
+    monkeypatch.setitem(config, 'cache_full_sync_days', 0)
+    cache.sync(None, conn, JQL, d.issue_fields)
+    assert searched == [JQL, JQL]
+    assert [issue['key'] for issue in cache.iter_issues(conn)] == ['DEMO-2', 'DEMO-1']
+    assert conn.execute('SELECT COUNT(*) FROM transitions WHERE issue_id = 3').fetchone()[0] == 0
+
+
+def test_breakdown_fields_are_kept(conn, searches):
+    answers, searched, fields_asked = searches
+    answers.extend([ISSUES, ISSUES, ISSUES])
+    cache.sync(None, conn, JQL, d.issue_fields)
+    # The first breakdown downloads every issue again with its fields
+    cache.sync(None, conn, JQL, d.issue_fields + d.breakdown_fields)
+    assert searched[1] == JQL
+    assert fields_asked[1] == d.issue_fields + d.breakdown_fields
+    # Later syncs keep them up to date
+    cache.sync(None, conn, JQL, d.issue_fields)
+    assert searched[2].startswith(f'{JQL} AND updated >= -')
+    assert fields_asked[2] == d.issue_fields + d.breakdown_fields
+
+
+def test_project_filter(conn, searches):
+    answers, _, _ = searches
+    answers.append(ISSUES + [make_issue('OTHER-4', 'Bug', [((2020, 1, 1, 9), 'Open', 'In Progress')])])
+    cache.sync(None, conn, JQL, d.issue_fields)
+    assert [issue['key'] for issue in cache.iter_issues(conn, ['OTHER'])] == ['OTHER-4']
+    assert len(list(cache.iter_issues(conn, ['DEMO', 'OTHER']))) == 4
+
+
+def test_epic_sync(conn, searches):
+    answers, searched, _ = searches
+    epics = [{'key': 'DEMO-9', 'fields': {'labels': ['2020Q1']}}, {'key': 'DEMO-8', 'fields': {'labels': None}}]
+    answers.extend([epics, [{'key': 'DEMO-8', 'fields': {'labels': ['2020Q1']}}], epics[:1]])
+    cache.sync_epics(None, conn, 'type = Epic AND labels in (2020Q1)')
+    cache.sync_epics(None, conn, 'type = Epic AND labels in (2020Q1)')
+    assert cache.load_epics(conn) == {'DEMO-9': {'2020Q1'}, 'DEMO-8': {'2020Q1'}}
+    # Another JQL is a full sync
+    cache.sync_epics(None, conn, 'type = Epic AND labels in (2020Q2)')
+    assert searched[1].startswith('type = Epic AND updated >= -')
+    assert searched[2] == 'type = Epic AND labels in (2020Q2)'
+    assert cache.load_epics(conn) == {'DEMO-9': {'2020Q1'}}
+
+
+def test_old_caches_get_a_full_sync(tmp_path, monkeypatch, searches):
+    monkeypatch.setitem(config, 'cache_dir', str(tmp_path))
+    conn = cache.open_cache(JQL)
+    path = conn.execute('PRAGMA database_list').fetchone()[2]
+    cache.set_state(conn, 'last_sync', 1.0)
+    cache.set_state(conn, 'last_full_sync', 1.0)
+    conn.commit()
+    conn.close()
+    # A cache from before the breakdown columns were kept
+    with sqlite3.connect(path) as old:
+        old.execute('ALTER TABLE issues DROP COLUMN components')
+    conn = cache.open_cache(JQL)
+    assert cache.get_state(conn, 'last_full_sync') is None
+    answers, searched, _ = searches
+    answers.append(ISSUES)
+    cache.sync(None, conn, JQL, d.issue_fields)
+    assert searched == [JQL]
+    conn.close()
@@ -0,0 +1,116 @@
+# 3rd Party Modules
+import numpy as np
+import pytest
+
+# Local Modules
+from Jetrics import columnar
+from Jetrics.columnar import Changelog
+from tests.conftest import epoch_ms, make_issue
+
+# Global Variables
+HOUR = 60 * 60
+DEFINITIONS = {
+    'Review': {'start': {'to': ['Code Review']}, 'end': {'from': ['Code Review']}},
+    'Testing': {'issue_types': ['Bug'], 'start': {'to': ['Testing']}, 'end': {'from': ['Testing']},
+                'repeat': True},
+    'Cycle': {'start': {'to': ['In Progress']}, 'end': {'to': ['Closed']},
+              'workflows': {'alternate': {'end': {'to': ['Resolved']}}}},
+}
+WORKFLOWS = {'alternate': ['OTHER']}
+
+
+def day(number, hour):
+    """
+    Helper function to get an hour of a day of January 2020, as a date for make_issue.
+    """
+    return 2020, 1, number, hour
+
+
+def durations(issues, keep=None):
+    """
+    Helper function to get the durations of DEFINITIONS over issues, in hours.
+    """
+    changelog = Changelog.from_issues(issues)
+    matches = columnar.match_rows(changelog, DEFINITIONS, WORKFLOWS)
+    return {name: sorted(values / HOUR) for name, values in columnar.pair_rows(changelog, matches, keep).items()}
+
+
+def test_parse_timestamps():
+    assert list(columnar.parse_timestamps(['2020-01-01T10:00:00.000+0000', '2020-01-01T10:00:00.500+0530',
+                                           '2019-12-31T22:30:00.000-1130'])) == \
+        [epoch_ms(2020, 1, 1, 10), epoch_ms(2020, 1, 1, 4, 30, 0, 500000), epoch_ms(2020, 1, 1, 10)]
+    assert len(columnar.parse_timestamps([])) == 0
+
+
+def test_from_issues():
+    issues = [make_issue('DEMO-1', 'Bug', [(day(1, 10), 'Open', 'In Progress')], components=['UI', 'API']),
+              make_issue('OTHER-2', 'Story', [(day(1, 11), 'Open', 'In Progress'),
+                                              (day(1, 12), 'In Progress', 'Closed')], resolution='Done')]
+    changelog = Changelog.from_issues(issues)
+    assert changelog.keys == ['DEMO-1', 'OTHER-2']
+    assert len(changelog) == 3
+    assert list(changelog.issue_index) == [0, 1, 1]
+    status_names = list(changelog.status_codes)
+    assert [status_names[code] for code in changelog.to_codes] == ['In Progress', 'In Progress', 'Closed']
+    assert list(changelog.resolution_index) == [1]
+    assert list(changelog.component_issues) == [0, 0, 1]
+    # Issues without components get a None row
+    assert list(changelog.components) == [changelog.component_codes['UI'], changelog.component_codes['API'], 0]
+
+
+def test_once_per_issue():
+    issue = make_issue('DEMO-1', 'Story', [
+        (day(1, 8), 'Open', 'Code Review'), (day(1, 10), 'Code Review', 'Open'),
+        (day(1, 11), 'Open', 'Code Review'), (day(1, 12), 'Code Review', 'Merged'),
+        (day(1, 13), 'Merged', 'Code Review'), (day(1, 17), 'Code Review', 'Merged')])
+    # From the last start before the first end to the last end
+    assert durations([issue])['Review'] == [9]
+
+
+def test_every_pair():
+    issue = make_issue('DEMO-1', 'Bug', [
+        (day(1, 8), 'Open', 'Testing'), (day(1, 10), 'Testing', 'In Progress'),
+        (day(1, 11), 'In Progress', 'Testing'), (day(1, 14), 'Testing', 'Closed')])
+    assert durations([issue])['Testing'] == [2, 3]
+    # The metric only counts bugs
+    story = make_issue('DEMO-2', 'Story', [(day(1, 8), 'Open', 'Testing'), (day(1, 10), 'Testing', 'In Progress')])
+    assert durations([story])['Testing'] == []
+
+
+def test_pairs_stay_within_an_issue():
+    issues = [make_issue('DEMO-1', 'Bug', [(day(1, 8), 'Open', 'Code Review'), (day(1, 9), 'Open', 'Testing')]),
+              make_issue('DEMO-2', 'Bug', [(day(1, 10), 'Code Review', 'Merged'), (day(1, 12), 'Testing', 'Open')])]
+    assert durations(issues) == {'Review': [], 'Testing': [], 'Cycle': []}
+
+
+def test_workflow_overrides():
+    changes = [(day(1, 8), 'Open', 'In Progress'), (day(1, 10), 'In Progress', 'Resolved'),
+               (day(1, 12), 'Resolved', 'Closed')]
+    assert durations([make_issue('DEMO-1', 'Story', changes)])['Cycle'] == [4]
+    assert durations([make_issue('OTHER-1', 'Story', changes)])['Cycle'] == [2]
+
+
+def test_keep_rows():
+    issue = make_issue('DEMO-1', 'Story', [(day(1, 8), 'Open', 'In Progress'), (day(1, 10), 'In Progress', 'Closed'),
+                                           (day(1, 11), 'Closed', 'In Progress'),
+                                           (day(1, 15), 'In Progress', 'Closed')])
+    changelog = Changelog.from_issues([issue])
+    assert durations([issue])['Cycle'] == [7]
+    assert durations([issue], keep=changelog.timestamps < epoch_ms(2020, 1, 1, 11))['Cycle'] == [2]
+
+
+def test_backwards_pairs_are_dropped():
+    issue = make_issue('DEMO-1', 'Story', [(day(1, 10), 'Open', 'Code Review'), (day(1, 10), 'Code Review', 'Open')])
+    assert durations([issue])['Review'] == []
+
+
+@pytest.mark.parametrize('size', [0, 1, 7])
+def test_pair_issues_positions(size):
+    issues = [make_issue(f'DEMO-{number}', 'Story', [(day(1, 8), 'Open', 'In Progress'),
+                                                      (day(1, 8 + number), 'In Progress', 'Closed')])
+              for number in range(1, size + 1)]
+    changelog = Changelog.from_issues(issues)
+    matches = columnar.match_rows(changelog, DEFINITIONS, WORKFLOWS)
+    positions, seconds = columnar.pair_issues(changelog, matches)['Cycle']
+    assert list(positions) == list(range(size))
+    assert np.array_equal(seconds, np.arange(1, size + 1) * HOUR)
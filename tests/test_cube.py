@@ -0,0 +1,103 @@
+# Built In Modules
+from datetime import date
+
+# 3rd Party Modules
+import numpy as np
+import pytest
+
+# Local Modules
+import Jetrics.downstream as d
+from Jetrics import fetch
+from Jetrics.columnar import Changelog
+from Jetrics.config import config
+from Jetrics.cube import MetricCube
+from Jetrics.query import IssueIndex
+from tests.conftest import make_issue
+
+# Global Variables
+DAY = 24 * 60 * 60
+
+
+def breakdown_issue(key, issue_type, created, assignee, priority, **options):
+    """
+    Helper function to build an issue with the fields metrics are broken down by.
+    """
+    issue = make_issue(key, issue_type, created=created, **options)
+    issue['fields']['assignee'] = {'displayName': assignee} if assignee else None
+    issue['fields']['priority'] = {'name': priority}
+    return issue
+
+
+@pytest.fixture
+def cube():
+    """
+    Cube of three issues created on three days, with a count, a ratio and a duration metric.
+    """
+    index = IssueIndex()
+    index.add(Changelog.from_issues([
+        breakdown_issue('DEMO-1', 'Bug', (2020, 1, 1, 10), 'Ann', 'High', status='In Progress',
+                        components=['UI', 'API']),
+        breakdown_issue('DEMO-2', 'Story', (2020, 1, 2, 10), 'Bob', 'Low', status='Closed', resolution='Done',
+                        components=['API']),
+    ]))
+    # Codes are remapped between pages
+    index.add(Changelog.from_issues([breakdown_issue('DEMO-3', 'Bug', (2020, 1, 3, 10), None, 'High')]))
+    cube = MetricCube(index)
+    cube.add_count('Bugs', index.mask('type = Bug'))
+    cube.add_ratio('Open Bugs', index.mask('status = Open'), index.mask('type = Bug'))
+    cube.add_durations('Cycle Time', np.array([0, 0, 1]), np.array([1, 2, 3]) * DAY, DAY)
+    return cube
+
+
+def test_whole_population(cube):
+    assert cube.values() == {'Bugs': 2, 'Open Bugs': 0.5, 'Cycle Time': 2}
+
+
+def test_windows(cube):
+    assert cube.values(date(2020, 1, 2), date(2020, 1, 3)) == {'Bugs': 1, 'Open Bugs': 1, 'Cycle Time': 3}
+    # No bug and no duration: ratios and averages are -1
+    assert cube.values(date(2020, 1, 2), date(2020, 1, 2)) == {'Bugs': 0, 'Open Bugs': -1, 'Cycle Time': 3}
+    assert cube.values(date(2020, 1, 3)) == {'Bugs': 1, 'Open Bugs': 1, 'Cycle Time': -1}
+    assert cube.values(end=date(2020, 1, 1)) == {'Bugs': 1, 'Open Bugs': 0, 'Cycle Time': 1.5}
+    assert cube.values(date(2020, 2, 1), date(2020, 2, 29)) == {'Bugs': 0, 'Open Bugs': -1, 'Cycle Time': -1}
+    assert cube.values(date(2020, 1, 3), date(2020, 1, 1)) == {'Bugs': 0, 'Open Bugs': -1, 'Cycle Time': -1}
+
+
+def test_breakdowns(cube):
+    assert cube.values(dimension='priority') == {
+        'High': {'Bugs': 2, 'Open Bugs': 0.5, 'Cycle Time': 1.5},
+        'Low': {'Bugs': 0, 'Open Bugs': -1, 'Cycle Time': 3},
+    }
+    assert cube.values(dimension='assignee') == {
+        None: {'Bugs': 1, 'Open Bugs': 1, 'Cycle Time': -1},
+        'Ann': {'Bugs': 1, 'Open Bugs': 0, 'Cycle Time': 1.5},
+        'Bob': {'Bugs': 0, 'Open Bugs': -1, 'Cycle Time': 3},
+    }
+    # An issue counts once for every component it has
+    assert cube.values(dimension='component') == {
+        None: {'Bugs': 1, 'Open Bugs': 1, 'Cycle Time': -1},
+        'UI': {'Bugs': 1, 'Open Bugs': 0, 'Cycle Time': 1.5},
+        'API': {'Bugs': 1, 'Open Bugs': 0, 'Cycle Time': 2},
+    }
+    # Values without an issue created in the window are left out
+    assert set(cube.values(date(2020, 1, 2), date(2020, 1, 3), 'component')) == {None, 'API'}
+
+
+def test_measures_added_later_rebuild_the_tables(cube):
+    cube.values(dimension='priority')
+    cube.add_count('Stories', cube.index.mask('type = Story'))
+    assert cube.values(dimension='priority')['Low']['Stories'] == 1
+
+
+def test_unknown_dimension(cube):
+    with pytest.raises(ValueError):
+        cube.values(dimension='reporter')
+
+
+def test_breakdown_fields_are_only_downloaded_for_the_cube(monkeypatch):
+    asked = []
+    monkeypatch.setattr(fetch, 'iter_raw_issues',
+                        lambda client, jql, fields=None, expand=None: asked.append(fields) or iter(()))
+    d.load_population(None)
+    d.load_population(None, pairs={name: [] for name in config['duration_metrics']})
+    assert asked == [d.issue_fields, d.issue_fields + d.breakdown_fields]
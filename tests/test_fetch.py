@@ -0,0 +1,116 @@
+# Built In Modules
+import socket
+
+# 3rd Party Modules
+import jira
+import pytest
+import requests
+
+# Local Modules
+from benchmarks.fake_server import FakeBackend
+from Jetrics import fetch
+from Jetrics.config import config
+from tests.conftest import make_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    """
+    Every test starts with its own limiter and without backoff waits.
+    """
+    monkeypatch.setattr(fetch, 'limiter', fetch.AdaptiveLimiter(4))
+    monkeypatch.setitem(config, 'backoff_base', 0.001)
+    monkeypatch.setitem(config, 'max_workers', 4)
+
+
+def test_pages_are_fetched_in_order(serve):
+    client = serve(FakeBackend(250, page_limit=40))
+    keys = [issue['key'] for issue in fetch.iter_raw_issues(client, 'project = DEMO', fields=['status'])]
+    assert keys == [FakeBackend(250).issue(index)['key'] for index in range(250)]
+
+
+def test_searches_are_ordered(serve, monkeypatch):
+    client = serve(FakeBackend(10))
+    searched = []
+    get_json = fetch.get_json
+    monkeypatch.setattr(fetch, 'get_json', lambda client, path, params, query=None: searched.append(
+        (params['jql'], query)) or get_json(client, path, params, query))
+    list(fetch.iter_raw_issues(client, 'project = DEMO'))
+    list(fetch.iter_raw_issues(client, 'project = DEMO order by created DESC'))
+    assert searched == [('project = DEMO ORDER BY key', 'project = DEMO'),
+                        ('project = DEMO order by created DESC', 'project = DEMO order by created DESC')]
+
+
+def test_throttled_requests_are_retried(serve):
+    backend = FakeBackend(300, rate_limit=20, page_limit=10)
+    client = serve(backend)
+    assert len(list(fetch.iter_raw_issues(client, 'project = DEMO'))) == 300
+    assert backend.stats['throttled'] > 0
+    assert fetch.limiter.in_flight == 0
+    assert fetch.limiter.limit < 4
+
+
+def test_connection_errors_are_retried(monkeypatch):
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+    client = make_client(f'http://127.0.0.1:{port}')
+    monkeypatch.setitem(config, 'max_retries', 2)
+    attempts = []
+    monkeypatch.setattr(fetch.limiter, 'throttle', lambda delay: attempts.append(delay) or fetch.limiter.release(False))
+    with pytest.raises(requests.ConnectionError):
+        fetch.get_json(client, 'search', {'jql': 'project = DEMO', 'maxResults': 0})
+    assert len(attempts) == 2
+    assert fetch.limiter.in_flight == 0
+    assert fetch.limiter.limit == 4
+
+
+def test_failed_requests_do_not_grow_the_limit():
+    limiter = fetch.AdaptiveLimiter(8)
+    limiter.limit = 2
+    limiter.acquire()
+    limiter.release(healthy=False)
+    assert (limiter.in_flight, limiter.limit) == (0, 2)
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 2.5
+    limiter.acquire()
+    limiter.throttle(0)
+    assert (limiter.in_flight, limiter.limit) == (0, 1.25)
+
+
+def test_server_errors_are_raised(serve):
+    client = serve(FakeBackend(10))
+    with pytest.raises(requests.HTTPError):
+        fetch.get_json(client, 'issue/DEMO-999/changelog', {})
+    assert fetch.limiter.in_flight == 0
+    assert fetch.limiter.limit == 4
+
+
+def test_truncated_changelogs_are_completed(serve):
+    backend = FakeBackend(30, changelog_limit=2)
+    client = serve(backend)
+    issues = list(fetch.iter_raw_issues(client, 'project = DEMO', expand='changelog'))
+    assert backend.stats['jira.changelog'] > 0
+    for index, issue in enumerate(issues):
+        histories = backend.issue(index)['changelog']['histories']
+        assert issue['changelog']['histories'] == histories
+        assert issue['changelog']['total'] == len(histories)
+
+
+def test_changelog_splicing_keeps_the_embedded_histories(serve):
+    client = serve(FakeBackend(5, changelog_limit=2))
+    full = FakeBackend(5).issue(3)
+    histories = full['changelog']['histories']
+    assert len(histories) > 4
+    # A page of histories from the middle, as some JIRA versions embed it
+    issue = dict(full, changelog={'startAt': 2, 'maxResults': 2, 'total': len(histories), 'histories': histories[2:4]})
+    fetch.complete_changelog(client, issue)
+    assert issue['changelog'] == {'startAt': 0, 'maxResults': len(histories), 'total': len(histories),
+                                  'histories': histories}
+
+
+def test_clients_must_be_registered():
+    client = jira.client.JIRA(options={'server': 'http://127.0.0.1:1'}, get_server_info=False)
+    with pytest.raises(ValueError):
+        fetch.get_json(client, 'search', {'jql': 'project = DEMO'})
@@ -0,0 +1,86 @@
+# Built In Modules
+import json
+import math
+import os
+
+# 3rd Party Modules
+import numpy as np
+import pytest
+
+# Local Modules
+from Jetrics.history import MANIFEST, HistorySink, HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    Empty store in a temporary directory.
+    """
+    return HistoryStore(str(tmp_path / 'store'))
+
+
+def test_empty_store(store):
+    days, values = store.read()
+    assert len(days) == 0 and values == {}
+    assert store.columns() == []
+
+
+def test_append_and_read(store):
+    store.append([('2020-01-06', {'WIP': 3, 'Cycle Time': 1.5}), ('2020-01-13', {'WIP': 4, 'Cycle Time': -1})])
+    # A column added later is NaN for the rows before it
+    store.append([('2020-01-20', {'WIP': 5, 'Bugs': 2, 'Cycle Time': None})])
+    assert store.columns() == ['WIP', 'Cycle Time', 'Bugs']
+    days, values = store.read()
+    assert [str(day) for day in days] == ['2020-01-06', '2020-01-13', '2020-01-20']
+    assert list(values['WIP']) == [3, 4, 5]
+    # -1 (no data) and missing values are NaN
+    assert values['Cycle Time'][0] == 1.5 and np.isnan(values['Cycle Time'][1:]).all()
+    assert np.isnan(values['Bugs'][:2]).all() and values['Bugs'][2] == 2
+    # Without several rows a day, columns are maps of the files
+    assert isinstance(values['WIP'], np.memmap)
+
+
+def test_date_range(store):
+    store.append([(f'2020-01-{day:02d}', {'WIP': day}) for day in range(1, 11)])
+    _, values = store.read(['WIP'], start='2020-01-03', end='2020-01-05')
+    assert list(values['WIP']) == [3, 4, 5]
+    with pytest.raises(KeyError):
+        store.read(['Bugs'])
+
+
+def test_last_row_of_a_day_wins(store):
+    store.append([('2020-01-01', {'WIP': 1}), ('2020-01-02', {'WIP': 2})])
+    store.append([('2020-01-02', {'WIP': 3}), ('2020-01-03', {'WIP': 4})])
+    assert list(store.read()[1]['WIP']) == [1, 3, 4]
+    assert list(store.read(per_day=False)[1]['WIP']) == [1, 2, 3, 4]
+
+
+def test_out_of_order_rows(store):
+    store.append([('2020-01-10', {'WIP': 10}), ('2020-01-11', {'WIP': 11})])
+    # A backfill after daily runs
+    store.append([('2020-01-01', {'WIP': 1}), ('2020-01-10', {'WIP': 9}), ('2020-01-05', {'WIP': 5})])
+    with open(os.path.join(store.directory, MANIFEST)) as manifest:
+        assert not json.load(manifest)['ordered']
+    days, values = store.read()
+    assert [str(day) for day in days] == ['2020-01-01', '2020-01-05', '2020-01-10', '2020-01-11']
+    assert list(values['WIP']) == [1, 5, 9, 11]
+    assert list(store.read(start='2020-01-05', end='2020-01-10')[1]['WIP']) == [5, 9]
+
+
+def test_uncommitted_rows_are_ignored(store):
+    store.append([('2020-01-01', {'WIP': 1})])
+    # An append that stopped before replacing the manifest
+    with open(os.path.join(store.directory, store.column_file(0)), 'ab') as column:
+        np.array([math.pi], dtype='<f8').tofile(column)
+    assert list(store.read()[1]['WIP']) == [1]
+    store.append([('2020-01-02', {'WIP': 2})])
+    assert list(store.read()[1]['WIP']) == [1, 2]
+
+
+def test_sink_keeps_a_store_per_sheet(tmp_path):
+    sink = HistorySink(str(tmp_path))
+    assert sink.write_rows([('2020-01-01', {'WIP': 1})], sheet='Team A/B') == {
+        'directory': os.path.join(str(tmp_path), 'Team A%2FB'), 'rows': 1}
+    assert sink.write_rows([('2020-01-01', {'WIP': 1})], sheet='Sheet1', dry_run=True)['rows'] == 1
+    assert os.listdir(str(tmp_path)) == ['Team A%2FB']
+    assert list(sink.store('Team A/B').read()[1]['WIP']) == [1]
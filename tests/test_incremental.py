@@ -0,0 +1,241 @@
+# Built In Modules
+import copy
+import json
+
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+import Jetrics.downstream as d
+from Jetrics.columnar import Changelog
+from Jetrics.config import config
+from Jetrics.incremental import InvalidEvent, IssueAggregates, to_epoch_ms
+from Jetrics.query import IssueIndex
+from tests.conftest import make_issue
+
+
+def day(number, hour):
+    """
+    Helper function to get an hour of a day of January 2020, as a date for make_issue.
+    """
+    return 2020, 1, number, hour
+
+
+ISSUES = [
+    make_issue('DEMO-1', 'Story', [(day(1, 10), 'Open', 'In Progress'), (day(1, 12), 'In Progress', 'Code Review'),
+                                   (day(2, 12), 'Code Review', 'Merged'), (day(3, 12), 'Merged', 'Verified'),
+                                   (day(4, 12), 'Verified', 'Closed')], resolution='Done'),
+    make_issue('DEMO-2', 'Bug', [(day(1, 9), 'Open', 'In Progress'), (day(2, 9), 'In Progress', 'Code Review'),
+                                 (day(4, 9), 'Code Review', 'Testing'), (day(5, 9), 'Testing', 'In Progress')]),
+    make_issue('DEMO-3', 'Bug', [(day(2, 10), 'Open', 'In Progress'), (day(3, 10), 'In Progress', 'Closed')],
+               resolution="Won't Fix"),
+    make_issue('DEMO-4', 'Story'),
+]
+
+
+def event(issue, history, kind='jira:issue_updated'):
+    """
+    Helper function to build the webhook event of one of an issue's histories, with the fields as of it.
+    """
+    histories = issue['changelog']['histories']
+    position = histories.index(history)
+    fields = dict(issue['fields'], status={'name': history['items'][0]['toString']},
+                  resolution=next(({'name': item['toString']} for later in histories[:position + 1]
+                                   for item in later['items'] if item['field'] == 'resolution'), None),
+                  updated=history['created'])
+    return {'webhookEvent': kind, 'timestamp': to_epoch_ms(history['created']),
+            'issue': {'id': issue['id'], 'key': issue['key'], 'fields': fields},
+            'changelog': {'id': history['id'], 'items': history['items']}}
+
+
+def truncated(issue, kept):
+    """
+    Helper function to get an issue as it was after its first histories, and the events of the others.
+    """
+    histories = issue['changelog']['histories']
+    early = copy.deepcopy(issue)
+    early['changelog']['histories'] = histories[:kept]
+    if kept:
+        early['fields'] = event(issue, histories[kept - 1])['issue']['fields']
+    else:
+        early['fields'] = dict(issue['fields'], status={'name': 'Open'}, resolution=None,
+                               updated=issue['fields']['created'])
+    return early, [event(issue, history) for history in histories[kept:]]
+
+
+def rebuilt(issues):
+    """
+    Helper function to get the values of aggregates rebuilt from issues.
+    """
+    aggregates = IssueAggregates()
+    aggregates.rebuild(issues)
+    return aggregates.values()
+
+
+def test_values():
+    values = rebuilt(ISSUES)
+    assert values['Current Work In Progress'] == 1
+    assert values['Bugs Caught'] == 1
+    assert values['QE Gaps'] == 0
+    assert values['Declined Issues'] == 1
+    assert values['Deferred Issues'] == 0
+    # One resolved bug over one resolved story
+    assert values['Bug Ratio'] == 1
+    # Code review took 1 day for the story and 2 days for the bug
+    assert values['Average Code Review Time'] == pytest.approx(1.5)
+
+
+def test_rebuild_matches_batch_metrics():
+    values = rebuilt(ISSUES)
+    batch = d.summarize_durations(d.duration_sketches(ISSUES))
+    assert {column: values[column] for column in batch} == pytest.approx(batch)
+    index = IssueIndex(d.standard_jql)
+    index.add(Changelog.from_issues(ISSUES))
+    assert values['Current Work In Progress'] == index.count(d.work_in_progress_jql)
+    assert values['Bugs Caught'] == index.count(d.bugs_caught_jql)
+    assert values['Declined Issues'] == index.count(d.declined_jql)
+
+
+def test_per_metric_functions_match_batch_metrics():
+    batch = d.summarize_durations(d.duration_sketches(ISSUES))
+    assert d.average_code_review_time(None, ISSUES) == pytest.approx(1.5)
+    assert d.average_code_review_to_qe(None, ISSUES) == batch['Average Code Review to QE']
+    assert d.time_to_deploy(None, ISSUES) == batch['Time to Deploy'] == -1
+    assert d.cycle_time(None, ISSUES) == (batch['Bug Cycle Time'], batch['Story Cycle Time'])
+    assert d.passing_qe(None, ISSUES) == batch['Passing QE']
+
+
+def test_events_match_rebuild():
+    aggregates = IssueAggregates()
+    events = []
+    for issue, kept in zip(ISSUES, (2, 0, 1, 0)):
+        early, later = truncated(issue, kept)
+        aggregates.add_issue(early)
+        events.extend(later)
+    for webhook_event in sorted(events, key=lambda webhook_event: webhook_event['timestamp']):
+        assert aggregates.apply_event(webhook_event)
+    assert aggregates.values() == pytest.approx(rebuilt(ISSUES))
+
+
+def test_redelivered_events_are_skipped():
+    aggregates = IssueAggregates()
+    aggregates.rebuild(ISSUES)
+    values = aggregates.values()
+    # Events the changelogs already hold, and the same event twice
+    for history in ISSUES[1]['changelog']['histories']:
+        aggregates.apply_event(event(ISSUES[1], history))
+        aggregates.apply_event(event(ISSUES[1], history))
+    assert aggregates.values() == pytest.approx(values)
+
+
+def test_events_outside_the_population():
+    aggregates = IssueAggregates(['DEMO'])
+    aggregates.rebuild(ISSUES)
+    other = make_issue('OTHER-5', 'Bug', [(day(2, 10), 'Open', 'In Progress')])
+    assert not aggregates.apply_event(event(other, other['changelog']['histories'][0]))
+    assert aggregates.values()['Current Work In Progress'] == 1
+
+
+def test_deleted_issue():
+    aggregates = IssueAggregates()
+    aggregates.rebuild(ISSUES)
+    deleted = event(ISSUES[1], ISSUES[1]['changelog']['histories'][-1], 'jira:issue_deleted')
+    assert aggregates.apply_event(deleted)
+    # Removing a duration leaves the quantiles within the sketch accuracy, not exact
+    assert aggregates.values() == pytest.approx(rebuilt([ISSUES[0], ISSUES[2], ISSUES[3]]),
+                                                rel=config['sketch_accuracy'])
+
+
+def test_events_during_rebuild_are_replayed():
+    aggregates = IssueAggregates()
+    early, later = truncated(ISSUES[1], 2)
+    aggregates.rebuild([ISSUES[0], early, ISSUES[2], ISSUES[3]])
+
+    def issues():
+        # The rebuild reads the issues as of before the first event, which arrives while it runs
+        yield ISSUES[0]
+        aggregates.apply_event(later[0])
+        yield early
+        yield ISSUES[2]
+        aggregates.apply_event(later[1])
+        yield ISSUES[3]
+
+    aggregates.rebuild(issues())
+    assert aggregates.values() == pytest.approx(rebuilt(ISSUES))
+    # Rebuilding from the complete changelogs skips the events they hold
+    aggregates.hold_events()
+    aggregates.apply_event(later[1])
+    aggregates.rebuild(ISSUES)
+    assert aggregates.values() == pytest.approx(rebuilt(ISSUES))
+
+
+def test_restart_replays_the_journal(tmp_path, monkeypatch):
+    monkeypatch.setitem(config, 'webhook_checkpoint_events', 3)
+    path = str(tmp_path / 'aggregates.json')
+    aggregates = IssueAggregates(path=path)
+    events = []
+    for issue in ISSUES:
+        early, later = truncated(issue, 1 if issue['changelog']['histories'] else 0)
+        aggregates.add_issue(early)
+        events.extend(later)
+    aggregates.checkpoint()
+    for webhook_event in sorted(events, key=lambda webhook_event: webhook_event['timestamp']):
+        aggregates.apply_event(webhook_event)
+    with open(f'{path}.journal') as journal:
+        # 8 events, snapshots were written after the third and the sixth
+        assert len(journal.readlines()) == 2
+    values = aggregates.values()
+    restarted = IssueAggregates(path=path)
+    assert restarted.values() == pytest.approx(values)
+    assert restarted.values() == pytest.approx(rebuilt(ISSUES))
+    # Events redelivered after the restart are skipped
+    for webhook_event in events:
+        restarted.apply_event(webhook_event)
+    assert restarted.values() == pytest.approx(values)
+    with open(path) as snapshot:
+        assert set(json.load(snapshot)['issues']) == {'1', '2', '3', '4'}
+
+
+@pytest.mark.parametrize('payload', [
+    [1],
+    {'webhookEvent': 'jira:issue_updated', 'issue': {'id': '1'}},
+    {'webhookEvent': 'jira:issue_updated', 'issue': {'id': '5', 'fields': {'project': 'DEMO'}}},
+    {'webhookEvent': 'jira:issue_deleted', 'issue': None},
+    {'webhookEvent': 'jira:issue_updated', 'issue': ISSUES[0], 'changelog': {'items': 'status'}},
+    {'webhookEvent': 'jira:issue_updated', 'issue': ISSUES[0], 'timestamp': 'yesterday'},
+])
+def test_malformed_events_are_refused(tmp_path, payload):
+    path = str(tmp_path / 'aggregates.json')
+    aggregates = IssueAggregates(path=path)
+    aggregates.rebuild(ISSUES)
+    values = aggregates.values()
+    with pytest.raises(InvalidEvent):
+        aggregates.apply_event(payload)
+    assert aggregates.values() == values
+    with open(f'{path}.journal') as journal:
+        assert journal.read() == ''
+
+
+def test_restart_skips_bad_journal_lines(tmp_path):
+    path = str(tmp_path / 'aggregates.json')
+    aggregates = IssueAggregates(path=path)
+    early, later = truncated(ISSUES[1], 2)
+    aggregates.rebuild([ISSUES[0], early, ISSUES[2], ISSUES[3]])
+    with open(f'{path}.journal', 'a') as journal:
+        journal.write(json.dumps(later[0]) + '\n')
+        journal.write(json.dumps({'webhookEvent': 'jira:issue_updated', 'issue': {'id': '1'}}) + '\n')
+        journal.write(json.dumps(later[1])[:40] + '\n')
+        journal.write(json.dumps(later[1]) + '\n')
+    restarted = IssueAggregates(path=path)
+    assert restarted.values() == pytest.approx(rebuilt(ISSUES))
+
+
+def test_types_and_categories_match_without_case():
+    issues = copy.deepcopy(ISSUES)
+    for issue in issues:
+        issue['fields']['issuetype']['name'] = issue['fields']['issuetype']['name'].upper()
+    values = rebuilt(issues)
+    assert values['Bug Ratio'] == rebuilt(ISSUES)['Bug Ratio'] == 1
+    gap = make_issue('DEMO-5', 'Story', [(day(2, 10), 'Open', 'Verified'), (day(3, 10), 'Verified', 'Testing')])
+    gap['fields']['project']['projectCategory'] = {'name': 'product pipeline'}
+    assert rebuilt(ISSUES + [gap])['QE Gaps'] == 1
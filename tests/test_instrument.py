@@ -0,0 +1,66 @@
+# Built In Modules
+import contextvars
+
+# Local Modules
+from Jetrics import instrument
+from Jetrics.instrument import RunRecorder
+
+# Global Variables
+SEARCH = 'project = DEMO AND created >= "2020-01-01" ORDER BY created ASC'
+
+
+def request(recorder, metric, query):
+    """
+    Helper function to record one request of a metric, run in a context of its own.
+    """
+    instrument.current_metric.set(metric)
+    recorder.record_request(query, 0.0, 1.0, 100, page=query == SEARCH)
+
+
+def recorded_run():
+    """
+    Helper function to record a run where two metrics read a population loaded once, and one of
+    them queries JIRA on its own.
+    """
+    recorder = RunRecorder()
+    recorder.share('load_population', ['qe_gaps', 'bug_ratio'])
+    for metric, query in [('load_population', SEARCH), ('load_population', SEARCH), ('bug_ratio', 'issue/DEMO-1')]:
+        contextvars.copy_context().run(request, recorder, metric, query)
+    recorder.record_metric('load_population', 2.0, 'ok')
+    recorder.record_metric('qe_gaps', 0.1, 'ok')
+    recorder.record_metric('bug_ratio', 0.5, 'ok')
+    return recorder
+
+
+def test_shared_work_is_reported_apart():
+    report = recorded_run().report()
+    assert report['shared'] == {'load_population': {'requests': 2, 'pages': 2, 'bytes': 200, 'retries': 0,
+                                                    'seconds': 2.0, 'status': 'ok',
+                                                    'metrics': ['qe_gaps', 'bug_ratio']}}
+    assert set(report['metrics']) == {'qe_gaps', 'bug_ratio'}
+    assert report['metrics']['qe_gaps']['shared'] == ['load_population']
+    assert report['metrics']['bug_ratio']['requests'] == 1
+    # Every request is still counted once
+    assert report['totals']['requests'] == 3
+
+
+def test_merge_prefixes_the_shared_work():
+    recorder = RunRecorder()
+    recorder.merge(recorded_run().report(), prefix='Team A/')
+    recorder.merge(recorded_run().report(), prefix='Team B/')
+    report = recorder.report()
+    assert report['shared']['Team B/load_population']['metrics'] == ['Team B/qe_gaps', 'Team B/bug_ratio']
+    assert report['metrics']['Team A/qe_gaps']['shared'] == ['Team A/load_population']
+    assert report['queries'][SEARCH]['requests'] == 4
+
+
+def test_prometheus_labels_queries_by_name():
+    report = recorded_run().report()
+    name = report['queries'][SEARCH]['name']
+    assert name == instrument.query_name(SEARCH) and len(name) < 20
+    text = instrument.format_prometheus(report)
+    assert SEARCH not in text
+    assert f'jetrics_query_pages{{query="{name}"}} 2' in text
+    assert 'jetrics_shared_requests{stage="load_population"} 2' in text
+    assert 'jetrics_metric_shared{metric="qe_gaps",stage="load_population"} 1' in text
+    assert 'jetrics_metric_requests{metric="qe_gaps"} 0' in text
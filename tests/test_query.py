@@ -0,0 +1,166 @@
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+from Jetrics.columnar import Changelog
+from Jetrics.query import IssueIndex, UnsupportedQuery, parse
+from tests.conftest import epoch_ms, make_issue
+
+# Global Variables
+BASE_JQL = 'createdDate > 2019\\u002f06\\u002f1 AND Project in (DEMO, OTHER)'
+ISSUES = [
+    make_issue('DEMO-1', 'Bug', [((2020, 1, 1, 11), 'Open', 'In Progress'),
+                                 ((2020, 1, 1, 12), 'In Progress', 'Testing'),
+                                 ((2020, 1, 1, 13), 'Testing', 'In Progress')], components=['UI', 'API']),
+    make_issue('DEMO-2', 'Story', [((2020, 2, 15, 11), 'Open', 'Verified'), ((2020, 2, 15, 12), 'Verified', 'Testing'),
+                                   ((2020, 2, 15, 13), 'Testing', 'Closed')],
+               resolution='Done', created=(2020, 2, 15, 10), category='Product Pipeline', components=['API']),
+    make_issue('DEMO-3', 'Bug', status='Closed', resolution="Won't Fix", created=(2020, 3, 1, 10)),
+    make_issue('OTHER-1', 'Story', [((2020, 1, 1, 11), 'Open', 'In Progress')], status='in progress',
+               components=['UI']),
+    make_issue('OTHER-2', 'Task', status='Resolved', resolution='Deferred', created=(2019, 12, 31, 10),
+               category='Product Pipeline'),
+]
+
+
+@pytest.fixture
+def index():
+    """
+    Index of ISSUES, added over two pages so codes are remapped between them.
+    """
+    index = IssueIndex(BASE_JQL)
+    index.add(Changelog.from_issues(ISSUES[:2]))
+    index.add(Changelog.from_issues(ISSUES[2:]))
+    return index
+
+
+def test_parse_precedence():
+    status, resolution, issue_type = ('in', 'status', frozenset({'open'}), False), \
+        ('in', 'resolution', frozenset({'done'}), False), ('in', 'type', frozenset({'bug'}), False)
+    assert parse('status = Open OR resolution = Done AND type = Bug') == \
+        ('or', status, ('and', resolution, issue_type))
+    assert parse('(status = Open OR resolution = Done) AND type = Bug') == \
+        ('and', ('group', ('or', status, resolution)), issue_type)
+    assert parse('NOT status = Open and type = Bug') == ('and', ('not', status), issue_type)
+
+
+def test_parse_values():
+    assert parse('Status IN ("In Progress", \'Code Review\', Open)') == \
+        ('in', 'status', frozenset({'in progress', 'code review', 'open'}), False)
+    assert parse('issuetype not in (Bug, Ticket)') == ('in', 'type', frozenset({'bug', 'ticket'}), True)
+    assert parse('resolution != "Won\'t Fix"') == ('in', 'resolution', frozenset({"won't fix"}), True)
+    assert parse('Project in DEMO') == ('in', 'project', frozenset({'demo'}), False)
+    assert parse('resolution is EMPTY') == ('empty', 'resolution', False)
+    assert parse('resolution is not null') == ('empty', 'resolution', True)
+    assert parse('"Epic Link" = DEMO-9') == ('in', 'epic', frozenset({'demo-9'}), False)
+
+
+def test_parse_dates():
+    assert parse('createdDate > 2019\\u002f06\\u002f1') == ('compare', 'created', '>', epoch_ms(2019, 6, 1))
+    assert parse('created <= "2020-01-31 12:30"') == ('compare', 'created', '<=', epoch_ms(2020, 1, 31, 12, 30))
+
+
+def test_parse_changed():
+    assert parse("status changed from Testing to 'In Progress'") == \
+        ('changed', 'status', frozenset({'testing'}), frozenset({'in progress'}))
+    assert parse('status changed to (Closed, Resolved)') == \
+        ('changed', 'status', None, frozenset({'closed', 'resolved'}))
+    assert parse('resolution changed') == ('changed', 'resolution', None, None)
+
+
+def test_parse_order_by():
+    assert parse('') == ('all',)
+    assert parse('ORDER BY created DESC') == ('all',)
+    assert parse('status = Open order by key') == ('in', 'status', frozenset({'open'}), False)
+
+
+@pytest.mark.parametrize('jql', [
+    "issueFunction in linkedIssuesOf('type = epic', 'is epic of')",
+    'status in statusCategory(Done)',
+    'created > -4w',
+    'created > startOfMonth()',
+    'status changed after 2020-01-01',
+    'project changed',
+    'assignee = currentUser()',
+    'summary ~ flaky',
+    'status ~ Open',
+    '(status = Open',
+    'status = Open)',
+    'status = Open AND',
+    'status is Open',
+])
+def test_parse_unsupported(jql):
+    with pytest.raises(UnsupportedQuery):
+        parse(jql)
+
+
+def test_count_fields(index):
+    assert len(index) == 5
+    assert index.count('project = DEMO') == 3
+    assert index.count('type = bug') == 2
+    assert index.count('type != Bug') == 3
+    assert index.count('category = "Product Pipeline"') == 2
+    # Statuses match without case
+    assert index.count("status = 'In Progress'") == 2
+
+
+def test_count_empty_fields(index):
+    assert index.count('resolution is EMPTY') == 2
+    assert index.count('resolution is not EMPTY') == 3
+    assert index.count('resolution in (Done, Deferred)') == 2
+    # As in JIRA, != and not in leave out the issues where the field is empty
+    assert index.count('resolution != Done') == 2
+    assert index.count('resolution not in (Done)') == 2
+    assert index.count('resolution not in (Done, EMPTY)') == 2
+    assert index.count('resolution = EMPTY') == 2
+
+
+def test_count_components(index):
+    assert index.count('component = UI') == 2
+    assert index.count('component in (UI, API)') == 3
+    assert index.count('component is EMPTY') == 2
+    # An issue with any of the components is left out
+    assert index.count('component not in (API)') == 1
+
+
+def test_count_changes(index):
+    assert index.count("status changed from Testing to 'In Progress'") == 1
+    assert index.count('status changed from Verified to Testing') == 1
+    assert index.count('status changed to Closed') == 1
+    assert index.count('status changed') == 3
+    assert index.count('category = "Product Pipeline" and status changed from Verified to Testing') == 1
+
+
+def test_count_created(index):
+    assert index.count('created >= 2020-02-15') == 2
+    assert index.count('created < 2020/01/01') == 1
+    assert index.count('createdDate > 2019\\u002f06\\u002f1') == 5
+
+
+def test_count_boolean(index):
+    assert index.count('project = DEMO AND NOT type = Bug') == 1
+    assert index.count('project = OTHER OR type = Bug AND resolution is EMPTY') == 3
+    assert index.count('(project = OTHER OR type = Bug) AND resolution is EMPTY') == 2
+
+
+def test_count_base_query(index):
+    assert index.count(BASE_JQL) == 5
+    assert index.count(f'{BASE_JQL} AND resolution = Deferred') == 1
+    # `base AND a OR b` is `(base AND a) OR b`
+    assert index.count(f'{BASE_JQL} AND project = DEMO OR project = OTHER') == 5
+
+
+def test_count_unsupported(index):
+    with pytest.raises(UnsupportedQuery):
+        index.count(f"{BASE_JQL} AND issueFunction in linkedIssuesOf('type = epic', 'is epic of')")
+
+
+def test_count_downstream_queries():
+    import Jetrics.downstream as d
+
+    index = IssueIndex(d.standard_jql)
+    index.add(Changelog.from_issues([dict(issue, fields=dict(issue['fields'], project={
+        **issue['fields']['project'], 'key': 'DEMO_PROJECT'})) for issue in ISSUES]))
+    assert [index.count(jql) for jql in (d.work_in_progress_jql, d.qe_gaps_jql, d.bugs_caught_jql,
+                                         d.resolved_bugs_jql, d.resolved_other_jql, d.deferred_jql,
+                                         d.declined_jql)] == [2, 1, 1, 1, 2, 1, 1]
@@ -0,0 +1,68 @@
+# Built In Modules
+from http.server import ThreadingHTTPServer
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+from Jetrics.config import config
+from Jetrics.incremental import IssueAggregates
+from Jetrics.service import LatestValues, MetricsHandler
+
+
+class Receiver(object):
+    """
+    Stands in for service.Service, applying the webhook events to one set of aggregates.
+    """
+    def __init__(self):
+        self.aggregates = IssueAggregates()
+
+    def receive(self, event):
+        return self.aggregates.apply_event(event)
+
+
+@pytest.fixture
+def server():
+    """
+    MetricsHandler listening on a free local port.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MetricsHandler)
+    server.latest = LatestValues()
+    server.service = Receiver()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body, secret='s3cret'):
+    """
+    Helper function to POST a body to /webhook, returning the status and the decoded response.
+    """
+    url = f'http://127.0.0.1:{server.server_address[1]}/webhook?secret={secret}'
+    try:
+        with urlopen(url, data=body.encode('utf-8')) as response:
+            return response.status, json.load(response)
+    except HTTPError as error:
+        return error.code, json.load(error)
+
+
+def test_webhook_needs_a_secret(server, monkeypatch):
+    monkeypatch.setitem(config, 'webhook_secret', None)
+    assert post(server, '{}')[0] == 403
+    monkeypatch.setitem(config, 'webhook_secret', 's3cret')
+    assert post(server, '{}', secret='guess')[0] == 403
+    assert post(server, '{}') == (200, {'applied': False})
+
+
+@pytest.mark.parametrize('body', ['not json', '[1]', '{"webhookEvent": "jira:issue_updated", "issue": {"id": "1"}}'])
+def test_webhook_refuses_malformed_payloads(server, monkeypatch, body):
+    monkeypatch.setitem(config, 'webhook_secret', 's3cret')
+    status, response = post(server, body)
+    assert status == 400
+    assert 'error' in response
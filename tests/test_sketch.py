@@ -0,0 +1,117 @@
+# Built In Modules
+import json
+
+# 3rd Party Modules
+import numpy as np
+import pytest
+
+# Local Modules
+from Jetrics.sketch import QuantileSketch
+
+# Global Variables
+ACCURACY = 0.01
+QUANTILES = (0, 0.1, 0.5, 0.85, 0.95, 0.99, 1)
+
+
+def samples(size, seed=0):
+    """
+    Helper function to get long tailed durations in seconds, with a few zeros.
+    """
+    values = np.random.default_rng(seed).lognormal(mean=11, sigma=1.5, size=size)
+    values[::97] = 0
+    return values
+
+
+def exact_quantile(values, q):
+    """
+    Helper function to get the value at the rank QuantileSketch.quantile estimates.
+    """
+    return np.sort(values)[int(q * (len(values) - 1))]
+
+
+def sketch_of(values, **options):
+    """
+    Helper function to sketch values.
+    """
+    sketch = QuantileSketch(ACCURACY, **options)
+    sketch.add_many(values)
+    return sketch
+
+
+@pytest.mark.parametrize('size', [1, 10, 5000])
+def test_quantiles_are_within_the_accuracy(size):
+    values = samples(size)
+    sketch = sketch_of(values)
+    assert len(sketch) == size
+    assert sketch.mean() == pytest.approx(values.mean())
+    for q in QUANTILES:
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=ACCURACY)
+    assert sketch.quantile(0) == values.min()
+    assert sketch.quantile(1) == values.max()
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch(ACCURACY)
+    assert len(sketch) == 0
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean() is None
+    with pytest.raises(ValueError):
+        sketch.add(-1)
+
+
+def test_collapsed_buckets_keep_the_high_quantiles():
+    values = samples(5000)
+    assert len(sketch_of(values).buckets) > 300
+    sketch = sketch_of(values, max_buckets=300)
+    assert len(sketch.buckets) == 300
+    for q in (0.5, 0.85, 0.95, 0.99):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=ACCURACY)
+
+
+def test_merge_matches_one_sketch():
+    values = samples(3000)
+    merged = sketch_of(values[:1000]).merge(sketch_of(values[1000:2000])).merge(sketch_of(values[2000:]))
+    whole = sketch_of(values)
+    assert merged.buckets == whole.buckets
+    assert (len(merged), merged.zeros, merged.min, merged.max) == (len(whole), whole.zeros, whole.min, whole.max)
+    assert merged.sum == pytest.approx(whole.sum)
+    assert [merged.quantile(q) for q in QUANTILES] == [whole.quantile(q) for q in QUANTILES]
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(0.05))
+
+
+def test_remove_takes_values_back():
+    values = samples(1000)
+    sketch = sketch_of(values)
+    for value in values[500:]:
+        sketch.remove(value)
+    kept = sketch_of(values[:500])
+    assert sketch.buckets == kept.buckets
+    assert (len(sketch), sketch.zeros) == (len(kept), kept.zeros)
+    assert sketch.mean() == pytest.approx(kept.mean())
+    # The removed maximum is only recovered within the accuracy
+    assert sketch.quantile(1) == pytest.approx(values[:500].max(), rel=ACCURACY)
+    with pytest.raises(ValueError):
+        QuantileSketch(ACCURACY).remove(1)
+
+
+def test_removing_every_value_empties_the_sketch():
+    sketch = sketch_of([0, 5, 10])
+    for value in (10, 0, 5):
+        sketch.remove(value)
+    assert len(sketch) == 0
+    assert sketch.quantile(0.5) is None
+    sketch.add(3)
+    assert sketch.quantile(0) == sketch.quantile(1) == 3
+
+
+@pytest.mark.parametrize('values', [[], [0, 0], samples(2000)])
+def test_dict_round_trip(values):
+    sketch = sketch_of(values)
+    restored = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.to_dict() == sketch.to_dict()
+    assert [restored.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+    # A restored sketch keeps sketching
+    restored.add(42)
+    sketch.add(42)
+    assert restored.to_dict() == sketch.to_dict()
@@ -0,0 +1,87 @@
+# Built In Modules
+import gzip
+
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+from benchmarks.fake_server import FakeBackend
+from Jetrics import fetch, snapshot
+from Jetrics.config import config
+from tests.conftest import make_client
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    """
+    Snapshot file, recording and replaying are both off until a test turns one on.
+    """
+    monkeypatch.setitem(config, 'record_snapshot', None)
+    monkeypatch.setitem(config, 'replay_snapshot', None)
+    return str(tmp_path / 'run.ndjson.gz')
+
+
+def record(path, serve, **options):
+    """
+    Helper function to record a search of the fake server, returning the issues it found.
+    """
+    client = serve(FakeBackend(60, **options))
+    snapshot.start(path)
+    try:
+        return list(fetch.iter_raw_issues(client, 'project = DEMO', expand='changelog'))
+    finally:
+        config['record_snapshot'] = None
+
+
+def test_replay_matches_record(path, serve):
+    recorded = record(path, serve, page_limit=25, changelog_limit=2)
+    config['replay_snapshot'] = path
+    # Nothing listens there, every response comes from the snapshot
+    client = make_client('http://127.0.0.1:1')
+    assert list(fetch.iter_raw_issues(client, 'project = DEMO', expand='changelog')) == recorded
+
+
+def test_replay_misses(path, serve):
+    record(path, serve)
+    config['replay_snapshot'] = path
+    client = make_client('http://127.0.0.1:1')
+    with pytest.raises(snapshot.SnapshotMiss):
+        list(fetch.iter_raw_issues(client, 'project = OTHER'))
+
+
+def test_read_ahead_and_repeated_requests(path):
+    recorder = snapshot.Recorder(path)
+    for page in range(3):
+        recorder.record('search', {'jql': 'project = DEMO', 'startAt': page}, {'page': page})
+    replayer = snapshot.Replayer(path)
+    assert replayer.header['snapshot'] == snapshot.FORMAT
+    # Pages fetched in parallel are asked for out of order
+    assert replayer.replay('search', {'startAt': 2, 'jql': 'project = DEMO'})[0] == {'page': 2}
+    assert {key for key, lines in replayer.pending.items() if lines} == {
+        snapshot.request_key('search', {'jql': 'project = DEMO', 'startAt': 0}),
+        snapshot.request_key('search', {'jql': 'project = DEMO', 'startAt': 1})}
+    assert replayer.replay('search', {'jql': 'project = DEMO', 'startAt': 0})[0] == {'page': 0}
+    assert replayer.replay('search', {'jql': 'project = DEMO', 'startAt': 1})[0] == {'page': 1}
+    # A request asked for again gets its last response
+    assert replayer.replay('search', {'jql': 'project = DEMO', 'startAt': 1})[0] == {'page': 1}
+
+
+def test_cut_short_recording(path):
+    recorder = snapshot.Recorder(path)
+    recorder.record('search', {'startAt': 0}, {'page': 0})
+    recorder.record('search', {'startAt': 1}, {'page': 1})
+    with open(path, 'rb') as snapshot_file:
+        data = snapshot_file.read()
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(data[:-10])
+    replayer = snapshot.Replayer(path)
+    assert replayer.replay('search', {'startAt': 0})[0] == {'page': 0}
+    with pytest.raises(snapshot.SnapshotMiss):
+        replayer.replay('search', {'startAt': 1})
+
+
+def test_not_a_snapshot(path):
+    with gzip.open(path, 'wt') as snapshot_file:
+        snapshot_file.write('{"path": "search"}\n')
+    with pytest.raises(ValueError):
+        snapshot.Replayer(path)
@@ -0,0 +1,48 @@
+# Built In Modules
+from concurrent.futures import Future
+
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+import Jetrics.downstream as d
+from Jetrics import teams
+from Jetrics.config import config
+from tests.conftest import make_issue
+
+# Global Variables
+TEAMS = {'Team A': ['DEMO'], 'Team B': ['DEMO', 'OTHER']}
+ISSUES = [make_issue('DEMO-1'), make_issue('OTHER-1'), make_issue('THIRD-1')]
+
+
+class InlineExecutor(object):
+    """
+    Stands in for the process pool, answering every team with the projects and issues it was given.
+    """
+    def submit(self, function, projects, quarter_label, cache_jql, issues, profile_dir, team):
+        future = Future()
+        future.set_result(({'projects': projects, 'issues': [issue['key'] for issue in issues or ()]},
+                           {'metrics': {}, 'shared': {}, 'queries': {}, 'sheets': {}}))
+        return future
+
+
+def test_configured_restores_the_queries():
+    standard_jql, group_projects = d.standard_jql, d.group_projects
+    with pytest.raises(RuntimeError):
+        with d.configured(['DEMO', 'OTHER'], 'Team B'):
+            assert d.standard_jql.endswith('Project in (DEMO, OTHER)')
+            assert d.group_projects == ['DEMO', 'OTHER']
+            raise RuntimeError('Stopped half way')
+    assert (d.standard_jql, d.group_projects) == (standard_jql, group_projects)
+
+
+def test_compute_teams_leaves_the_queries(monkeypatch):
+    monkeypatch.setitem(config, 'cache_dir', None)
+    standard_jql = d.standard_jql
+    searched = []
+    monkeypatch.setattr(d, 'iter_population', lambda client: searched.append(d.standard_jql) or iter(ISSUES))
+    results = teams.compute_teams(None, TEAMS, '2020Q1', executor=InlineExecutor())
+    assert searched == [d.create_date + ' AND Project in (DEMO, OTHER)']
+    assert results == {'Team A': {'projects': ['DEMO'], 'issues': ['DEMO-1']},
+                       'Team B': {'projects': ['DEMO', 'OTHER'], 'issues': ['DEMO-1', 'OTHER-1']}}
+    assert d.standard_jql == standard_jql
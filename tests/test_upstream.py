@@ -0,0 +1,101 @@
+# 3rd Party Modules
+import pytest
+
+# Local Modules
+import Jetrics.upstream as u
+from Jetrics.config import config
+
+
+class FakeSheet(object):
+    """
+    Stands in for the values collection of the Sheets client, over the cells of one tab.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.updates = []
+
+    def values(self):
+        return self
+
+    def batchGet(self, spreadsheetId, ranges):
+        header = {'values': self.rows[:1]} if self.rows else {}
+        column = {'values': [row[:1] for row in self.rows]} if self.rows else {}
+        return Request({'valueRanges': [header, column]})
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.updates.append(body['data'])
+        return Request({})
+
+
+class Request(object):
+    """
+    Stands in for a Sheets request, answering with a prepared response.
+    """
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """
+    Install a fake Sheets client over the given rows, returning it.
+    """
+    monkeypatch.setitem(config, 'spreadsheet_id', 'spreadsheet')
+
+    def install(rows):
+        fake = FakeSheet(rows)
+        monkeypatch.setattr(u, '_sheets', fake)
+        return fake
+
+    return install
+
+
+@pytest.mark.parametrize('number, letters', [(1, 'A'), (26, 'Z'), (27, 'AA'), (52, 'AZ'), (703, 'AAA')])
+def test_column_letters(number, letters):
+    assert u.get_letter_from_coordinate(number) == letters
+
+
+def test_column_letters_start_at_one():
+    with pytest.raises(IndexError):
+        u.get_letter_from_coordinate(0)
+
+
+def test_coordinates():
+    assert u.get_coordinates_string(1, 28, 2, 5) == 'Sheet1!A2:AB5'
+    assert u.get_coordinates_string(3, 3, 1, 1, sheet='Team A') == 'Team A!C1:C1'
+
+
+def test_build_row():
+    header = ['Date', 'WIP ', 'Cycle Time', 'Bugs', 'Removed']
+    assert u.build_row(header, {'WIP': 3, 'Cycle Time': -1, 'Bugs': None}, '2020-01-06') == \
+        ['2020-01-06', 3, -1, '', '']
+
+
+def test_rows_are_appended_after_the_last_one(sheet):
+    fake = sheet([['Date', 'WIP', 'Bugs'], ['2020-01-06', 3, 1], ['2020-01-13', 4, 2]])
+    data = u.write_rows([('2020-01-20', {'WIP': 5, 'Bugs': 0}), ('2020-01-27', {'Bugs': 1, 'WIP': 6})])
+    assert data == [{'range': 'Sheet1!A4:C5', 'values': [['2020-01-20', 5, 0], ['2020-01-27', 6, 1]]}]
+    assert fake.updates == [data]
+
+
+def test_new_columns_are_added(sheet):
+    sheet([['Date', 'WIP'], ['2020-01-06', 3]])
+    data = u.write_rows([('2020-01-13', {'WIP': 4, 'Bugs': 2})], sheet='Team A')
+    assert data == [{'range': 'Team A!C1:C1', 'values': [['Bugs']]},
+                    {'range': 'Team A!A3:C3', 'values': [['2020-01-13', 4, 2]]}]
+
+
+def test_empty_sheet_gets_a_header(sheet):
+    fake = sheet([])
+    data = u.write_rows([('2020-01-06', {'WIP': 3})], dry_run=True)
+    assert data == [{'range': 'Sheet1!A1:B1', 'values': [['Date', 'WIP']]},
+                    {'range': 'Sheet1!A2:B2', 'values': [['2020-01-06', 3]]}]
+    assert fake.updates == []
+
+
+def test_gaps_in_the_first_column(sheet):
+    sheet([['Date', 'WIP'], ['2020-01-06', 3], [''], ['2020-01-20', 5]])
+    assert u.write_rows([('2020-01-27', {'WIP': 6})])[0]['range'] == 'Sheet1!A3:B3'
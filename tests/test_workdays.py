@@ -0,0 +1,80 @@
+# 3rd Party Modules
+import numpy as np
+import pytest
+
+# Local Modules
+from Jetrics.config import config
+from Jetrics.workdays import WorkingCalendar
+from tests.conftest import epoch_ms
+
+# Global Variables
+HOUR = 60 * 60
+
+
+def hours(calendar, start, end):
+    """
+    Helper function to get the working hours between two UTC dates of January 2020, as (day, hour).
+    """
+    return calendar.seconds([epoch_ms(2020, 1, *start)], [epoch_ms(2020, 1, *end)])[0] / HOUR
+
+
+def test_whole_days():
+    calendar = WorkingCalendar()
+    assert calendar.day_seconds == 24 * HOUR
+    # Monday to Tuesday, then Friday to Monday over the weekend
+    assert hours(calendar, (6, 10), (7, 10)) == 24
+    assert hours(calendar, (10, 10), (13, 10)) == 24
+    # From Saturday to Sunday nothing is worked
+    assert hours(calendar, (11, 10), (12, 20)) == 0
+
+
+def test_working_hours():
+    calendar = WorkingCalendar(hours=(9, 17.5))
+    assert calendar.day_seconds == 8.5 * HOUR
+    assert hours(calendar, (6, 16), (7, 10)) == 2.5
+    # Before opening and after closing count from the opening and up to the closing
+    assert hours(calendar, (6, 7), (6, 20)) == 8.5
+    assert hours(calendar, (11, 12), (13, 10)) == 1
+    assert hours(calendar, (6, 18), (7, 8)) == 0
+
+
+def test_holidays_and_weekmask():
+    calendar = WorkingCalendar(weekmask='Sun Mon Tue Wed Thu', holidays=['2020-01-07'])
+    # Monday, the Tuesday off, Wednesday
+    assert hours(calendar, (6, 12), (8, 12)) == 24
+    # Friday and Saturday off, Sunday worked
+    assert hours(calendar, (9, 12), (12, 12)) == 24
+
+
+def test_utc_offset():
+    calendar = WorkingCalendar(hours=(9, 17), utc_offset='-0500')
+    # 09:00 to 17:00 in New York
+    assert hours(calendar, (6, 14), (6, 22)) == 8
+    assert hours(calendar, (6, 8), (6, 14)) == 0
+
+
+def test_arrays():
+    calendar = WorkingCalendar(hours=(9, 17))
+    starts = np.array([epoch_ms(2020, 1, 6, 9), epoch_ms(2020, 1, 6, 9), epoch_ms(2020, 1, 10, 16)])
+    ends = np.array([epoch_ms(2020, 1, 6, 12), epoch_ms(2020, 1, 8, 9), epoch_ms(2020, 1, 13, 10)])
+    assert list(calendar.seconds(starts, ends) / HOUR) == [3, 16, 2]
+
+
+def test_invalid_hours():
+    with pytest.raises(ValueError):
+        WorkingCalendar(hours=(17, 9))
+    with pytest.raises(ValueError):
+        WorkingCalendar(hours=(9, 25))
+
+
+def test_from_config(monkeypatch):
+    monkeypatch.setitem(config, 'calendar', None)
+    monkeypatch.setitem(config, 'team_calendars', {'Team A': {'hours': (9, 17)}})
+    assert WorkingCalendar.from_config() is None
+    assert WorkingCalendar.from_config('Team A').day_seconds == 8 * HOUR
+    monkeypatch.setitem(config, 'calendar', {'hours': (8, 18), 'holidays': ['2020-01-07']})
+    calendar = WorkingCalendar.from_config('Team A')
+    # The team's hours, the report's holidays
+    assert calendar.day_seconds == 8 * HOUR
+    assert hours(calendar, (6, 9), (8, 9)) == 8
+    assert WorkingCalendar.from_config('Team B').day_seconds == 10 * HOUR